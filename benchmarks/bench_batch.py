@@ -0,0 +1,60 @@
+"""parse_request one by one vs parse_requests on bursts from a few hot conversations
+
+    python -m benchmarks.bench_batch --events 20000 --conversations 5
+"""
+import argparse
+import copy
+import io
+import json
+import tempfile
+import time
+
+from familyapp import Bot
+
+from .stub_server import StubAPI, start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--conversations', type=int, default=5)
+    args = parser.parse_args()
+
+    api = StubAPI()
+    server, url = start_stub_server(api)
+    headers = {'Authorization': 'verify'}
+    events = [api.message_event('f', i % args.conversations, f'message number {i}')
+              for i in range(args.events)]
+    ndjson = '\n'.join(json.dumps(event) for event in events)
+    try:
+        with tempfile.TemporaryDirectory() as keys_path:
+            bot = Bot('token', 'verify', url=url, keys_path=keys_path)
+            received = []
+            bot.handle_message(received.append)
+            bot.parse_requests(copy.deepcopy(events[:args.conversations]), headers)
+
+            batch = copy.deepcopy(events)
+            started = time.perf_counter()
+            for event in batch:
+                bot.parse_request(event, headers)
+            single = time.perf_counter() - started
+
+            batch = copy.deepcopy(events)
+            started = time.perf_counter()
+            bot.parse_requests(batch, headers)
+            batched = time.perf_counter() - started
+
+            started = time.perf_counter()
+            bot.parse_requests(io.StringIO(ndjson), headers)
+            streamed = time.perf_counter() - started
+            bot.close()
+    finally:
+        server.shutdown()
+    assert received[-1]['content'] == f'message number {args.events - 1}'
+    for name, seconds in (('parse_request', single), ('parse_requests', batched),
+                          ('parse_requests ndjson', streamed)):
+        print(f'{name:<22} {args.events / seconds:12.0f} events/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Creating calendar events one by one vs Bot.import_events
+
+    python -m benchmarks.bench_import --events 500 --families 50 --workers 8 --latency 0.02
+
+``sequential`` calls create_event in a loop, ``import_events`` creates the
+same events with per-family ordering on a bounded pool. The second import
+run resumes from the checkpoint and creates nothing. ``--latency`` is
+added to every stub API response, like the round trip to the real API.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+from familyapp import Bot, ImportCheckpoint
+
+from .stub_server import StubAPI, start_stub_server
+
+
+class SlowAPI(StubAPI):
+    def __init__(self, latency):
+        super(SlowAPI, self).__init__()
+        self.latency = latency
+
+    def handle(self, method, path, body):
+        time.sleep(self.latency)
+        return super(SlowAPI, self).handle(method, path, body)
+
+
+def events(count, families):
+    start = datetime.datetime(2025, 9, 1, 8)
+    for i in range(count):
+        begins = start + datetime.timedelta(hours=i)
+        yield {'family_id': f'family{i % families}', 'uid': f'event-{i}', 'title': f'Lesson {i}',
+               'description': None, 'start_time': begins,
+               'end_time': begins + datetime.timedelta(minutes=45),
+               'recurring': 'FREQ=WEEKLY' if i % 10 == 0 else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--families', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(SlowAPI(args.latency))
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(), lazy_keys=True)
+    started = time.perf_counter()
+    for event in events(args.events, args.families):
+        bot.create_event(event['family_id'], event['title'], event['description'],
+                         event['start_time'], event['end_time'], event['recurring'])
+    sequential = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'checkpoint')
+        runs = []
+        for _ in range(2):
+            checkpoint = ImportCheckpoint(path)
+            started = time.perf_counter()
+            results = list(bot.import_events(events(args.events, args.families),
+                                             checkpoint=checkpoint, max_workers=args.workers))
+            runs.append((time.perf_counter() - started, len(results),
+                         sum(1 for result in results if result.error)))
+            checkpoint.close()
+    bot.close()
+    server.shutdown()
+
+    print(f'{"":>16} {"seconds":>8} {"events/s":>9} {"created":>8} {"errors":>7}')
+    print(f'{"sequential":>16} {sequential:>8.2f} {args.events / sequential:>9.0f} '
+          f'{args.events:>8} {0:>7}')
+    for name, (elapsed, created, errors) in zip(('import_events', 'resumed'), runs):
+        print(f'{name:>16} {elapsed:>8.2f} {args.events / elapsed:>9.0f} {created:>8} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Resident memory while resolving many conversation-key versions
+
+    python -m benchmarks.bench_key_cache --versions 1000000 --cache-size 10000
+    python -m benchmarks.bench_key_cache --versions 1000000 --unbounded
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from familyapp.cache import CachedKeyStore
+from familyapp.store import MemoryKeyStore, SQLiteKeyStore
+
+
+def rss_mb():
+    with open('/proc/self/statm') as handle:
+        pages = int(handle.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--versions', type=int, default=1000000)
+    parser.add_argument('--cache-size', type=int, default=10000)
+    parser.add_argument('--ttl', type=float, default=None)
+    parser.add_argument('--unbounded', action='store_true',
+                        help='plain in-memory store, the pre-cache behaviour')
+    parser.add_argument('--report-every', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        if args.unbounded:
+            store = MemoryKeyStore()
+        else:
+            store = CachedKeyStore(SQLiteKeyStore(os.path.join(path, 'keys.sqlite3')),
+                                   args.cache_size, args.ttl)
+        started = time.perf_counter()
+        print(f'{"versions":>10} {"rss MB":>8} {"keys/s":>10}')
+        for i in range(1, args.versions + 1):
+            store.put(f'c{i % 50000}', 'family', f'v{i}', os.urandom(32))
+            store['keys'][f'v{i // 2 + 1}']
+            if i % args.report_every == 0:
+                rate = i / (time.perf_counter() - started)
+                print(f'{i:>10} {rss_mb():>8.1f} {rate:>10.0f}')
+        if isinstance(store, CachedKeyStore):
+            print(store.stats())
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Webhook latency of the first message after a family's keys rotated
+
+    python -m benchmarks.bench_key_refresh --conversations 20 --rounds 5
+
+Every round rotates the keys of all conversations of a family and delivers
+a ``joined_to_family`` event, then one message per conversation. Without
+a refresher each of those messages fetches the conversation and unwraps
+its key inside parse_request, with ``key_refresh`` the event queues the
+fetches and the messages find their keys in the cache.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from familyapp import Bot
+
+from .stub_server import StubAPI, start_stub_server
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def run(api, url, args, key_refresh):
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(), key_refresh=key_refresh)
+    bot.handle_message(lambda event_data: None)
+    bot.handle_member_joined(lambda event_data: None)
+    conversations = [f'c{i}' for i in range(args.conversations)]
+    for conversation_id in conversations:
+        bot.parse_request(api.message_event('family', conversation_id, 'hello'), HEADERS)
+    latencies = []
+    for _ in range(args.rounds):
+        for conversation_id in conversations:
+            api.rotate_key('family', conversation_id)
+        bot.parse_request({'event_type': 'joined_to_family',
+                           'event_data': {'family_id': 'family', 'user': {'id': 'new'}}}, HEADERS)
+        # messages arrive a little after the event
+        time.sleep(args.delay)
+        for conversation_id in conversations:
+            event = api.message_event('family', conversation_id, 'hello')
+            started = time.perf_counter()
+            bot.parse_request(event, HEADERS)
+            latencies.append(time.perf_counter() - started)
+    bot.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.5,
+                        help='seconds between the family event and the messages')
+    args = parser.parse_args()
+
+    api = StubAPI()
+    server, url = start_stub_server(api)
+    print(f'{"":>12} {"p50 ms":>8} {"max ms":>8}')
+    for name, key_refresh in (('on demand', None), ('key_refresh', {'warm': False})):
+        latencies = run(api, url, args, key_refresh)
+        print(f'{name:>12} {statistics.median(latencies) * 1000:>8.2f} '
+              f'{max(latencies) * 1000:>8.2f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
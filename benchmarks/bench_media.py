@@ -0,0 +1,87 @@
+"""Peak resident memory of sending a large photo
+
+    python -m benchmarks.bench_media --size-mb 20 --targets 16
+
+Every mode runs in a fresh client process against the stub API (which
+runs in this process), and reports the peak RSS above the RSS before
+sending. ``base64`` modes pass the photo the old way, as one base64
+string, the others pass the file path and stream the body.
+"""
+import argparse
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+
+from familyapp import Bot
+
+from .bench_key_cache import rss_mb
+from .stub_server import StubAPI, start_stub_server
+
+MODES = ('base64', 'stream', 'broadcast-base64', 'broadcast')
+
+
+def peak_rss_mb():
+    # VmHWM, unlike ru_maxrss, does not carry the parent's peak over exec
+    with open('/proc/self/status') as handle:
+        for line in handle:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+def client(args):
+    bot = Bot('token', 'verify', url=args.url, keys_path=tempfile.mkdtemp(), lazy_keys=True)
+    targets = [(1, i) for i in range(args.targets)]
+    before = rss_mb()
+    if args.client == 'base64':
+        with open(args.path, 'rb') as handle:
+            photo_base64 = base64.b64encode(handle.read()).decode('utf-8')
+        bot.send_message(1, 1, 'photo', photo_base64=photo_base64)
+    elif args.client == 'stream':
+        bot.send_message(1, 1, 'photo', photo=args.path)
+    elif args.client == 'broadcast-base64':
+        with open(args.path, 'rb') as handle:
+            photo_base64 = base64.b64encode(handle.read()).decode('utf-8')
+        list(bot.broadcast(targets, 'photo', photo_base64=photo_base64))
+    else:
+        list(bot.broadcast(targets, 'photo', photo=args.path))
+    print(f'{peak_rss_mb() - before:.1f}')
+    bot.close()
+
+
+class _DiscardingAPI(StubAPI):
+    def _receive_message(self, family_id, conversation_id, body):
+        # keep the server side (this process) small
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=float, default=20)
+    parser.add_argument('--targets', type=int, default=16)
+    parser.add_argument('--client', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.client:
+        return client(args)
+
+    server, url = start_stub_server(_DiscardingAPI())
+    with tempfile.TemporaryDirectory() as path:
+        photo = os.path.join(path, 'photo.jpg')
+        with open(photo, 'wb') as handle:
+            handle.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+        print(f'{"mode":>18} {"peak MB":>8}   ({args.size_mb:g} MB photo, '
+              f'{args.targets} broadcast targets)')
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_media', '--client', mode,
+                 '--url', url, '--path', photo, '--targets', str(args.targets)],
+                check=True, capture_output=True, text=True)
+            print(f'{mode:>18} {float(out.stdout.split()[-1]):>8.1f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Nightly directory sync: full profile PATCHes vs sync_profiles
+
+    python -m benchmarks.bench_profile_sync --users 500 --photo-kb 64 --changed 0.02
+
+``full`` PATCHes every field and photo of every user, the old way.
+``first sync`` does the same through sync_profiles and fills the
+snapshots, ``next sync`` sends the same directory with ``--changed`` of
+the users edited (half of them a new photo).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from familyapp import Bot
+
+from .stub_server import StubAPI, start_stub_server
+
+
+class CountingAPI(StubAPI):
+    def __init__(self):
+        super(CountingAPI, self).__init__()
+        self.patches = 0
+
+    def handle(self, method, path, body):
+        if method == 'PATCH':
+            with self.lock:
+                self.patches += 1
+        return super(CountingAPI, self).handle(method, path, body)
+
+
+def directory(users, photos, edited=()):
+    for i in range(users):
+        profile = {'family_id': f'family{i % 50}', 'user_id': f'user{i}', 'username': f'User {i}',
+                   'email': f'user{i}@example.com', 'phone_number': f'+48100{i:06d}',
+                   'birthday': '01.02.2010', 'photo': photos[i]}
+        if i in edited:
+            if i % 2:
+                profile['photo'] = photos[i][::-1]
+            else:
+                profile['username'] = f'User {i} (renamed)'
+        yield profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--photo-kb', type=int, default=64)
+    parser.add_argument('--changed', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    api = CountingAPI()
+    server, url = start_stub_server(api)
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(), lazy_keys=True)
+    photos = [os.urandom(args.photo_kb * 1024) for _ in range(args.users)]
+    edited = set(random.Random(1).sample(range(args.users), int(args.users * args.changed)))
+
+    started = time.perf_counter()
+    for profile in directory(args.users, photos):
+        bot.update_family_user(**profile)
+    full = (time.perf_counter() - started, api.patches, None)
+
+    rows = [('full', full)]
+    for name, changes in (('first sync', ()), ('next sync', edited)):
+        api.patches = 0
+        started = time.perf_counter()
+        report = bot.sync_profiles(directory(args.users, photos, changes), max_workers=args.workers)
+        rows.append((name, (time.perf_counter() - started, api.patches, report)))
+    bot.close()
+    server.shutdown()
+
+    print(f'{"":>11} {"seconds":>8} {"calls":>6} {"MB sent":>8} {"calls saved":>12} {"MB saved":>9}')
+    for name, (elapsed, calls, report) in rows:
+        if report is None:
+            print(f'{name:>11} {elapsed:>8.2f} {calls:>6}')
+            continue
+        print(f'{name:>11} {elapsed:>8.2f} {calls:>6} {report.bytes_sent / 1e6:>8.2f} '
+              f'{report.calls_saved:>12} {report.bytes_saved / 1e6:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
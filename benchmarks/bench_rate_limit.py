@@ -0,0 +1,62 @@
+"""Burst sends against a stub API that enforces a rate limit
+
+Without client side limiting most of the burst is rejected with 429, the
+adaptive limiter paces requests and retries the throttled ones.
+
+    python -m benchmarks.bench_rate_limit --messages 500 --server-rate 200
+"""
+import argparse
+import tempfile
+import time
+
+from familyapp import Bot
+from familyapp.ratelimit import RateLimiter
+
+from .stub_server import StubAPI, start_stub_server
+
+
+def run(limiter, args):
+    api = StubAPI(rate_limit=args.server_rate)
+    server, url = start_stub_server(api)
+    try:
+        with tempfile.TemporaryDirectory() as keys_path:
+            bot = Bot('token', 'verify', url=url, keys_path=keys_path,
+                      rate_limiter=limiter)
+            api.requests = api.throttled = 0
+            started = time.perf_counter()
+            results = list(bot.broadcast(((1, i) for i in range(args.messages)), 'hello',
+                                         max_workers=args.threads))
+            elapsed = time.perf_counter() - started
+            bot.close()
+    finally:
+        server.shutdown()
+    delivered = sum(1 for r in results if r.error is None)
+    return {
+        'delivered': delivered,
+        'lost': len(results) - delivered,
+        'delivered/s': delivered / elapsed,
+        'http requests': api.requests,
+        '429s': api.throttled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--server-rate', type=float, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ('no limiter, no retry', RateLimiter(max_retries=0)),
+        ('retry only', RateLimiter(max_retries=10)),
+        ('adaptive limiter', RateLimiter({'messages': args.server_rate * 1.5}, max_retries=10)),
+    ]
+    for name, limiter in cases:
+        result = run(limiter, args)
+        print(f'{name:<22} ' + '  '.join(f'{k}={v:.1f}' if isinstance(v, float) else f'{k}={v}'
+                                          for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Memory per tenant of a BotRegistry hosting many bot tokens
+
+    python -m benchmarks.bench_registry --tenants 10000 --active 200
+
+Reports the resident memory added by idle (registered) tenants, by
+tenants loaded through a webhook, and by standalone Bot instances with
+their own transport for comparison.
+"""
+import argparse
+import gc
+import tempfile
+
+from familyapp import Bot, BotRegistry
+
+from .bench_key_cache import rss_mb
+
+EVENT = {'event_type': 'joined_to_family', 'event_data': {'family_id': 1, 'user_id': 2}}
+
+
+def setup(bot):
+    bot.handle_member_joined(lambda event_data: None)
+
+
+def per_tenant_kb(before, after, count):
+    return (after - before) * 1024 / max(1, count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tenants', type=int, default=10000)
+    parser.add_argument('--active', type=int, default=200,
+                        help='tenants that receive a webhook, keep below the open files limit')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        registry = BotRegistry(keys_path=path, setup=setup)
+        gc.collect()
+        before = rss_mb()
+        for i in range(args.tenants):
+            registry.register(f'token-{i}', f'verify-{i}')
+        gc.collect()
+        registered = rss_mb()
+        for i in range(args.active):
+            registry.parse_request(EVENT, {'Authorization': f'verify-{i}'})
+        gc.collect()
+        loaded = rss_mb()
+
+        standalone = []
+        for i in range(args.active):
+            bot = Bot(f'solo-{i}', f'solo-verify-{i}', keys_path=path, lazy_keys=True)
+            setup(bot)
+            bot.parse_request(EVENT, {'Authorization': f'solo-verify-{i}'})
+            standalone.append(bot)
+        gc.collect()
+        solo = rss_mb()
+
+        print(f'{"":>22} {"count":>8} {"KB/tenant":>10}')
+        print(f'{"idle (registered)":>22} {args.tenants:>8} '
+              f'{per_tenant_kb(before, registered, args.tenants):>10.2f}')
+        print(f'{"loaded (registry)":>22} {args.active:>8} '
+              f'{per_tenant_kb(registered, loaded, args.active):>10.2f}')
+        print(f'{"standalone Bot":>22} {args.active:>8} '
+              f'{per_tenant_kb(loaded, solo, args.active):>10.2f}')
+        for bot in standalone:
+            bot.close()
+        registry.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Record synthetic webhook traffic and replay it, offline against the stub API
+
+    python -m benchmarks.bench_replay --events 5000 --speed 0 --concurrency 1 8
+
+A bot receives ``--events`` messages from the stub API (spread over
+``--conversations``) and records them with a test key. The recording is
+then replayed into a fresh bot that only knows the test key, in-process
+and over HTTP through a local webhook endpoint.
+"""
+import argparse
+import json
+import os
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+from familyapp import Bot, MemoryKeyStore, Recorder
+from familyapp.replay import format_report, read_recording, replay, seed_test_key
+
+from .stub_server import StubAPI, start_stub_server
+
+HEADERS = {'Authorization': 'verify', 'User-Agent': 'bench'}
+
+
+def record(api, url, path, test_key, args):
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(),
+              recorder=Recorder(path, test_key=test_key))
+    bot.handle_message(lambda event_data: None)
+    for i in range(args.events):
+        bot.parse_request(api.message_event('family', f'c{i % args.conversations}', f'hello {i}'),
+                          HEADERS)
+    bot.close()
+    return bot.recorder.stats()
+
+
+def replay_bot(url, test_key):
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(), lazy_keys=True,
+              key_store=MemoryKeyStore())
+    bot.handle_message(lambda event_data: None)
+    seed_test_key(bot, test_key)
+    return bot
+
+
+def start_endpoint(bot):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            try:
+                bot.parse_request(json.loads(body), self.headers)
+                status = 200
+            except Exception:
+                status = 500
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--speed', type=float, default=0)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    api = StubAPI()
+    stub, url = start_stub_server(api)
+    test_key = os.urandom(32)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'webhooks.ndjson')
+        print('recorded', record(api, url, path, test_key, args),
+              f'{os.path.getsize(path) / args.events:.0f} bytes/event')
+        for concurrency in args.concurrency:
+            bot = replay_bot(url, test_key)
+            print(f'\nin-process, concurrency {concurrency}')
+            print(format_report(replay(read_recording(path), bot, speed=args.speed,
+                                       concurrency=concurrency)))
+            bot.close()
+            bot = replay_bot(url, test_key)
+            server, endpoint = start_endpoint(bot)
+            print(f'\nHTTP, concurrency {concurrency}')
+            print(format_report(replay(read_recording(path), endpoint, speed=args.speed,
+                                       concurrency=concurrency, verify_token='verify')))
+            server.shutdown()
+            bot.close()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
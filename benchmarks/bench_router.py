@@ -0,0 +1,81 @@
+"""Dispatch cost of the message Router as routes are added
+
+    python -m benchmarks.bench_router --routes 10 100 1000 5000
+
+For every size N there are N payload, N command and N regex routes. The
+messages hit the last registered route of each kind, or nothing. The
+``chain`` columns are the equivalent if/elif chain over the same routes.
+"""
+import argparse
+import re
+import time
+
+from familyapp import Router
+
+KINDS = ('payload', 'command', 'regex', 'miss')
+
+
+def build(count):
+    router = Router()
+    chain = []
+    for i in range(count):
+        router.payload(f'option_{i}', lambda event_data, match: None)
+        router.command(f'/cmd{i}', lambda event_data, match: None)
+        router.regex(rf'order (\d+) of item{i}\b', lambda event_data, match: None)
+        chain.append(('payload', f'option_{i}'))
+        chain.append(('command', f'/cmd{i}'))
+        chain.append(('regex', re.compile(rf'order (\d+) of item{i}\b')))
+    router.fallback(lambda event_data, match: None)
+    return router, chain
+
+
+def run_chain(chain, event_data):
+    payload, content = event_data.get('payload'), event_data.get('content')
+    for kind, key in chain:
+        if kind == 'payload' and payload == key:
+            return key
+        if kind == 'command' and (content == key or content.startswith(key + ' ')):
+            return key
+        if kind == 'regex' and key.match(content):
+            return key
+    return None
+
+
+def events(count):
+    last = count - 1
+    return {
+        'payload': {'payload': f'option_{last}', 'content': 'Option'},
+        'command': {'payload': None, 'content': f'/cmd{last} now'},
+        'regex': {'payload': None, 'content': f'order 3 of item{last}'},
+        'miss': {'payload': None, 'content': 'hello there'},
+    }
+
+
+def measure(fn, arg, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--routes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    header = ' '.join(f'{kind:>9} {"chain":>9}' for kind in KINDS)
+    print(f'{"routes":>7} {header}   (us/message)')
+    for count in args.routes:
+        router, chain = build(count)
+        router.resolve(events(count)['regex'])
+        row = []
+        for kind, event_data in events(count).items():
+            row.append(measure(router, event_data, args.iterations))
+            row.append(measure(lambda e: run_chain(chain, e), event_data,
+                               max(1, args.iterations // max(1, count // 100))))
+        print(f'{count:>7} ' + ' '.join(f'{value:>9.2f}' for value in row))
+
+
+if __name__ == '__main__':
+    main()
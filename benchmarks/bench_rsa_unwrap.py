@@ -0,0 +1,51 @@
+"""Cost of unwrapping an RSA-wrapped conversation key
+
+Compares the old per-miss path (parse both PEM keys, build a cipher,
+decrypt) with the pre-parsed cipher kept by Bot, and PEM vs DER parsing.
+
+    python -m benchmarks.bench_rsa_unwrap --rounds 200
+"""
+import argparse
+import base64
+import os
+import timeit
+
+from Crypto.Cipher import PKCS1_v1_5
+from Crypto.PublicKey import RSA
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    key = RSA.generate(2048, e=65537)
+    private_pem = key.exportKey('PEM').decode('utf-8')
+    public_pem = key.publickey().exportKey('PEM').decode('utf-8')
+    private_der = key.exportKey('DER')
+    wrapped = PKCS1_v1_5.new(key.publickey()).encrypt(base64.b64encode(os.urandom(32)))
+    cipher = PKCS1_v1_5.new(key)
+
+    def per_miss_pem():
+        RSA.importKey(public_pem)
+        rsa_private = RSA.importKey(private_pem)
+        PKCS1_v1_5.new(rsa_private).decrypt(wrapped, b'DECRYPTION FAILED')
+
+    def preparsed():
+        cipher.decrypt(wrapped, b'DECRYPTION FAILED')
+
+    cases = [
+        ('unwrap, parse PEM per miss', per_miss_pem),
+        ('unwrap, pre-parsed cipher', preparsed),
+        ('parse private key, PEM', lambda: RSA.importKey(private_pem)),
+        ('parse private key, DER', lambda: RSA.importKey(private_der)),
+    ]
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=args.rounds, repeat=3)) / args.rounds
+        print(f'{name:<30} {seconds * 1e6:10.1f} us')
+    print(f'{"private key size, PEM":<30} {len(private_pem):10d} B')
+    print(f'{"private key size, DER":<30} {len(private_der):10d} B')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Per-send cost of serializing a message with a template and quick replies
+
+    python -m benchmarks.bench_serialize --iterations 100000
+
+Compares rebuilding the template with ``as_dict()`` and JSON encoding the
+whole body (what every send did before) with frozen fragments spliced
+into the body, optionally with orjson as the ``json_dumps`` hook.
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from familyapp import Bot, Button, Element, QuickReply, Template, freeze
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def menu():
+    template = Template(
+        buttons=[Button(f'Option {i}', payload=f'option_{i}') for i in range(3)],
+        elements=[Element(f'Item {i}', subtitle=f'Description of item {i}') for i in range(5)],
+        template_type='list')
+    quick_replies = [QuickReply(f'Reply {i}', payload=f'reply_{i}') for i in range(5)]
+    return template, quick_replies
+
+
+def measure(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    template, quick_replies = menu()
+    bot = Bot('token', 'verify', keys_path=tempfile.mkdtemp(), lazy_keys=True)
+
+    def rebuilt():
+        data = bot._message_data('hello', quick_replies, template)
+        return json.dumps(data).encode('utf-8')
+
+    frozen_template, frozen_quick_replies = freeze(template), freeze(quick_replies)
+
+    def frozen():
+        data = bot._message_data('hello', frozen_quick_replies, frozen_template)
+        return bot._request_body(data, {})[1]
+
+    assert json.loads(rebuilt()) == json.loads(frozen())
+    results = [('as_dict + json.dumps', measure(rebuilt, args.iterations)),
+               ('frozen fragments', measure(frozen, args.iterations))]
+    if orjson is not None:
+        bot.json_dumps = orjson.dumps
+        frozen_template, frozen_quick_replies = freeze(template, orjson.dumps), freeze(quick_replies, orjson.dumps)
+        results.append(('frozen + orjson', measure(frozen, args.iterations)))
+    bot.close()
+
+    print(f'{"body":>22} {"us/send":>8}')
+    for name, micros in results:
+        print(f'{name:>22} {micros:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
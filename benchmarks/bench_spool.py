@@ -0,0 +1,53 @@
+"""Enqueue and drain throughput of the outbound Spool against the stub API
+
+    python -m benchmarks.bench_spool --messages 5000 --conversations 100
+
+``direct`` is send_message without a spool. ``enqueue`` is the time
+send_message takes with a spool (a local append), ``drain`` the rate at
+which the senders deliver the backlog to the stub API.
+"""
+import argparse
+import tempfile
+import time
+
+from familyapp import Bot, Spool
+
+from .stub_server import StubAPI, start_stub_server
+
+
+def run(url, args, spool=None):
+    bot = Bot('token', 'verify', url=url, keys_path=tempfile.mkdtemp(), lazy_keys=True,
+              spool=spool)
+    targets = [(1, i % args.conversations) for i in range(args.messages)]
+    started = time.perf_counter()
+    for family_id, conversation_id in targets:
+        bot.send_message(family_id, conversation_id, 'hello')
+    enqueued = time.perf_counter() - started
+    if spool is not None:
+        spool.join()
+    drained = time.perf_counter() - started
+    bot.close()
+    return args.messages / enqueued, args.messages / drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--conversations', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(StubAPI())
+    print(f'{"mode":>24} {"enqueue/s":>10} {"drain/s":>10}')
+    enqueue, drain = run(url, args)
+    print(f'{"direct":>24} {enqueue:>10.0f} {drain:>10.0f}')
+    for fsync_interval in (0.05, 0):
+        with tempfile.TemporaryDirectory() as path:
+            spool = Spool(path, workers=args.workers, fsync_interval=fsync_interval)
+            enqueue, drain = run(url, args, spool)
+        print(f'{f"spool fsync={fsync_interval}":>24} {enqueue:>10.0f} {drain:>10.0f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Compare per-call connections with the pooled keep-alive transport
+
+    python -m benchmarks.bench_transport --requests 2000 --threads 8
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from familyapp import Bot
+from familyapp.transport import SimpleTransport, PooledTransport
+
+from .stub_server import start_stub_server
+
+
+def run(bot, total, threads):
+    def send(i):
+        bot.send_message(1, 1, f'message {i}')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(total)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = start_stub_server()
+    transports = [
+        ('per-call', SimpleTransport()),
+        ('pooled', PooledTransport(max_connections_per_host=args.threads)),
+    ]
+    try:
+        for name, transport in transports:
+            with tempfile.TemporaryDirectory() as keys_path:
+                bot = Bot('token', 'verify', url=url, keys_path=keys_path,
+                          transport=transport)
+                rate = run(bot, args.requests, args.threads)
+                bot.close()
+            print(f'{name:>10}: {rate:10.1f} req/s')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark suite for the Bot hot paths against the local stub API
+
+Measures per-operation latency and throughput of parse_request (warm and
+cold key), _decrypt_message, encryptMessage and send_message, plus memory
+per cached conversation, and writes the results as JSON so runs of
+different versions can be compared::
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+import argparse
+import copy
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import familyapp
+from familyapp import Bot, Metrics
+
+from .stub_server import StubAPI, start_stub_server
+
+
+def measure(fn, iterations, setup=None):
+    """latency statistics of ``fn(arg)`` where ``arg`` comes from ``setup(i)``"""
+    args = [setup(i) if setup else None for i in range(iterations)]
+    samples = []
+    started = time.perf_counter()
+    for arg in args:
+        t = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p50_us': samples[len(samples) // 2] * 1e6,
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+        'ops_per_s': iterations / elapsed,
+    }
+
+
+def cached_conversation_bytes(bot, api, count):
+    """traced memory per conversation held in the key cache"""
+    events = [api.message_event('mem', i, 'x')['event_data'] for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for event in events:
+        bot.get_aes_key(event)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {'conversations': count, 'bytes_per_conversation': grown / count}
+
+
+def run(args):
+    api = StubAPI()
+    server, url = start_stub_server(api)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as keys_path:
+            bot = Bot('token', 'verify', url=url, keys_path=keys_path,
+                      metrics=Metrics() if args.metrics else None)
+            bot.handle_message(lambda message: None)
+            headers = {'Authorization': 'verify'}
+            n = args.iterations
+
+            warm = api.message_event('f', 'warm', 'hello world, how are you?')
+            bot.parse_request(copy.deepcopy(warm), headers)
+            results['parse_request_warm'] = measure(
+                lambda event: bot.parse_request(event, headers), n,
+                lambda i: copy.deepcopy(warm))
+            results['parse_request_cold'] = measure(
+                lambda event: bot.parse_request(event, headers), args.cold_iterations,
+                lambda i: api.message_event('f', f'cold-{i}', 'hello'))
+            results['decrypt_message'] = measure(
+                bot._decrypt_message, n, lambda i: copy.deepcopy(warm['event_data']))
+            results['encrypt_message'] = measure(
+                lambda data: bot.encryptMessage('f', 'warm', data), n,
+                lambda i: {'content': 'hello world, how are you?'})
+            results['send_message'] = measure(
+                lambda i: bot.send_message('f', 'warm', 'hello world'), n)
+            results['memory'] = cached_conversation_bytes(bot, api, args.cold_iterations)
+            bot.close()
+    finally:
+        server.shutdown()
+    return {
+        'version': familyapp.__version__,
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def compare(current, baseline):
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        for metric in ('p50_us', 'bytes_per_conversation'):
+            if metric in result and metric in old and old[metric]:
+                change = (result[metric] - old[metric]) / old[metric] * 100
+                print(f'{name:<22} {metric:<24} {old[metric]:>12.1f} -> {result[metric]:>12.1f} '
+                      f'({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--cold-iterations', type=int, default=200)
+    parser.add_argument('--metrics', action='store_true',
+                        help='run with instrumentation enabled to measure its overhead')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    report = run(args)
+    for name, result in report['results'].items():
+        print(f'{name:<22} ' + '  '.join(f'{k}={v:.1f}' if isinstance(v, float) else f'{k}={v}'
+                                          for k, v in result.items()))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(report, json.load(handle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Local stand-in for the FamilyApp ``bot_api/v1`` endpoints used by benchmarks
+
+Conversation keys are real: every conversation has AES-256 key versions,
+wrapped with PKCS#1 v1.5 for each RSA key registered through
+``rsa_keys``, and :meth:`StubAPI.message_event` builds AES-CBC encrypted
+``message_created`` webhooks.
+"""
+import base64
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.Cipher import AES, PKCS1_v1_5
+from Crypto.PublicKey import RSA
+
+
+def encrypt_content(key, text):
+    """AES-CBC encrypt ``text`` the way FamilyApp clients do, returns (iv, content) in base64"""
+    raw = text.encode('utf-8')
+    padding = 16 - len(raw) % 16
+    iv = os.urandom(16)
+    content = AES.new(key, AES.MODE_CBC, iv).encrypt(raw + bytes([padding]) * padding)
+    return base64.b64encode(iv).decode('utf-8'), base64.b64encode(content).decode('utf-8')
+
+
+def decrypt_content(key, iv, content):
+    raw = AES.new(key, AES.MODE_CBC, base64.b64decode(iv)).decrypt(base64.b64decode(content))
+    return raw[:-raw[-1]].decode('utf-8')
+
+
+class StubAPI(object):
+    def __init__(self, rate_limit=None, burst=None):
+        """In-memory state of the stub API
+
+        :param rate_limit: requests per second accepted before answering 429 (optional)
+        :type rate_limit: float
+        :param burst: size of the server side bucket (optional)
+        :type burst: float
+        """
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.rate_limit = rate_limit
+        self._capacity = burst or rate_limit
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self.rsa_keys = {}
+        self.conversations = {}
+        self.conversation_fetches = 0
+        self.messages_received = 0
+        self.messages = deque(maxlen=1000)
+        self.events = deque(maxlen=1000)
+
+    def conversation(self, family_id, conversation_id, members=3):
+        """conversation record, created with a first key version on demand"""
+        ident = (str(family_id), str(conversation_id))
+        with self.lock:
+            conversation = self.conversations.get(ident)
+            if conversation is None:
+                conversation = self.conversations[ident] = {
+                    'id': ident[1],
+                    'family_id': ident[0],
+                    'channel_id': 1,
+                    'family_users': [
+                        {'id': f'{ident[0]}-u{i}', 'username': f'user {i}', 'photo_url': '',
+                         'photo_medium_url': '', 'email': None, 'phone_number': None,
+                         'admin': i == 0, 'child_account': i > 1}
+                        for i in range(members)],
+                    'aes_keys': {},
+                    'wrapped': {},
+                }
+                self._rotate(conversation)
+        return conversation
+
+    def _rotate(self, conversation, version_id=None):
+        version_id = version_id or str(uuid.uuid4())
+        conversation['aes_keys'][version_id] = os.urandom(32)
+        conversation['current'] = version_id
+        conversation['key_version'] = int(time.time() * 1000)
+        return version_id
+
+    def rotate_key(self, family_id, conversation_id, version_id=None):
+        """start a new key version, returns its conversation_key_version_id"""
+        conversation = self.conversation(family_id, conversation_id)
+        with self.lock:
+            return self._rotate(conversation, version_id)
+
+    def current_key(self, family_id, conversation_id):
+        """(conversation_key_version_id, aes key) of the current key version"""
+        conversation = self.conversation(family_id, conversation_id)
+        return conversation['current'], conversation['aes_keys'][conversation['current']]
+
+    def _conversation_payload(self, conversation):
+        keys = []
+        with self.lock:
+            rsa_keys = list(self.rsa_keys.items())
+        for version_id, aes_key in list(conversation['aes_keys'].items()):
+            for rsa_id, public_key in rsa_keys:
+                wrapped = conversation['wrapped'].get((version_id, rsa_id))
+                if wrapped is None:
+                    wrapped = base64.b64encode(PKCS1_v1_5.new(public_key).encrypt(
+                        base64.b64encode(aes_key))).decode('utf-8')
+                    conversation['wrapped'][(version_id, rsa_id)] = wrapped
+                keys.append({'conversation_key_version_id': version_id,
+                             'rsa_key_id': rsa_id, 'key': wrapped})
+        payload = {k: v for k, v in conversation.items()
+                   if k not in ('aes_keys', 'wrapped', 'current', 'key_version')}
+        payload['conversation_keys'] = keys
+        return payload
+
+    def message_event(self, family_id, conversation_id, text, author_id='u1', payload=None):
+        """``message_created`` webhook body encrypted with the current key"""
+        version_id, key = self.current_key(family_id, conversation_id)
+        iv, content = encrypt_content(key, text)
+        return {
+            'event_type': 'message_created',
+            'event_data': {
+                'id': str(uuid.uuid4()),
+                'family_id': str(family_id),
+                'conversation_id': str(conversation_id),
+                'author': {'id': author_id, 'username': None},
+                'content': content,
+                'payload': payload,
+                'attachments': [],
+                'location': None,
+                'iv': iv,
+                'conversation_key_version_id': version_id,
+                'key_version': self.conversations[(str(family_id), str(conversation_id))]['key_version'],
+            },
+        }
+
+    def _receive_message(self, family_id, conversation_id, body):
+        text = body.get('content')
+        if body.get('iv'):
+            conversation = self.conversation(family_id, conversation_id)
+            key = conversation['aes_keys'][body['conversation_key_version_id']]
+            text = decrypt_content(key, body['iv'], body['content'])
+        with self.lock:
+            self.messages_received += 1
+            self.messages.append((family_id, conversation_id, text))
+
+    def _throttle(self):
+        """seconds until the next request is accepted, 0 when it is accepted now"""
+        if self.rate_limit is None:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity,
+                               self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            self.throttled += 1
+            return (1 - self._tokens) / self.rate_limit
+
+    def next_id(self):
+        with self.lock:
+            return next(self._ids)
+
+    def handle(self, method, path, body):
+        """Return ``(status, payload)`` or ``(status, payload, headers)`` for a request"""
+        with self.lock:
+            self.requests += 1
+        wait = self._throttle()
+        if wait:
+            return 429, {'error': 'rate limited'}, {'Retry-After': f'{wait:.3f}'}
+        if method == 'POST' and path.endswith('/rsa_keys'):
+            rsa_id = self.next_id()
+            public_key = RSA.importKey(body['key'])
+            with self.lock:
+                self.rsa_keys[rsa_id] = public_key
+            return 201, {'id': rsa_id}
+        match = re.search(r'/families/([^/]+)/conversations/([^/]+)/messages$', path)
+        if method == 'POST' and match:
+            self._receive_message(match.group(1), match.group(2), body or {})
+            return 201, {'id': self.next_id()}
+        match = re.search(r'/families/([^/]+)/conversations/([^/]+)$', path)
+        if method == 'GET' and match:
+            with self.lock:
+                self.conversation_fetches += 1
+            conversation = self.conversation(match.group(1), match.group(2))
+            return 200, self._conversation_payload(conversation)
+        match = re.search(r'/families/([^/]+)/events$', path)
+        if method == 'POST' and match:
+            self.events.append((match.group(1), body or {}))
+            return 201, {'id': self.next_id()}
+        if method == 'PATCH':
+            return 200, body or {}
+        if method == 'POST':
+            return 201, {'id': self.next_id()}
+        return 404, {'error': 'not found'}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        body = json.loads(raw) if raw else None
+        result = self.server.api.handle(self.command, self.path, body)
+        status, payload = result[:2]
+        out = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (result[2] if len(result) > 2 else {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+    do_PATCH = _dispatch
+
+
+def start_stub_server(api=None, host='127.0.0.1', port=0):
+    """Start the stub API in a daemon thread
+
+    :return: tuple of (server, base url)
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.api = api or StubAPI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}/'
@@ -23,7 +23,7 @@ def handle_message(parameters):
 
 
 bot = Bot(token='',
-          verify_token='', url='', keys_path='static')
+          verify_token='', url='', keys_path='static', lazy_keys=True)
 bot.handle_channel_added(handleChannelAdded)
 bot.handle_message(handle_message)
 
@@ -6,4 +6,23 @@ __license__ = 'MIT'
 __version__ = '0.0.10'
 
 
-from .bot import Bot, APIException, Template, Button, Element, QuickReply
+from .bot import (Bot, APIException, Template, Button, Element, QuickReply, BroadcastResult,
+                  EventResult, freeze)
+from .transport import Transport, SimpleTransport, PooledTransport
+from .aio import AsyncBot
+from .store import KeyStore, MemoryKeyStore, SQLiteKeyStore
+from .cache import LRUCache, CachedKeyStore
+from .dispatch import Dispatcher, DispatchQueueFull
+from .ratelimit import RateLimiter, TokenBucket
+from .metrics import Metrics, StatsdExporter
+from .conversations import ConversationCache
+from .registry import BotRegistry
+from .media import Media
+from .payload import RawJSON
+from .router import Router, RouteMatch
+from .dedup import SeenSet, MemorySeenSet, SQLiteSeenSet
+from .spool import Spool
+from .refresh import KeyRefresher
+from .recorder import Recorder
+from .checkpoint import ImportCheckpoint
+from .profiles import ProfileSnapshots, SyncReport
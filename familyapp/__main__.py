@@ -0,0 +1,112 @@
+"""Command line tools
+
+Pre-generate (and register) the bot RSA keypair, e.g. at image build time,
+so that ``Bot()`` does not have to do it on startup::
+
+    python -m familyapp keygen --token TOKEN --keys-path static
+    python -m familyapp keygen --token TOKEN --keys-path static --no-register
+
+Replay webhooks recorded with ``Bot(recorder=Recorder(...))`` into a
+running webhook endpoint, into your own bot (``module:attribute``, a Bot
+or a function returning one) or into a bot with no-op handlers talking to
+``--url``, e.g. a local stub API::
+
+    python -m familyapp replay webhooks.ndjson --endpoint http://127.0.0.1:5000/ --verify-token T
+    python -m familyapp replay webhooks.ndjson --bot myapp:bot --speed 0 --concurrency 8
+    python -m familyapp replay webhooks.ndjson --url http://127.0.0.1:8080/ --test-key HEX
+"""
+import argparse
+import importlib
+import sys
+import tempfile
+
+from .bot import Bot
+from .replay import format_report, read_recording, replay as replay_recording, seed_test_key
+
+
+def keygen(args):
+    bot = Bot(args.token, None, url=args.url, keys_path=args.keys_path,
+              key_format=args.key_format, lazy_keys=True, key_cache_size=0)
+    try:
+        if bot.data.get('rsa_id', None) is not None:
+            print(f'RSA key already registered, id {bot.data["rsa_id"]}')
+            return 0
+        if args.no_register:
+            if bot._rsa_key is None:
+                bot._create_RSA()
+                bot._save_data()
+            print('RSA key generated, it will be registered on first use')
+            return 0
+        bot._ensure_rsa_key()
+        print(f'RSA key registered, id {bot.data["rsa_id"]}')
+        return 0
+    finally:
+        bot.close()
+
+
+def _load_bot(spec):
+    module, _, attribute = spec.partition(':')
+    bot = getattr(importlib.import_module(module), attribute or 'bot')
+    return bot if isinstance(bot, Bot) else bot()
+
+
+def replay(args):
+    target = args.endpoint
+    bot = None
+    if target is None:
+        if args.bot:
+            bot = _load_bot(args.bot)
+        else:
+            bot = Bot(args.token, args.verify_token, url=args.url,
+                      keys_path=args.keys_path or tempfile.mkdtemp(), lazy_keys=True)
+            for handle in (bot.handle_message, bot.handle_channel_added,
+                           bot.handle_member_joined, bot.handle_member_left):
+                handle(lambda event_data: None)
+        if args.test_key:
+            seed_test_key(bot, bytes.fromhex(args.test_key))
+        target = bot
+    try:
+        report = replay_recording(read_recording(args.recording), target, speed=args.speed,
+                                  concurrency=args.concurrency, verify_token=args.verify_token)
+    finally:
+        if bot is not None:
+            bot.close()
+    print(format_report(report))
+    return 1 if report['errors'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='familyapp', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('keygen', help='generate and register the RSA keypair')
+    command.add_argument('--token', required=True)
+    command.add_argument('--url', default='https://api.familyapp.com/')
+    command.add_argument('--keys-path', default='.')
+    command.add_argument('--key-format', choices=['PEM', 'DER'], default='PEM')
+    command.add_argument('--no-register', action='store_true',
+                         help='only write the keypair, register it on first use')
+    command.set_defaults(func=keygen)
+    command = commands.add_parser('replay', help='replay recorded webhooks and report latencies')
+    command.add_argument('recording')
+    target = command.add_mutually_exclusive_group()
+    target.add_argument('--endpoint', help='URL of a webhook endpoint to POST to')
+    target.add_argument('--bot', help='module:attribute of the Bot to feed')
+    command.add_argument('--speed', type=float, default=1.0,
+                         help='multiple of the recorded pace, 0 for as fast as possible')
+    command.add_argument('--concurrency', type=int, default=1)
+    command.add_argument('--verify-token', help='defaults to the bot\'s verify_token')
+    command.add_argument('--test-key', help='hex of the Recorder test_key')
+    command.add_argument('--token', default='replay')
+    command.add_argument('--url', default='https://api.familyapp.com/')
+    command.add_argument('--keys-path', default='')
+    command.set_defaults(func=replay)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import asyncio
+import functools
+import inspect
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .bot import Bot, BroadcastResult, EventResult
+from .pool import arun_bounded, arun_ordered
+from .profiles import SyncReport
+from .singleflight import AsyncSingleFlight
+from .steps import Acquire, Flight, Handle, Send, Sleep, adrive, drive
+from .transport import PooledTransport
+
+
+class AsyncTransport(object):
+    """Base class for awaitable HTTP transports used by AsyncBot"""
+
+    async def request(self, method, url, json=None, headers=None, data=None):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class ExecutorTransport(AsyncTransport):
+    def __init__(self, transport=None, executor=None):
+        """Run a blocking :class:`~familyapp.transport.Transport` in an executor
+
+        Used when aiohttp is not installed.
+
+        :param transport: blocking transport (optional)
+        :type transport: Transport
+        :param executor: concurrent.futures executor, loop default if omitted (optional)
+        :type executor: Executor
+        """
+        self.transport = transport or PooledTransport()
+        self.executor = executor
+
+    async def request(self, method, url, json=None, headers=None, data=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: self.transport.request(method, url, json=json, headers=headers, data=data))
+
+    async def close(self):
+        self.transport.close()
+
+
+class _Response(object):
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AiohttpTransport(AsyncTransport):
+    def __init__(self, pool_size=100, max_connections_per_host=10,
+                 connect_timeout=5, read_timeout=30, verify=False):
+        """Keep-alive transport backed by an aiohttp.ClientSession
+
+        :param pool_size: total number of open connections (optional)
+        :type pool_size: int
+        :param max_connections_per_host: connections kept alive per host (optional)
+        :type max_connections_per_host: int
+        :param connect_timeout: seconds to wait for the TCP/TLS connection (optional)
+        :type connect_timeout: float
+        :param read_timeout: seconds to wait for the response (optional)
+        :type read_timeout: float
+        :param verify: verify TLS certificates (optional)
+        :type verify: bool
+        """
+        if aiohttp is None:
+            raise RuntimeError('AiohttpTransport requires the aiohttp package')
+        self.pool_size = pool_size
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                             sock_read=read_timeout)
+        self.verify = verify
+        self._session = None
+
+    def _get_session(self):
+        # the session binds to the running loop, so it is created lazily
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                             limit_per_host=self.max_connections_per_host,
+                                             ssl=None if self.verify else False)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=self.timeout)
+        return self._session
+
+    async def request(self, method, url, json=None, headers=None, data=None):
+        if data is not None and not isinstance(data, bytes):
+            data = _aiter(data)
+        async with self._get_session().request(method, url, json=json, headers=headers,
+                                               data=data) as r:
+            return _Response(r.status, r.headers, await r.text())
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def _aiter(chunks):
+    # aiohttp streams async iterables only
+    for chunk in chunks:
+        yield chunk
+
+
+async def _awaited(awaitable):
+    # run_coroutine_threadsafe takes coroutines only
+    return await awaitable
+
+
+class _LoopLock(object):
+    def __init__(self, bot, file_lock=None):
+        """lock of the shared steps on AsyncBot, see :class:`~familyapp.steps.Acquire`
+
+        Tasks queue on an asyncio.Lock per stripe of ``file_lock``, so at
+        most one of them at a time waits for the file lock, in the bot's
+        lock executor. That executor runs nothing else: a waiting thread
+        can never keep the lock holder from its requests and Call steps.
+
+        :param bot: AsyncBot whose loop and lock executor are used (required)
+        :type bot: AsyncBot
+        :param file_lock: inter-process lock taken after the asyncio lock (optional)
+        :type file_lock: StripedFileLock
+        """
+        self._bot = bot
+        self._file_lock = file_lock
+        self._locks = {}
+
+    def _lock(self, key):
+        stripe = key if self._file_lock is None else self._file_lock._stripe(key[0])
+        lock = self._locks.get(stripe)
+        if lock is None:
+            lock = self._locks[stripe] = asyncio.Lock()
+        return lock
+
+    async def acquire(self, *key):
+        lock = self._lock(key)
+        await lock.acquire()
+        if self._file_lock is None:
+            return
+        future = asyncio.get_running_loop().run_in_executor(
+            self._bot._lock_executor, self._file_lock.acquire, *key)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the executor takes the file lock anyway, give both back then
+            future.add_done_callback(lambda done: self._give_back(done, key, lock))
+            raise
+        except BaseException:
+            lock.release()
+            raise
+
+    def _give_back(self, done, key, lock):
+        if not done.cancelled() and done.exception() is None:
+            self._file_lock.release(*key)
+        lock.release()
+
+    def release(self, *key):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is self._bot._loop:
+            self._release(key)
+        else:
+            # a step of a background thread, asyncio locks are released on their loop
+            self._bot._loop.call_soon_threadsafe(self._release, key)
+
+    def _release(self, key):
+        if self._file_lock is not None:
+            self._file_lock.release(*key)
+        self._lock(key).release()
+
+    def reset(self):
+        # asyncio locks belong to one loop
+        self._locks = {}
+
+    def close(self):
+        if self._file_lock is not None:
+            self._file_lock.close()
+
+
+class AsyncBot(Bot):
+    """asyncio flavour of :class:`~familyapp.bot.Bot`
+
+    All of Bot's logic is used as is: what waits on I/O is written once as
+    steps (see :mod:`familyapp.steps`) that AsyncBot awaits instead of
+    blocking on. So the API methods, ``get_conversation``,
+    ``get_aes_key``, ``parse_request``, ``parse_requests`` and
+    ``sync_channel`` return awaitables, handlers may be coroutine
+    functions, and ``broadcast`` and ``import_events`` are async
+    generators.
+
+    The RSA key is registered on the first call that needs it, or
+    explicitly with ``await bot.setup()``. The dispatcher, spool and key
+    refresher run their requests and coroutine handlers on the event loop
+    of the bot's first awaited call, the spool and key refresher start
+    with it. Stop them with ``await bot.close()``.
+    """
+    NETWORK_ERRORS = (OSError, asyncio.TimeoutError)
+
+    def __init__(self, token, verify_token, **kwargs):
+        self._async_key_flight = AsyncSingleFlight()
+        self._loop = None
+        self._deferred = []
+        # registration needs a running loop, see setup()
+        kwargs['lazy_keys'] = True
+        super(AsyncBot, self).__init__(token, verify_token, **kwargs)
+
+    @staticmethod
+    def _create_transport():
+        if aiohttp is not None:
+            return AiohttpTransport()
+        return ExecutorTransport()
+
+    def _init_data(self):
+        super(AsyncBot, self)._init_data()
+        # tasks queue on asyncio locks, only the file locks are waited for in
+        # threads of their own, apart from the executor of Call steps and requests
+        self._lock_executor = ThreadPoolExecutor(
+            max_workers=self._file_lock.stripes + self._rsa_file_lock.stripes,
+            thread_name_prefix='familyapp-lock')
+        self._rsa_lock = _LoopLock(self)
+        self._rsa_file_lock = _LoopLock(self, self._rsa_file_lock)
+        self._file_lock = _LoopLock(self, self._file_lock)
+
+    async def setup(self):
+        """generate and register the RSA key if it does not exist yet"""
+        await self._ensure_rsa_key()
+
+    def _start_spool(self):
+        self._deferred.append(super(AsyncBot, self)._start_spool)
+
+    def _start_key_refresher(self, options):
+        self._deferred.append(functools.partial(super(AsyncBot, self)._start_key_refresher, options))
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        for lock in (self._rsa_lock, self._rsa_file_lock, self._file_lock):
+            lock.reset()
+        deferred, self._deferred = self._deferred, []
+        for start in deferred:
+            start()
+
+    async def _run(self, steps):
+        self._bind_loop()
+        return await adrive(steps, self._run_step)
+
+    async def _run_step(self, step):
+        if isinstance(step, Send):
+            return await self.transport.request(step.method, step.url, json=step.json,
+                                                headers=step.headers, data=step.data)
+        if isinstance(step, Sleep):
+            return await asyncio.sleep(step.seconds)
+        if isinstance(step, Handle):
+            result = step.fn(*step.args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        if isinstance(step, Flight):
+            return await self._async_key_flight.do(step.key, self._run, step.steps(*step.args))
+        if isinstance(step, Acquire):
+            return await step.lock.acquire(*step.args)
+        # Call, blocking work is kept off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, step.fn, *step.args)
+
+    def _run_blocking(self, steps):
+        # dispatcher, spool and key refresher threads: requests and coroutine
+        # handlers run on the bot's loop, everything else in the calling thread
+        return drive(steps, self._run_step_blocking)
+
+    def _run_step_blocking(self, step):
+        if isinstance(step, Send):
+            return self._in_loop(self.transport.request(step.method, step.url, json=step.json,
+                                                        headers=step.headers, data=step.data))
+        if isinstance(step, Handle):
+            result = step.fn(*step.args)
+            if inspect.isawaitable(result):
+                result = self._in_loop(_awaited(result))
+            return result
+        if isinstance(step, Acquire):
+            return self._in_loop(step.lock.acquire(*step.args))
+        return super(AsyncBot, self)._run_step(step)
+
+    def _in_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def shutdown(self, drain=True, timeout=None):
+        """async variant of :meth:`Bot.shutdown`, the loop stays free for the draining workers"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, super(AsyncBot, self).shutdown, drain, timeout)
+
+    async def close(self):
+        """drain the dispatcher and the spool, release connections and the key store"""
+        await self.shutdown()
+        if self.recorder is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.recorder.close)
+        if not self.shared:
+            await self.transport.close()
+        self._release_keys()
+        self._lock_executor.shutdown(wait=False)
+
+    async def broadcast(self, targets, message, quick_replies=None, template=None,
+                        audio_remote_url=None, photo_base64=None, max_workers=8, rate=None,
+                        photo=None):
+        """async generator variant of :meth:`Bot.broadcast`
+
+        ``async for result in bot.broadcast(targets, 'hello'): ...``
+        """
+        send = self._broadcast_sender(message, quick_replies, template, audio_remote_url,
+                                      photo_base64, photo, rate)
+        async for target, response, error in arun_bounded(send, targets, max_workers):
+            yield BroadcastResult(target[0], target[1], response, error)
+
+    async def import_events(self, events, family_id=None, family_user_ids=None, checkpoint=None,
+                            max_workers=8, max_buffered=1000, rate=None):
+        """async generator variant of :meth:`Bot.import_events`
+
+        ``async for result in bot.import_events('school.ics', family_id): ...``
+        """
+        create = self._event_creator(checkpoint, rate)
+        items = self._import_items(events, family_id, family_user_ids, checkpoint)
+        async for item, response, error in arun_ordered(create, items, self._event_family,
+                                                        max_workers, max_buffered):
+            yield EventResult(item[0], item[1], response, error)
+
+    async def sync_profiles(self, profiles, max_workers=8, rate=None):
+        """async variant of :meth:`Bot.sync_profiles`"""
+        report = SyncReport()
+        updates = self._profile_updates(profiles, report)
+        async for update, _, error in arun_ordered(self._profile_sender(rate), updates,
+                                                   self._profile_key, max_workers):
+            self._profile_sent(update, error, report)
+        return report
@@ -1,11 +1,35 @@
-import requests
 from Crypto.PublicKey import RSA
 from Crypto import Random
 from Crypto.Cipher import AES
 from Crypto.Cipher import PKCS1_v1_5
 import pickle
 import base64
+import datetime
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+from collections import namedtuple
+
+from .cache import CachedKeyStore
+from .conversations import ConversationCache
+from .dedup import MemorySeenSet, event_fingerprint
+from .filelock import StripedFileLock
+from .ical import iter_ics
+from .media import as_media
+from .ndjson import chunks, iter_payloads
+from .payload import JSONBody, RawJSON, plain
+from .pool import run_bounded, run_ordered
+from .profiles import CHANNEL_FIELDS, USER_FIELDS, ProfileSnapshots, SyncReport, plan_update
+from .ratelimit import RateLimiter, TokenBucket, endpoint_family, parse_retry_after
+from .refresh import KeyRefresher
+from .router import Router
+from .singleflight import SingleFlight
+from .steps import Acquire, Call, Flight, Handle, Send, Sleep, drive
+from .store import SQLiteKeyStore, migrate_pickle
+from .transport import PooledTransport
 
 
 class APIException(Exception):
@@ -22,6 +46,8 @@ class APIException(Exception):
 
 
 class QuickReply(object):
+    __slots__ = ('title', 'payload')
+
     def __init__(self, title, payload=None):
         """Quick Reply
 
@@ -38,6 +64,8 @@ class QuickReply(object):
 
 
 class Button(object):
+    __slots__ = ('title', 'payload', 'web_url')
+
     def __init__(self, title, payload=None, web_url=None):
         """Button Attributes
 
@@ -66,6 +94,8 @@ class Button(object):
 
 
 class Element(object):
+    __slots__ = ('title', 'subtitle', 'image')
+
     def __init__(self, title, subtitle=None, image=None):
         """Element Attributes
 
@@ -89,6 +119,8 @@ class Element(object):
 
 
 class Template(object):
+    __slots__ = ('template_type', 'buttons', 'elements')
+
     def __init__(self, buttons=None, elements=None, template_type='buttons'):
         """Builder for template object
 
@@ -112,87 +144,259 @@ class Template(object):
             'template_type': self.template_type
         }
 
+    def freeze(self):
+        """serialize once, see :func:`freeze`"""
+        return freeze(self)
+
+
+def freeze(value, dumps=json.dumps):
+    """pre-serialize a Template or a list of QuickReply for repeated sends
+
+    The returned RawJSON is immutable and is copied into the request body
+    as is by ``send_message``/``broadcast``, instead of being rebuilt with
+    ``as_dict()`` and JSON encoded on every send.
+
+    :param value: Template or list of QuickReply (required)
+    :type value: Template or list
+    :param dumps: JSON encoder (optional)
+    :type dumps: callable
+    :return: RawJSON
+    """
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, Template):
+        return RawJSON(dumps(value.as_dict()))
+    return RawJSON(dumps([x.as_dict() for x in value]))
+
+
+logger = logging.getLogger(__name__)
+
+# default of optional fields, None is sent as null
+_MISSING = object()
+
+BroadcastResult = namedtuple('BroadcastResult',
+                             ['family_id', 'conversation_id', 'response', 'error'])
+
+EventResult = namedtuple('EventResult', ['family_id', 'uid', 'response', 'error'])
+
 
 class Bot(object):
+    # events that change family members, cached conversations are dropped
+    FAMILY_EVENTS = ('joined_to_family', 'left_from_family', 'add_channel_to_family')
+    # transport errors a request is retried on
+    NETWORK_ERRORS = (OSError,)
 
     def __init__(self, token, verify_token, **kwargs):
         self._handlers = {}
+        self._router = None
         self.token = token
         self.verify_token = verify_token
         self.url = kwargs.get('url', 'https://api.familyapp.com/')
         self.keys_path = kwargs.get('keys_path', '')
+        self.transport = kwargs.get('transport', None) or self._create_transport()
+        self.key_store = kwargs.get('key_store', None)
+        self.key_cache_size = kwargs.get('key_cache_size', 10000)
+        self.key_cache_ttl = kwargs.get('key_cache_ttl', None)
+        self.key_format = kwargs.get('key_format', 'PEM')
+        self.lazy_keys = kwargs.get('lazy_keys', False)
+        self.dispatcher = kwargs.get('dispatcher', None)
+        # transport and dispatcher belong to a BotRegistry, close() leaves them running
+        self.shared = kwargs.get('shared', False)
+        self.rate_limiter = kwargs.get('rate_limiter', None) or RateLimiter()
+        self.metrics = kwargs.get('metrics', None)
+        self.json_dumps = kwargs.get('json_dumps', None)
+        self.dedup = kwargs.get('dedup', None)
+        if self.dedup is True:
+            self.dedup = MemorySeenSet()
+        self.conversation_cache = None
+        if kwargs.get('conversation_cache_size', 10000):
+            self.conversation_cache = ConversationCache(
+                kwargs.get('conversation_cache_size', 10000),
+                kwargs.get('conversation_cache_ttl', 300))
+        self._rsa_key = None
+        self._rsa_cipher = None
+        self._rsa_lock = threading.Lock()
+        self._key_flight = SingleFlight()
         self._init_data()
+        self.spool = kwargs.get('spool', None)
+        if self.spool is not None:
+            self._start_spool()
+        self.key_refresher = None
+        if kwargs.get('key_refresh', None):
+            self._start_key_refresher(kwargs['key_refresh'])
+        self.profile_snapshots = kwargs.get('profile_snapshots', None)
+        self.recorder = kwargs.get('recorder', None)
+        if self.recorder is not None:
+            self.recorder.start(self.conversation_data['keys'])
+
+    def _start_spool(self):
+        self.spool.start(self._spool_send)
+
+    def _spool_send(self, family_id, conversation_id, data):
+        return self._run_blocking(self._post_message_steps(family_id, conversation_id, data))
+
+    def _start_key_refresher(self, options):
+        # key_refresh=True or a dict of KeyRefresher options, plus 'warm' (limit or False)
+        options = dict(options) if isinstance(options, dict) else {}
+        warm = options.pop('warm', True)
+        self.key_refresher = KeyRefresher(self, **options)
+        if warm is not False:
+            self.key_refresher.warm(None if warm is True else warm)
+
+    @staticmethod
+    def _create_transport():
+        return PooledTransport()
 
     def _init_data(self):
-        if not os.path.exists(self.keys_path):
+        if self.keys_path and not os.path.exists(self.keys_path):
             os.makedirs(self.keys_path)
+        # serialize key fetches and RSA registration across worker processes, in
+        # separate files: a key fetch may register the keypair while holding its stripe
+        self._file_lock = StripedFileLock(os.path.join(self.keys_path, f'.lock_{self.token}'))
+        self._rsa_file_lock = StripedFileLock(
+            os.path.join(self.keys_path, f'.lock_rsa_{self.token}'), stripes=1)
         self.data = {'rsa_private': None,
                      'rsa_public': None,
                      'rsa_id': None}
-        self.conversation_data = {'keys': {}, 'conversations': {}}
+        if self.key_store is None:
+            self.key_store = SQLiteKeyStore(
+                os.path.join(self.keys_path, f'conversations_{self.token}.sqlite3'))
+        self.conversation_data = self.key_store
+        if self.key_cache_size:
+            self.conversation_data = CachedKeyStore(
+                self.key_store, self.key_cache_size, self.key_cache_ttl)
         self._load_data()
         self._load_conversation_data()
-        if self.data.get('rsa_id', None) is None:
-            self._generate_RSA()
+        self._load_rsa_key()
+        if self.data.get('rsa_id', None) is not None:
+            return
+        if self.lazy_keys == 'background':
+            threading.Thread(target=self._ensure_rsa_key, daemon=True,
+                             name='familyapp-rsa-keygen').start()
+        elif not self.lazy_keys:
+            self._ensure_rsa_key()
+
+    def _ensure_rsa_key(self):
+        # lazy_keys: create and register the keypair on first use
+        return self._run(self._rsa_key_steps())
+
+    def _rsa_key_steps(self):
+        if self.data.get('rsa_id', None) is not None:
+            return
+        yield Acquire(self._rsa_lock)
+        try:
+            yield Acquire(self._rsa_file_lock, 'rsa')
+            try:
+                if self.data.get('rsa_id', None) is not None:
+                    return
+                # another worker process may have registered it meanwhile
+                yield Call(self._load_data)
+                yield Call(self._load_rsa_key)
+                if self.data.get('rsa_id', None) is None:
+                    yield from self._generate_RSA_steps()
+            finally:
+                self._rsa_file_lock.release('rsa')
+        finally:
+            self._rsa_lock.release()
 
     def _load_data(self):
         try:
             with open(os.path.join(self.keys_path, f'rsa_{self.token}.pickle'), 'rb') as handle:
                 self.data = pickle.load(handle)
-        except(OSError, IOError) as e:
-            print(e)
         except(FileNotFoundError):
             pass
+        except(OSError, IOError) as e:
+            self._error('load_data', e)
 
     def _save_data(self):
+        path = os.path.join(self.keys_path, f'rsa_{self.token}.pickle')
         try:
-            with open(os.path.join(self.keys_path, f'rsa_{self.token}.pickle'), 'wb') as handle:
+            # write aside and rename, readers never see a partial file
+            with open(f'{path}.{os.getpid()}.tmp', 'wb') as handle:
                 pickle.dump(self.data, handle,
                             protocol=pickle.HIGHEST_PROTOCOL)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(f'{path}.{os.getpid()}.tmp', path)
         except(OSError, IOError, FileNotFoundError) as e:
-            print(e)
+            self._error('save_data', e)
 
     def _load_conversation_data(self):
+        # keys are read lazily from the store, only legacy pickles need work
         try:
-            with open(os.path.join(self.keys_path, f'conversations_{self.token}.pickle'), 'rb') as handle:
-                self.conversation_data = pickle.load(handle)
-        except(OSError, IOError) as e:
-            print(e)
-        except(FileNotFoundError):
-            pass
+            migrate_pickle(os.path.join(self.keys_path, f'conversations_{self.token}.pickle'),
+                           self.conversation_data)
+        except(OSError, IOError, pickle.UnpicklingError) as e:
+            self._error('load_conversation_data', e)
+
+    def _error(self, stage, error):
+        logger.error('%s failed: %s', stage, error)
+        if self.metrics is not None:
+            self.metrics.incr('errors', stage=stage)
 
     def _save_conversation_data(self):
-        try:
-            with open(os.path.join(self.keys_path, f'conversations_{self.token}.pickle'), 'wb') as handle:
-                pickle.dump(self.conversation_data, handle,
-                            protocol=pickle.HIGHEST_PROTOCOL)
-        except(OSError, IOError, FileNotFoundError) as e:
-            print(e)
+        self.conversation_data.flush()
 
-    def _generate_RSA(self):
+    def _load_rsa_key(self):
+        # parse the keypair once, unwrapping reuses the cipher object
+        if self.data.get('rsa_private', None) is None:
+            return
+        self._set_rsa_key(RSA.importKey(self.data['rsa_private']))
+        if isinstance(self.data['rsa_private'], bytes) != (self.key_format == 'DER'):
+            self._export_rsa_key()
+            self._save_data()
+
+    def _set_rsa_key(self, key):
+        self._rsa_key = key
+        self._rsa_cipher = PKCS1_v1_5.new(key)
+
+    def _export_rsa_key(self):
+        key = self._rsa_key
+        if self.key_format == 'DER':
+            self.data['rsa_public'] = key.publickey().exportKey('DER')
+            self.data['rsa_private'] = key.exportKey('DER')
+        else:
+            self.data['rsa_public'] = key.publickey().exportKey('PEM').decode('utf-8')
+            self.data['rsa_private'] = key.exportKey('PEM').decode('utf-8')
+
+    def _generate_RSA_steps(self):
         '''
-        Generate an RSA keypair with an exponent of 65537 in PEM format
+        Generate an RSA keypair with an exponent of 65537, stored in key_format
         param: bits The key length in bits
         Return private key and public key
         '''
-        bits = 2048
-        new_key = RSA.generate(bits, e=65537)
-        public_key = new_key.publickey().exportKey("PEM").decode("utf-8")
-        private_key = new_key.exportKey("PEM").decode("utf-8")
-        self.data['rsa_public'] = public_key
-        self.data['rsa_private'] = private_key
-        response = self._register_rsa_key()
+        if self._rsa_key is None:
+            yield Call(self._create_RSA)
+        private_key, public_key = self.data['rsa_private'], self.data['rsa_public']
+        response = yield from self._request_steps(
+            'POST', 'bot_api/v1/rsa_keys',
+            {'key': self._rsa_key.publickey().exportKey('PEM').decode('utf-8')})
         self.data['rsa_id'] = response['id']
-        self._save_data()
+        yield Call(self._save_data)
         return private_key, public_key
 
-    def _register_rsa_key(self):
-        return self._request('POST', 'bot_api/v1/rsa_keys',
-                             {'key': str(self.data['rsa_public'])})
+    def _create_RSA(self):
+        bits = 2048
+        self._set_rsa_key(RSA.generate(bits, e=65537))
+        self._export_rsa_key()
+        return self.data['rsa_private'], self.data['rsa_public']
 
     def _decrypt_message(self, message):
+        return self._run(self._decrypt_message_steps(message))
+
+    def _decrypt_message_steps(self, message):
         # {'family_id': '60ab2c18-a115-464a-91e4-085813fe6394', 'conversation_id': '97e61e6f-8420-475c-916e-cad12dec157d', 'author': {'id': '20ed218b-bb85-4a09-9469-39571c00e6d0', 'username': None}, 'content': 'm0FRLB6eJdPTiyT7bSY6mw==', 'payload': None, 'attachments': [], 'location': None, 'iv': 'fzmwbr5Mhn8UyvFKh5wSsQ==', 'conversation_key_version_id': 'b5c87c8a-cd68-45d5-a4d2-b76678e5a1fd', 'key_version': 1549629588}
-        aes_key = self.get_aes_key(message)
+        aes_key = self._cached_aes_key(message)
+        if aes_key is None:
+            aes_key = yield from self._aes_key_steps(message)
+        if self.metrics is None:
+            return self._decrypt_content(message, aes_key)
+        started = time.perf_counter()
+        self._decrypt_content(message, aes_key)
+        self.metrics.since('decrypt', started)
+        return message
+
+    def _decrypt_content(self, message, aes_key):
         IV = base64.b64decode(message['iv'])
         aes = AES.new(aes_key, AES.MODE_CBC, IV)
         decrypted_message = aes.decrypt(base64.b64decode(message['content']))
@@ -202,33 +406,192 @@ class Bot(object):
         message['content'] = decrypted_message
         return message
 
+    def _decrypt_group(self, messages, aes_key):
+        """decrypted contents of messages sharing a key version, None for those that fail"""
+        # CBC decryption on top of a single ECB cipher, the key schedule is
+        # built once for all messages sharing a key version
+        ecb = AES.new(aes_key, AES.MODE_ECB)
+        decrypted = []
+        for message in messages:
+            try:
+                content = base64.b64decode(message['content'])
+                chained = base64.b64decode(message['iv']) + content[:-AES.block_size]
+                decrypted_message = (int.from_bytes(ecb.decrypt(content), 'big') ^
+                                     int.from_bytes(chained, 'big')).to_bytes(len(content), 'big')
+                decrypted.append(decrypted_message[:-decrypted_message[-1]].decode('utf-8'))
+            except (KeyError, TypeError, ValueError, IndexError) as e:
+                self._error('decrypt', e)
+                decrypted.append(None)
+        return decrypted
+
+    def _decrypt_batch(self, events):
+        """decrypted contents of the messages of a batch by position, None
+        for other events and where resolving the key or decryption failed"""
+        groups = {}
+        for index, (event, event_data) in enumerate(events):
+            if event == 'message_created':
+                groups.setdefault(event_data.get('conversation_key_version_id'), []).append(index)
+        decrypted = [None] * len(events)
+        for indexes in groups.values():
+            messages = [events[index][1] for index in indexes]
+            try:
+                aes_key = yield from self._aes_key_steps(messages[0])
+            except Exception as e:
+                self._error('decrypt', e)
+                continue
+            for index, content in zip(indexes, self._decrypt_group(messages, aes_key)):
+                decrypted[index] = content
+        return decrypted
+
     def get_aes_key(self, message):
+        return self._run(self._aes_key_steps(message))
+
+    def _cached_aes_key(self, message):
+        # in-memory cache only, the store is read in a Call step
+        if not isinstance(self.conversation_data, CachedKeyStore):
+            return None
+        key = self.conversation_data.keys.cache.get(message['conversation_key_version_id'])
+        if key is not None and self.metrics is not None:
+            self.metrics.incr('key_cache', result='hit')
+        return key
+
+    def _stored_aes_key(self, message):
+        try:
+            return self.conversation_data['keys'][message['conversation_key_version_id']]
+        except KeyError:
+            return None
+
+    def _aes_key_steps(self, message):
+        key = self._cached_aes_key(message)
+        if key is not None:
+            return key
+        key = yield Call(self._stored_aes_key, message)
+        if key is not None:
+            if self.metrics is not None:
+                self.metrics.incr('key_cache', result='hit')
+            return key
         conversation_key_version_id = message['conversation_key_version_id']
+        if self.metrics is None:
+            # concurrent misses on the same key version share a single fetch
+            return (yield Flight(conversation_key_version_id, self._fetch_aes_key_steps, message))
+        self.metrics.incr('key_cache', result='miss')
+        started = time.perf_counter()
+        key = yield Flight(conversation_key_version_id, self._fetch_aes_key_steps, message)
+        self.metrics.since('key_fetch', started)
+        return key
+
+    def _fetch_aes_key_steps(self, message):
+        # registering the keypair can take seconds, do not hold the key's stripe meanwhile
+        yield from self._rsa_key_steps()
+        # other worker processes resolving the same key version wait for us
+        # and then find it in the shared store
+        yield Acquire(self._file_lock, message['conversation_key_version_id'])
         try:
-            return self.conversation_data['keys'][conversation_key_version_id]
+            return (yield from self._resolve_aes_key_steps(message))
+        finally:
+            self._file_lock.release(message['conversation_key_version_id'])
+
+    def _resolve_aes_key_steps(self, message):
+        # stored by a flight or another process after our cache miss
+        key = yield Call(self._stored_aes_key, message)
+        if key is not None:
+            return key
+        conversation = yield from self._conversation_steps(
+            message['family_id'], message['conversation_id'])
+        if self._find_conversation_key(conversation, message) is None:
+            # cached conversation predates this key version
+            conversation = yield from self._conversation_steps(
+                message['family_id'], message['conversation_id'], refresh=True)
+        previous = (yield Call(self.get_conversation_key_if_exists,
+                               message['family_id'], message['conversation_id']))[1]
+        key = yield Call(self._store_conversation_key, message, conversation)
+        if previous is not None and not message.get('prefetch'):
+            # the conversation's key rotated, refreshes do not cascade
+            self._prefetch_family(message['family_id'], message['conversation_id'])
+        return key
+
+    def _prefetch_family(self, family_id, conversation_id=None):
+        # keys of a family rotate together, fetch the other conversations' new versions
+        if self.key_refresher is None or self.conversation_cache is None:
+            return
+        for other_id in self.conversation_cache.family_conversations(family_id):
+            if other_id != str(conversation_id):
+                self.key_refresher.prefetch(family_id, other_id)
+
+    def _latest_key_message(self, family_id, conversation_id, conversation):
+        # the newest key version wrapped for our RSA key, listed last unless key_version says otherwise
+        rsa_id = self.data['rsa_id']
+        keys = [key for key in conversation.get('conversation_keys') or ()
+                if key['rsa_key_id'] == rsa_id]
+        if not keys:
+            return None
+        latest = max(enumerate(keys), key=lambda item: (item[1].get('key_version') or 0, item[0]))[1]
+        return {'family_id': family_id, 'conversation_id': conversation_id,
+                'conversation_key_version_id': latest['conversation_key_version_id'],
+                'prefetch': True}
+
+    def _refresh_conversation_key(self, family_id, conversation_id):
+        """make the latest key version of a conversation its current key
+
+        :return: True if the current key version changed
+        """
+        return self._run(self._refresh_key_steps(family_id, conversation_id))
+
+    def _refresh_key_steps(self, family_id, conversation_id):
+        yield from self._rsa_key_steps()
+        previous = (yield Call(self.get_conversation_key_if_exists, family_id, conversation_id))[1]
+        conversation = yield from self._conversation_steps(family_id, conversation_id, refresh=True)
+        message = self._latest_key_message(family_id, conversation_id, conversation)
+        if message is None:
+            return False
+        key = yield from self._aes_key_steps(message)
+        return (yield Call(self._make_current_key, message, key, previous))
+
+    def _make_current_key(self, message, key, previous):
+        conversation_key_version_id = message['conversation_key_version_id']
+        if previous == conversation_key_version_id:
+            return False
+        try:
+            current = self.conversation_data['conversations'][message['conversation_id']]
         except KeyError:
-            pass
-        family_id = message['family_id']
-        conversation_id = message['conversation_id']
-        conversation = self.get_conversation(family_id, conversation_id)
+            current = None
+        if current is None or current['conversation_key_version_id'] != conversation_key_version_id:
+            # the key was cached already, only the conversation's current version moves
+            self.conversation_data.put(message['conversation_id'], message['family_id'],
+                                       conversation_key_version_id, key)
+            self._save_conversation_data()
+        return True
+
+    def _find_conversation_key(self, conversation, message):
+        conversation_key_version_id = message['conversation_key_version_id']
         rsa_id = self.data['rsa_id']
 
         def filter_conversation_keys(key):
             return key['conversation_key_version_id'] == conversation_key_version_id and key['rsa_key_id'] == rsa_id
-        conversation_keys = list(filter(
-            filter_conversation_keys, conversation['conversation_keys']))
-        rsa_public = RSA.importKey(self.data['rsa_public'])
-        rsa_private = RSA.importKey(self.data['rsa_private'])
-        encrypted_key = base64.b64decode(conversation_keys[0]['key'])
-        cipher = PKCS1_v1_5.new(rsa_private)
-        decrypted_key = cipher.decrypt(encrypted_key, b'DECRYPTION FAILED')
-        decoded_decrypted_key = base64.b64decode(decrypted_key)
-        self.conversation_data['keys'][conversation_key_version_id] = decoded_decrypted_key
-        self.conversation_data['conversations'][conversation_id] = {
-            'family_id': family_id, 'conversation_key_version_id': conversation_key_version_id}
+        return next(filter(filter_conversation_keys, conversation.get('conversation_keys') or ()), None)
+
+    def _store_conversation_key(self, message, conversation):
+        conversation_key_version_id = message['conversation_key_version_id']
+        family_id = message['family_id']
+        conversation_id = message['conversation_id']
+        conversation_key = self._find_conversation_key(conversation, message)
+        if conversation_key is None:
+            raise APIException(f'No key {conversation_key_version_id} for this bot',
+                               url=f'bot_api/v1/families/{family_id}/conversations/{conversation_id}')
+        decoded_decrypted_key = self._unwrap_key(conversation_key['key'])
+        started = time.perf_counter()
+        self.conversation_data.put(conversation_id, family_id,
+                                   conversation_key_version_id, decoded_decrypted_key)
         self._save_conversation_data()
+        if self.metrics is not None:
+            self.metrics.since('key_store_write', started)
         return decoded_decrypted_key
 
+    def _unwrap_key(self, wrapped_key):
+        encrypted_key = base64.b64decode(wrapped_key)
+        decrypted_key = self._rsa_cipher.decrypt(encrypted_key, b'DECRYPTION FAILED')
+        return base64.b64decode(decrypted_key)
+
     def get_conversation_key_if_exists(self, family_id, conversation_id):
         try:
             conversation_key_version_id = self.conversation_data[
@@ -237,30 +600,145 @@ class Bot(object):
         except KeyError:
             return None, None
 
+    def key_cache_stats(self):
+        """hit/miss/eviction counters of the in-memory key cache"""
+        if isinstance(self.conversation_data, CachedKeyStore):
+            return self.conversation_data.stats()
+        return {}
+
     def _pad(self, s):
         block_size = 16
-        return s + (block_size - len(s) % block_size) * chr(block_size - len(s) % block_size)
+        padding = block_size - len(s) % block_size
+        return s + bytes([padding]) * padding
 
-    def _request(self, method, suffix_url, data=None):
+    def _request_headers(self, method):
         if method.lower() not in ['get', 'post', 'patch']:
             raise APIException(
                 "Invalid method type, only [get, post, patch] is supported"
             )
 
-        headers = {
+        return {
             'User-Agent': 'familyapp.py/0.0.11',
             'Authorization': self.token
         }
-        r = getattr(requests, method.lower())(
-            self.url + suffix_url, json=data, headers=headers, verify=False
-        )
+
+    def _handle_response(self, r, suffix_url, data):
         if r.status_code in [200, 201]:
             return r.json()
         raise APIException(r.text, status_code=r.status_code,
                            data=data, url=suffix_url)
 
+    def _retry_delay(self, method, family, r, attempt):
+        # None hands the response to _handle_response
+        if self.metrics is not None:
+            self.metrics.incr('api_responses', status=r.status_code)
+        retry_after = parse_retry_after(r.headers.get('Retry-After'))
+        self.rate_limiter.on_response(family, r.status_code, retry_after)
+        if r.status_code not in self.rate_limiter.THROTTLED:
+            return None
+        return self.rate_limiter.retry_delay(method, r.status_code, attempt, retry_after)
+
+    def _request_body(self, data, headers):
+        # Media values are streamed, the body is never built as one string;
+        # frozen fragments are spliced in without encoding them again
+        spliced = JSONBody.needed(data)
+        if data is None or not (spliced or self.json_dumps):
+            return data, None
+        headers['Content-Type'] = 'application/json'
+        if not spliced:
+            body = self.json_dumps(data)
+            return None, body.encode('utf-8') if isinstance(body, str) else body
+        body = JSONBody(data, self.json_dumps or json.dumps)
+        if not body.streamed:
+            return None, bytes(body)
+        headers['Content-Length'] = str(len(body))
+        return None, body
+
+    def _run(self, steps):
+        """perform the steps of shared logic blocking, see :mod:`familyapp.steps`"""
+        return drive(steps, self._run_step)
+
+    def _run_blocking(self, steps):
+        """:meth:`_run` for background threads (dispatcher, spool, key refresher)"""
+        return drive(steps, self._run_step)
+
+    def _run_step(self, step):
+        if isinstance(step, (Handle, Call)):
+            return step.fn(*step.args)
+        if isinstance(step, Send):
+            return self.transport.request(step.method, step.url, json=step.json,
+                                          headers=step.headers, data=step.data)
+        if isinstance(step, Sleep):
+            if step.seconds > 0:
+                time.sleep(step.seconds)
+            return None
+        if isinstance(step, Acquire):
+            return step.lock.acquire(*step.args)
+        return self._key_flight.do(step.key, self._run_flight, step)
+
+    def _run_flight(self, step):
+        return self._run_blocking(step.steps(*step.args))
+
+    def _request(self, method, suffix_url, data=None):
+        return self._run(self._request_steps(method, suffix_url, data))
+
+    def _request_steps(self, method, suffix_url, data=None):
+        headers = self._request_headers(method)
+        payload, body = self._request_body(data, headers)
+        family = endpoint_family(suffix_url)
+        attempt = 0
+        while True:
+            yield Sleep(self.rate_limiter.delay(family))
+            started = time.perf_counter()
+            try:
+                r = yield Send(method.upper(), self.url + suffix_url, payload, headers, body)
+            except self.NETWORK_ERRORS as e:
+                self._error('request', e)
+                delay = self.rate_limiter.retry_delay(method, None, attempt)
+                if delay is None:
+                    raise
+            else:
+                if self.metrics is not None:
+                    self.metrics.since('request', started, endpoint=family)
+                delay = self._retry_delay(method, family, r, attempt)
+                if delay is None:
+                    return self._handle_response(r, suffix_url, data)
+            attempt += 1
+            yield Sleep(delay)
+
+    def shutdown(self, drain=True, timeout=None):
+        """stop the dispatcher, the key refresher and the spool, by default
+        after running the queued handlers and sending the spooled messages
+
+        :return: True if the handlers ran in time and no spooled message was left
+        """
+        finished = True
+        if self.key_refresher is not None:
+            self.key_refresher.close(wait=drain)
+        if self.dispatcher is not None and not self.shared:
+            finished = self.dispatcher.shutdown(drain=drain, timeout=timeout)
+        if self.spool is not None:
+            finished = self.spool.close(drain=drain, timeout=timeout) and finished
+        return finished
+
+    def close(self):
+        """drain the dispatcher, release pooled connections and the key store"""
+        self.shutdown()
+        if self.recorder is not None:
+            self.recorder.close()
+        if not self.shared:
+            self.transport.close()
+        self._release_keys()
+
+    def _release_keys(self):
+        self.conversation_data.close()
+        self._file_lock.close()
+        self._rsa_file_lock.close()
+        if self.profile_snapshots is not None:
+            self.profile_snapshots.close()
+
     def send_message(self, family_id, conversation_id, message, quick_replies=None,
-                     template=None, audio_remote_url=None, photo_base64=None):
+                     template=None, audio_remote_url=None, photo_base64=None, photo=None):
         """send message to selected conversation
 
         :param family_id: ID of selected family (required)
@@ -269,6 +747,42 @@ class Bot(object):
         :type conversation_id: int
         :param message: content of the message (optional)
         :type message: str
+        :param quick_replies: list of QuickReply, or frozen with freeze() (optional)
+        :type quick_replies: list or RawJSON
+        :param template: Template object, or frozen with freeze()
+        :type Template or RawJSON
+        :param audio_remote_url: link to remote file location, will be downloaded by the server (optional)
+        :type audio_remote_url: str
+        :param photo_base64: base64 string of the image
+        :type photo_base64: str
+        :param photo: image as a file path, binary file object, bytes or Media, streamed (optional)
+        :type photo: str or file or bytes or Media
+        :return: request object, None when the message was spooled
+        """
+        data = self._message_data(message, quick_replies, template,
+                                  audio_remote_url, photo_base64, as_media(photo))
+        return self._run(self._send_message_steps(family_id, conversation_id, data))
+
+    def _send_message_steps(self, family_id, conversation_id, data):
+        if self.spool is not None:
+            # sent and retried in the background, see Spool
+            self.spool.append(family_id, conversation_id, plain(data))
+            return None
+        return (yield from self._post_message_steps(family_id, conversation_id, data))
+
+    def broadcast(self, targets, message, quick_replies=None, template=None,
+                  audio_remote_url=None, photo_base64=None, max_workers=8, rate=None,
+                  executor=None, photo=None):
+        """send the same message to many conversations
+
+        The template, quick replies and the encoded photo are serialized
+        once and shared by all sends. Sending starts when the returned
+        generator is iterated.
+
+        :param targets: iterable of (family_id, conversation_id) tuples (required)
+        :type targets: iterable
+        :param message: content of the message (optional)
+        :type message: str
         :param quick_replies: list of QuickReply (optional)
         :type quick_replies: list
         :param template: Template object
@@ -277,36 +791,90 @@ class Bot(object):
         :type audio_remote_url: str
         :param photo_base64: base64 string of the image
         :type photo_base64: str
-        :return: request object
+        :param max_workers: maximum number of concurrent sends (optional)
+        :type max_workers: int
+        :param rate: maximum number of sends per second (optional)
+        :type rate: float
+        :param executor: executor to send on instead of a private pool (optional)
+        :type executor: Executor
+        :param photo: image as a file path, binary file object, bytes or Media (optional)
+        :type photo: str or file or bytes or Media
+        :return: generator of BroadcastResult, in completion order
         """
-        quick_replies = [x.as_dict()
-                         for x in quick_replies] if quick_replies else []
+        send = self._broadcast_sender(message, quick_replies, template, audio_remote_url,
+                                      photo_base64, photo, rate)
+        for target, response, error in run_bounded(send, targets, max_workers, executor):
+            yield BroadcastResult(target[0], target[1], response, error)
+
+    def _broadcast_sender(self, message, quick_replies, template, audio_remote_url,
+                          photo_base64, photo, rate):
+        dumps = self.json_dumps or json.dumps
+        data = self._message_data(message, quick_replies and freeze(quick_replies, dumps),
+                                  template and freeze(template, dumps),
+                                  audio_remote_url, photo_base64, as_media(photo, cache=True))
+        limiter = TokenBucket(rate) if rate else None
+
+        def send(target):
+            family_id, conversation_id = target
+            return self._run(self._limited_steps(
+                limiter, self._post_message_steps(family_id, conversation_id, dict(data))))
+        return send
+
+    @staticmethod
+    def _limited_steps(limiter, steps):
+        if limiter is not None:
+            yield Sleep(limiter.reserve())
+        return (yield from steps)
+
+    def _message_data(self, message, quick_replies=None, template=None,
+                      audio_remote_url=None, photo_base64=None, photo=None):
+        if isinstance(quick_replies, RawJSON):
+            pass
+        elif quick_replies:
+            quick_replies = [x.as_dict() for x in quick_replies]
+        else:
+            quick_replies = []
+        if template and not isinstance(template, RawJSON):
+            template = template.as_dict()
 
-        data = {
+        return {
             'content': message,
-            'template_attributes': template.as_dict() if template else None,
+            'template_attributes': template or None,
             'quick_replies_attributes': quick_replies,
             'audio_remote_url': audio_remote_url,
-            'photo': photo_base64,
+            'photo': photo if photo is not None else photo_base64,
         }
 
-        self.encryptMessage(family_id, conversation_id, data)
+    def _post_message(self, family_id, conversation_id, data):
+        return self._run(self._post_message_steps(family_id, conversation_id, data))
+
+    def _post_message_steps(self, family_id, conversation_id, data):
+        if data['content'] is not None and \
+                (yield Call(self.get_conversation_key_if_exists, family_id, conversation_id))[0] is None:
+            # no message seen yet, fetch the key instead of sending plaintext
+            try:
+                yield from self._refresh_key_steps(family_id, conversation_id)
+            except APIException as e:
+                self._error('outbound_key', e)
+        yield Call(self.encryptMessage, family_id, conversation_id, data)
 
         """send textual message"""
-        return self._request(
+        return (yield from self._request_steps(
             'POST',
             f'bot_api/v1/families/{family_id}/conversations/{conversation_id}/messages',
             data=data
-        )
+        ))
 
     def encryptMessage(self, family_id, conversation_id, data):
+        if data['content'] is None:
+            return data
         (key, conversation_key_version_id) = self.get_conversation_key_if_exists(
             family_id, conversation_id)
         if key is None:
             return data
         IV = Random.new().read(AES.block_size)
         cipher = AES.new(key, AES.MODE_CBC, IV)
-        message = cipher.encrypt(self._pad(data['content']))
+        message = cipher.encrypt(self._pad(data['content'].encode('utf-8')))
         IV_base64 = base64.b64encode(IV)
         message_base64 = base64.b64encode(message)
         data['content'] = message_base64.decode("utf-8")
@@ -314,9 +882,14 @@ class Bot(object):
         data['conversation_key_version_id'] = conversation_key_version_id
         return data
 
-    def get_conversation(self, family_id, conversation_id):
+    def get_conversation(self, family_id, conversation_id, refresh=False):
         """get conversation data
 
+        Conversations are served from a TTL cache (conversation_cache_size,
+        conversation_cache_ttl), a family's entries are dropped when a
+        member joins or leaves or the channel is added. The returned dict
+        may be shared, do not modify it.
+
         {
             "id": 1,
             "channel_id": 10,
@@ -348,12 +921,47 @@ class Bot(object):
         :type family_id: int
         :param conversation_id:
         :type conversation_id: int
+        :param refresh: skip the cache (optional)
+        :type refresh: bool
         :return:
         """
-        return self._request(
+        return self._run(self._conversation_steps(family_id, conversation_id, refresh))
+
+    def _conversation_steps(self, family_id, conversation_id, refresh=False):
+        if self.conversation_cache is not None and not refresh:
+            conversation = self.conversation_cache.get(family_id, conversation_id)
+            if conversation is not None:
+                return conversation
+        conversation = yield from self._request_steps(
             'GET',
             f'bot_api/v1/families/{family_id}/conversations/{conversation_id}'
         )
+        if self.conversation_cache is not None:
+            self.conversation_cache.set(family_id, conversation_id, conversation)
+        return conversation
+
+    def get_family_user(self, family_id, user_id, conversation_id=None):
+        """get a family member from cached conversations
+
+        :param family_id: ID of selected family (required)
+        :type family_id: int
+        :param user_id: ID of the family member (required)
+        :type user_id: int
+        :param conversation_id: conversation to fetch when the member is not cached (optional)
+        :type conversation_id: int
+        :return: member dict from ``family_users`` or None
+        """
+        return self._run(self._family_user_steps(family_id, user_id, conversation_id))
+
+    def _family_user_steps(self, family_id, user_id, conversation_id):
+        member = None
+        if self.conversation_cache is not None:
+            member = self.conversation_cache.get_member(family_id, user_id)
+        if member is None and conversation_id is not None:
+            conversation = yield from self._conversation_steps(family_id, conversation_id)
+            members = conversation.get('family_users') or ()
+            member = next((m for m in members if str(m['id']) == str(user_id)), None)
+        return member
 
     def create_conversation(self, family_id, title):
         """create conversation
@@ -371,8 +979,9 @@ class Bot(object):
             }
         )
 
-    def update_family_user(self, family_id, user_id, username=None, phone_number=None,
-                           email=None, birthday=None, photo=None, photo_remote_url=None):
+    def update_family_user(self, family_id, user_id, username=_MISSING, phone_number=_MISSING,
+                           email=_MISSING, birthday=_MISSING, photo=_MISSING,
+                           photo_remote_url=_MISSING):
         """update family member profile
 
         :param family_id: ID of selected family (required)
@@ -387,42 +996,140 @@ class Bot(object):
         :type email: str
         :param birthday: date of birthday, formatted as MM.DD.YYYY (optional)
         :type birthday: datetime
-        :param photo: base64 string of the image (optional)
-        :type photo: str
+        :param photo: base64 string of the image, or a pathlib.Path, file object, bytes or Media to stream (optional)
+        :type photo: str or os.PathLike or file or bytes or Media
         :param photo_remote_url: remote url to the picture, will be downloaded by the server (optional)
         :type photo_remote_url: str
+
+        Fields not given are not sent, None clears a field. To update many
+        profiles and skip unchanged fields, use :meth:`sync_profiles`.
         """
         return self._request(
             'PATCH',
-            'bot_api/v1/families/%d/family_users/%d' % (family_id, user_id),
-            data={
+            f'bot_api/v1/families/{family_id}/family_users/{user_id}',
+            data=self._given({
                 'username': username,
                 'phone_number': phone_number,
                 'email': email,
                 'birthday': birthday,
                 'photo': photo,
                 'photo_remote_url': photo_remote_url,
-            }
+            })
         )
 
-    def update_channel(self, name=None, photo=None):
+    def update_channel(self, name=_MISSING, photo=_MISSING):
         """update family member profile
 
         :param name: new name of the channel
         :type name: str
-        :param photo: base64 string of the image (optional)
-        :type photo: str
+        :param photo: base64 string of the image, or a pathlib.Path, file object, bytes or Media to stream (optional)
+        :type photo: str or os.PathLike or file or bytes or Media
+
+        Fields not given are not sent, None clears a field.
         """
         return self._request(
             'PATCH',
             'bot_api/v1/channel',
-            data={
+            data=self._given({
                 'name': name,
                 'photo': photo,
-            }
+            })
         )
 
-    def create_event(self, family_id, title, description, start_time, end_time):
+    @staticmethod
+    def _given(data):
+        data = {key: value for key, value in data.items() if value is not _MISSING}
+        if data.get('photo') is not None:
+            data['photo'] = as_media(data['photo'], base64_str=True)
+        return data
+
+    def sync_profiles(self, profiles, max_workers=8, rate=None, executor=None):
+        """bring family user profiles up to date, sending only what changed
+
+        The hashes of the fields sent are kept in ``profile_snapshots``
+        (by default a SQLite file next to the keys). A profile whose given
+        fields all match the snapshot is not sent at all, otherwise only
+        the changed fields are PATCHed, explicit None values included.
+        Photos are compared by a hash of their content. Updates of
+        different users run concurrently. Changes made outside of
+        sync_profiles are not seen, ``profile_snapshots.forget()`` makes
+        the next sync send everything.
+
+        :param profiles: iterable of dicts with ``family_id``, ``user_id`` and the wanted values
+            of any of username, phone_number, email, birthday, photo and photo_remote_url (required)
+        :type profiles: iterable
+        :param max_workers: maximum number of concurrent requests (optional)
+        :type max_workers: int
+        :param rate: maximum number of requests per second (optional)
+        :type rate: float
+        :param executor: executor to send on instead of a private pool (optional)
+        :type executor: Executor
+        :return: SyncReport with the counts of calls and bytes sent and saved
+        """
+        report = SyncReport()
+        updates = self._profile_updates(profiles, report)
+        for update, _, error in run_ordered(self._profile_sender(rate), updates, self._profile_key,
+                                            max_workers, executor=executor):
+            self._profile_sent(update, error, report)
+        return report
+
+    def _profile_sender(self, rate):
+        limiter = TokenBucket(rate) if rate else None
+
+        def send(update):
+            return self._run(self._limited_steps(
+                limiter, self._request_steps('PATCH', update.suffix_url, data=update.data)))
+        return send
+
+    @staticmethod
+    def _profile_key(update):
+        # updates of one profile are sent one after the other
+        return update.key
+
+    def sync_channel(self, name=_MISSING, photo=_MISSING):
+        """update the channel like :meth:`sync_profiles`, only with changed fields
+
+        :return: SyncReport
+        """
+        return self._run(self._sync_channel_steps(name, photo))
+
+    def _sync_channel_steps(self, name, photo):
+        report = SyncReport()
+        for update in self._profile_updates([self._given({'name': name, 'photo': photo})], report):
+            try:
+                yield from self._request_steps('PATCH', update.suffix_url, data=update.data)
+            except Exception as e:
+                self._profile_sent(update, e, report)
+                raise
+            self._profile_sent(update, None, report)
+        return report
+
+    def _profile_updates(self, profiles, report):
+        if self.profile_snapshots is None:
+            self.profile_snapshots = ProfileSnapshots(
+                os.path.join(self.keys_path, f'profiles_{self.token}.sqlite3'))
+        dumps = self.json_dumps or json.dumps
+        for profile in profiles:
+            fields = dict(profile)
+            if 'user_id' in fields:
+                family_id, user_id = fields.pop('family_id'), fields.pop('user_id')
+                update = plan_update(self.profile_snapshots, f'user/{family_id}/{user_id}',
+                                     f'bot_api/v1/families/{family_id}/family_users/{user_id}',
+                                     fields, USER_FIELDS, dumps)
+            else:
+                update = plan_update(self.profile_snapshots, 'channel', 'bot_api/v1/channel',
+                                     fields, CHANNEL_FIELDS, dumps)
+            report.planned(update, fields)
+            if update.data is not None:
+                yield update
+
+    def _profile_sent(self, update, error, report):
+        report.sent(update, error)
+        if error is None:
+            self.profile_snapshots.update(update.key, update.hashes)
+
+    def create_event(self, family_id, title, description, start_time, end_time,
+                     recurring=None, family_user_ids=None):
         """create event in family calendar
 
         :param family_id: ID of selected family (required)
@@ -431,28 +1138,125 @@ class Bot(object):
         :type title: str
         :param description: description of event
         :type description: str
-        :param start_time: start date of event, formatted as MM.DD.YYYY (required)
-        :type start_time: datetime
-        :param end_time: end date of event, formatted as MM.DD.YYYY (required)
-        :type end_time: datetime
-        :param recurring: formatted with RRULE recurring event format (optional)
+        :param start_time: start date of event, formatted as MM.DD.YYYY, dates and datetimes are formatted so (required)
+        :type start_time: str or date or datetime
+        :param end_time: end date of event, formatted as MM.DD.YYYY, dates and datetimes are formatted so (required)
+        :type end_time: str or date or datetime
+        :param recurring: formatted with RRULE recurring event format, e.g. FREQ=WEEKLY;BYDAY=MO (optional)
         :type recurring: str
-        :param family_user_ids
+        :param family_user_ids: members invited to the event (optional)
         :type family_user_ids: list
         :return: request object
         """
-        return self._request(
+        return self._run(self._create_event_steps(family_id, title, description, start_time,
+                                                  end_time, recurring, family_user_ids))
+
+    def _create_event_steps(self, family_id, title, description, start_time, end_time,
+                            recurring=None, family_user_ids=None):
+        return (yield from self._request_steps(
             'POST',
-            'bot_api/v1/families/%d/events' % (family_id),
+            f'bot_api/v1/families/{family_id}/events',
             data={
                 'title': title,
                 'description': description,
-                'start_time': start_time,
-                'end_time': end_time,
+                'start_time': self._event_time(start_time),
+                'end_time': self._event_time(end_time),
                 'recurring': recurring,
                 'family_user_ids': family_user_ids
             }
-        )
+        ))
+
+    @staticmethod
+    def _event_time(value):
+        # the documented format, the API takes no time of day
+        if isinstance(value, datetime.date):
+            return value.strftime('%m.%d.%Y')
+        return value
+
+    def import_events(self, events, family_id=None, family_user_ids=None, checkpoint=None,
+                      max_workers=8, max_buffered=1000, rate=None, executor=None):
+        """create many calendar events
+
+        Events of one family are created one after the other in the order
+        given, different families concurrently. A recurring event is
+        created once with its RRULE, the API expands it. Events found in
+        ``checkpoint`` are skipped and every created event is added to it,
+        so an interrupted import can simply be run again. Creating starts
+        when the returned generator is iterated.
+
+        :param events: iCalendar feed (path, text or file object, see :func:`familyapp.ical.iter_ics`)
+            or an iterable of dicts with ``title``, ``description``, ``start_time``, ``end_time``
+            and optionally ``recurring``, ``uid``, ``family_id`` and ``family_user_ids`` (required)
+        :type events: str or file or iterable
+        :param family_id: family of events without a ``family_id`` (optional)
+        :type family_id: int
+        :param family_user_ids: members invited to events without ``family_user_ids`` (optional)
+        :type family_user_ids: list
+        :param checkpoint: created events, to resume an import (optional)
+        :type checkpoint: ImportCheckpoint
+        :param max_workers: maximum number of concurrent requests (optional)
+        :type max_workers: int
+        :param max_buffered: maximum number of events waiting for an earlier event of their family (optional)
+        :type max_buffered: int
+        :param rate: maximum number of events created per second (optional)
+        :type rate: float
+        :param executor: executor to send on instead of a private pool (optional)
+        :type executor: Executor
+        :return: generator of EventResult, in completion order, skipped events not included
+        """
+        create = self._event_creator(checkpoint, rate)
+        items = self._import_items(events, family_id, family_user_ids, checkpoint)
+        for item, response, error in run_ordered(create, items, self._event_family,
+                                                 max_workers, max_buffered, executor):
+            yield EventResult(item[0], item[1], response, error)
+
+    def _event_creator(self, checkpoint, rate):
+        limiter = TokenBucket(rate) if rate else None
+
+        def create(item):
+            return self._run(self._limited_steps(limiter, self._import_event_steps(checkpoint, item)))
+        return create
+
+    def _import_event_steps(self, checkpoint, item):
+        event_family_id, uid, fields = item
+        response = yield from self._create_event_steps(event_family_id, **fields)
+        self._event_created(checkpoint, event_family_id, uid, response)
+        return response
+
+    @staticmethod
+    def _event_family(item):
+        # events of one family are created one after the other
+        return str(item[0])
+
+    def _import_items(self, events, family_id, family_user_ids, checkpoint):
+        if isinstance(events, (str, bytes)) or hasattr(events, 'read'):
+            events = iter_ics(events)
+        for event in events:
+            event_family_id = event.get('family_id', family_id)
+            if event_family_id is None:
+                raise ValueError(f'No family_id for event {event.get("title")}')
+            uid = event.get('uid') or self._event_uid(event)
+            if checkpoint is not None and (event_family_id, uid) in checkpoint:
+                continue
+            yield event_family_id, uid, {
+                'title': event['title'],
+                'description': event.get('description'),
+                'start_time': event['start_time'],
+                'end_time': event['end_time'],
+                'recurring': event.get('recurring'),
+                'family_user_ids': event.get('family_user_ids', family_user_ids),
+            }
+
+    @staticmethod
+    def _event_uid(event):
+        # events without a UID are identified by what they describe
+        source = '\0'.join(str(event.get(field)) for field in (
+            'title', 'start_time', 'end_time', 'recurring'))
+        return hashlib.blake2b(source.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _event_created(self, checkpoint, family_id, uid, response):
+        if checkpoint is not None:
+            checkpoint.add(family_id, uid, response.get('id') if isinstance(response, dict) else None)
 
     def update_persistent_menu(self, persistent_menu):
         """update peristant menu
@@ -522,6 +1326,17 @@ class Bot(object):
         """
         self._handlers['message_created'] = callback
 
+    @property
+    def router(self):
+        """message Router, registered as the message handler on first use
+
+        ``@bot.router.payload('yes')``, ``@bot.router.command('/start')``
+        """
+        if self._router is None:
+            self._router = Router()
+            self.handle_message(self._router)
+        return self._router
+
     def handle_member_joined(self, callback):
         """triggered when new family member joined family
         READ MORE: https://familyappbot.docs.apiary.io/#introduction/webhooks/4.-receive-messages
@@ -535,24 +1350,172 @@ class Bot(object):
         self._handlers['left_from_family'] = callback
 
     def parse_request(self, json_payload, headers=None):
-        """parse incoming requests"""
+        """parse incoming requests
+
+        With a dispatcher the handler is queued and this returns right after
+        validation and decryption. DispatchQueueFull is raised when the
+        event can not be queued, answer the webhook with a 503 then.
+        """
+        return self._run(self._parse_request_steps(json_payload, headers))
+
+    def _parse_request_steps(self, json_payload, headers):
+        started = time.perf_counter()
+        event = self._validate_request(json_payload, headers)
+        if self.recorder is not None:
+            self.recorder.record(json_payload, headers)
+        event_data = json_payload['event_data']
+        fingerprint = None
+        if self.dedup is not None:
+            fingerprint = self._claim(event, event_data)
+            if fingerprint is None:
+                return
+        try:
+            if event == 'message_created':
+                event_data = yield from self._decrypt_message_steps(event_data)
+            yield from self._dispatch_steps(event, event_data)
+        except Exception:
+            if fingerprint is not None:
+                self.dedup.discard(fingerprint)
+            raise
+        if self.metrics is not None:
+            self.metrics.incr('events', event=event)
+            self.metrics.since('parse_request', started, event=event)
+
+    def _claim(self, event, event_data):
+        # runs before any decryption, redeliveries cost one lookup
+        fingerprint = event_fingerprint(event, event_data)
+        if self.dedup.add(fingerprint):
+            return fingerprint
+        if self.metrics is not None:
+            self.metrics.incr('duplicates', event=event)
+        return None
+
+    def _claim_batch(self, events):
+        """drop redeliveries from a batch, return it with the claimed fingerprints"""
+        if self.dedup is None:
+            return events, []
+        claimed = [(event, event_data, self._claim(event, event_data))
+                   for event, event_data in events]
+        return ([(event, event_data) for event, event_data, fingerprint in claimed
+                 if fingerprint is not None],
+                [fingerprint for event, event_data, fingerprint in claimed
+                 if fingerprint is not None])
+
+    def _release(self, fingerprints):
+        for fingerprint in fingerprints:
+            self.dedup.discard(fingerprint)
+
+    def _invalidate_conversations(self, event, event_data):
+        if event in self.FAMILY_EVENTS and self.conversation_cache is not None:
+            family_id = event_data.get('family_id')
+            conversation_ids = self.conversation_cache.invalidate_family(family_id)
+            if self.key_refresher is not None:
+                # membership changes rotate the family's keys
+                for conversation_id in conversation_ids:
+                    self.key_refresher.prefetch(family_id, conversation_id)
+
+    def _dispatch_steps(self, event, event_data):
+        self._invalidate_conversations(event, event_data)
+        if self.dispatcher is None:
+            if self.metrics is None:
+                yield Handle(self._handlers[event], event_data)
+            else:
+                yield from self._handler_steps(event, event_data)
+            return
+        # one ordering key per conversation, family events share (family_id, None)
+        key = (event_data.get('family_id'), event_data.get('conversation_id'))
+        self.dispatcher.submit(key, self._run_handler, event, event_data)
+
+    def _run_handler(self, event, event_data):
+        # on a dispatcher thread
+        return self._run_blocking(self._handler_steps(event, event_data))
+
+    def _handler_steps(self, event, event_data):
+        if self.metrics is None:
+            return (yield Handle(self._handlers[event], event_data))
+        started = time.perf_counter()
+        try:
+            return (yield Handle(self._handlers[event], event_data))
+        except Exception as e:
+            self._error('handler', e)
+            raise
+        finally:
+            self.metrics.since('handler', started, event=event)
+
+    def parse_requests(self, payloads, headers=None, batch_size=1000):
+        """parse a batch of incoming requests
+
+        All payloads must come with the same headers. Messages are grouped
+        by conversation key version, so every key is resolved and set up
+        once per batch, handlers still run in the order of the payloads.
+        A message that can not be decrypted, or whose key can not be
+        resolved, is logged, skipped and left as it is, the other events
+        are handled. Messages are decrypted in place only once the whole
+        batch was decrypted.
+
+        :param payloads: list of JSON payloads, NDJSON text or a file object with NDJSON lines
+        :type payloads: iterable
+        :param headers: request headers (required)
+        :type headers: dict
+        :param batch_size: payloads validated and decrypted together, bounds memory for streams (optional)
+        :type batch_size: int
+        :return: number of events handled, redeliveries skipped by dedup not included
+        """
+        return self._run(self._parse_requests_steps(payloads, headers, batch_size))
+
+    def _parse_requests_steps(self, payloads, headers, batch_size):
+        self._check_verify_token(headers)
+        count = 0
+        for batch in chunks(iter_payloads(payloads), batch_size):
+            events = [(self._validate_event(payload), payload['event_data']) for payload in batch]
+            self._record_batch(batch, headers)
+            events, fingerprints = self._claim_batch(events)
+            done = 0
+            try:
+                decrypted = yield from self._decrypt_batch(events)
+                for (event, event_data), content in zip(events, decrypted):
+                    if content is not None:
+                        event_data['is_decrypted'] = True
+                        event_data['content'] = content
+                for index, (event, event_data) in enumerate(events):
+                    done = index
+                    if event == 'message_created' and decrypted[index] is None:
+                        # not handled, so a redelivery is tried again
+                        self._release(fingerprints[index:index + 1])
+                        continue
+                    yield from self._dispatch_steps(event, event_data)
+                    count += 1
+                    if self.metrics is not None:
+                        self.metrics.incr('events', event=event)
+                done = len(events)
+            except Exception:
+                self._release(fingerprints[done:])
+                raise
+        return count
+
+    def _record_batch(self, payloads, headers):
+        if self.recorder is not None:
+            for json_payload in payloads:
+                self.recorder.record(json_payload, headers)
+
+    def _validate_request(self, json_payload, headers=None):
+        self._check_verify_token(headers)
+        return self._validate_event(json_payload)
+
+    def _check_verify_token(self, headers):
         if not headers:
             headers = {}
 
         verify_token = headers.get('Authorization', None)
-        event = json_payload.get('event_type', None)
-
         if verify_token != self.verify_token:
             raise Exception("Invalid verify_token")
 
+    def _validate_event(self, json_payload):
+        event = json_payload.get('event_type', None)
+
         if event not in self._handlers:
             raise Exception("Event type ({}) is not handled".format(event))
 
         if 'event_data' not in json_payload:
             raise Exception("Invalid JSON payload")
-        if event == 'message_created':
-            decrypted_message = self._decrypt_message(
-                json_payload['event_data'])
-            self._handlers[event](decrypted_message)
-            return
-        self._handlers[event](json_payload['event_data'])
+        return event
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from .store import KeyStore
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    def __init__(self, maxsize=10000, ttl=None, clock=time.monotonic):
+        """Thread-safe LRU cache with optional expiry
+
+        :param maxsize: maximum number of entries, least recently used are evicted first (optional)
+        :type maxsize: int
+        :param ttl: seconds after which an entry expires (optional)
+        :type ttl: float
+        :param clock: function returning the current time (optional)
+        :type clock: callable
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class _CachedMapping(MutableMapping):
+    def __init__(self, cache, mapping):
+        self.cache = cache
+        self.mapping = mapping
+        self.on_read = None
+
+    def __getitem__(self, key):
+        if self.on_read is not None:
+            self.on_read()
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.mapping[key]
+            self.cache.set(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.mapping[key] = value
+        self.cache.set(key, value)
+
+    def __delitem__(self, key):
+        self.cache.pop(key)
+        del self.mapping[key]
+
+    def __iter__(self):
+        return iter(self.mapping)
+
+    def __len__(self):
+        return len(self.mapping)
+
+
+class CachedKeyStore(KeyStore):
+    def __init__(self, store, maxsize=10000, ttl=None, sync_interval=1.0):
+        """Bounded in-memory cache in front of another key store
+
+        Reads go to the cache first and fall back to ``store``, writes go
+        to both. Only the cache is kept in RAM.
+
+        Keys never change once written, but the current key version of a
+        conversation does. When the store is shared with other processes
+        the cached conversations are dropped after they wrote to it,
+        checked at most every ``sync_interval`` seconds.
+
+        :param store: persistent store (required)
+        :type store: KeyStore
+        :param maxsize: maximum number of cached entries per mapping (optional)
+        :type maxsize: int
+        :param ttl: seconds after which a cached entry is re-read from the store (optional)
+        :type ttl: float
+        :param sync_interval: seconds between checks for writes of other processes, None disables them (optional)
+        :type sync_interval: float
+        """
+        self.store = store
+        self.sync_interval = sync_interval
+        self._synced = time.monotonic()
+        self.keys = _CachedMapping(LRUCache(maxsize, ttl), store['keys'])
+        self.conversations = _CachedMapping(LRUCache(maxsize, ttl), store['conversations'])
+        if sync_interval is not None:
+            self.conversations.on_read = self._sync
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced < self.sync_interval:
+            return
+        self._synced = now
+        if self.store.changed():
+            self.conversations.cache.clear()
+
+    def put(self, conversation_id, family_id, conversation_key_version_id, key):
+        self.store.put(conversation_id, family_id, conversation_key_version_id, key)
+        self.keys.cache.set(conversation_key_version_id, key)
+        self.conversations.cache.set(conversation_id, {
+            'family_id': family_id, 'conversation_key_version_id': conversation_key_version_id})
+
+    def update(self, data):
+        self.store.update(data)
+
+    def stats(self):
+        """hit/miss/eviction counters of both caches"""
+        return {'keys': self.keys.cache.stats(),
+                'conversations': self.conversations.cache.stats()}
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.keys.cache.clear()
+        self.conversations.cache.clear()
+        self.store.close()
@@ -0,0 +1,53 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ImportCheckpoint(object):
+    def __init__(self, path):
+        """Record of the events Bot.import_events created, to resume an import
+
+        Every created event is appended as one JSON line ``[family_id,
+        uid, event id]`` and flushed, so an import that is interrupted and
+        run again skips what was created before. A torn last line of a
+        crashed run is ignored.
+
+        :param path: checkpoint file, created if missing (required)
+        :type path: str
+        """
+        self.path = path
+        self._done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        family_id, uid, _ = json.loads(line)
+                    except ValueError:
+                        logger.warning('ignoring damaged checkpoint line in %s', path)
+                        continue
+                    self._done.add((str(family_id), uid))
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, item):
+        family_id, uid = item
+        return (str(family_id), uid) in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def add(self, family_id, uid, event_id=None):
+        with self._lock:
+            self._done.add((str(family_id), uid))
+            self._file.write(json.dumps([family_id, uid, event_id]) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
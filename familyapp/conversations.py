@@ -0,0 +1,89 @@
+import threading
+
+from .cache import LRUCache
+
+
+class ConversationCache(object):
+    def __init__(self, maxsize=10000, ttl=300):
+        """TTL cache of conversation objects with a family member index
+
+        Entries are keyed by ``str(family_id)`` so ids coming from webhooks
+        and from API calls match. The family index is refreshed whenever
+        one of its conversations is cached or read, so invalidate_family
+        reaches every conversation still cached. Members evicted before
+        their conversation are found again in it. Cached conversations are
+        shared, do not modify them.
+
+        :param maxsize: maximum number of cached conversations (optional)
+        :type maxsize: int
+        :param ttl: seconds a conversation is served from the cache (optional)
+        :type ttl: float
+        """
+        self.conversations = LRUCache(maxsize, ttl)
+        self.members = LRUCache(maxsize * 4, ttl)
+        self._families = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, family_id, conversation_id):
+        family_id = str(family_id)
+        conversation = self.conversations.get((family_id, str(conversation_id)))
+        if conversation is not None:
+            # keep the family index at least as recently used as its conversations
+            self._families.get(family_id)
+        return conversation
+
+    def set(self, family_id, conversation_id, conversation):
+        family_id = str(family_id)
+        member_ids = [str(member['id']) for member in conversation.get('family_users') or ()]
+        self.conversations.set((family_id, str(conversation_id)), conversation)
+        for member_id, member in zip(member_ids, conversation.get('family_users') or ()):
+            self.members.set((family_id, member_id), member)
+        with self._lock:
+            family = self._families.get(family_id)
+            if family is None:
+                family = (set(), set())
+            # set again so the index expires no earlier than the conversation just cached
+            self._families.set(family_id, family)
+            family[0].add(str(conversation_id))
+            family[1].update(member_ids)
+
+    def get_member(self, family_id, user_id):
+        family_id, user_id = str(family_id), str(user_id)
+        member = self.members.get((family_id, user_id))
+        if member is not None:
+            return member
+        # evicted from the members while its conversation is still cached
+        for conversation_id in self.family_conversations(family_id):
+            conversation = self.conversations.get((family_id, conversation_id))
+            for member in (conversation or {}).get('family_users') or ():
+                if str(member['id']) == user_id:
+                    self.members.set((family_id, user_id), member)
+                    return member
+        return None
+
+    def invalidate(self, family_id, conversation_id):
+        self.conversations.pop((str(family_id), str(conversation_id)))
+
+    def family_conversations(self, family_id):
+        """ids of the cached conversations of a family"""
+        family = self._families.get(str(family_id))
+        with self._lock:
+            return list(family[0]) if family is not None else []
+
+    def invalidate_family(self, family_id):
+        """drop every conversation and member of a family
+
+        :return: ids of the dropped conversations
+        """
+        family_id = str(family_id)
+        with self._lock:
+            conversation_ids, member_ids = self._families.pop(family_id) or ((), ())
+        for conversation_id in conversation_ids:
+            self.conversations.pop((family_id, conversation_id))
+        for member_id in member_ids:
+            self.members.pop((family_id, member_id))
+        return list(conversation_ids)
+
+    def stats(self):
+        return {'conversations': self.conversations.stats(),
+                'members': self.members.stats()}
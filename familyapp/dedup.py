@@ -0,0 +1,127 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def event_fingerprint(event, event_data):
+    """16 byte digest identifying one webhook event across deliveries
+
+    Messages are identified by their id, or by conversation, key version,
+    IV and encrypted content when the id is missing. Other events by all
+    of their data.
+    """
+    if event == 'message_created':
+        if event_data.get('id') is not None:
+            source = f'{event}\0{event_data["id"]}'
+        else:
+            source = '\0'.join(str(event_data.get(field)) for field in (
+                'conversation_id', 'conversation_key_version_id', 'iv', 'content'))
+    else:
+        source = f'{event}\0{json.dumps(event_data, sort_keys=True, default=str)}'
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=16).digest()
+
+
+class SeenSet(object):
+    """Base class of the seen-sets used by Bot(dedup=...)
+
+    Implementations shared by several workers (e.g. a Redis ``SET NX EX``)
+    must make :meth:`add` an atomic check-and-set.
+    """
+
+    def add(self, fingerprint):
+        """remember a fingerprint, False if it was already seen within the window"""
+        raise NotImplementedError
+
+    def discard(self, fingerprint):
+        """forget a fingerprint, so a redelivery of a failed event is processed"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySeenSet(SeenSet):
+    def __init__(self, maxsize=100000, window=600, clock=time.monotonic):
+        """Seen-set of one process, bounded in time and size
+
+        :param maxsize: maximum number of fingerprints, the oldest are forgotten first (optional)
+        :type maxsize: int
+        :param window: seconds a fingerprint is remembered (optional)
+        :type window: float
+        """
+        self.maxsize = maxsize
+        self.window = window
+        self._clock = clock
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def add(self, fingerprint):
+        now = self._clock()
+        with self._lock:
+            # the window is the same for all entries, so they expire in insertion order
+            while self._seen and next(iter(self._seen.values())) <= now:
+                self._seen.popitem(last=False)
+            if fingerprint in self._seen:
+                return False
+            self._seen[fingerprint] = now + self.window
+            if len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def discard(self, fingerprint):
+        with self._lock:
+            self._seen.pop(fingerprint, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class SQLiteSeenSet(SeenSet):
+    def __init__(self, path, window=600, timeout=30, prune_every=1000):
+        """Seen-set in a SQLite database shared by the worker processes of one host
+
+        :param path: path to the database file (required)
+        :type path: str
+        :param window: seconds a fingerprint is remembered (optional)
+        :type window: float
+        :param timeout: seconds to wait for a write lock held by another process (optional)
+        :type timeout: float
+        :param prune_every: delete expired rows after this many adds (optional)
+        :type prune_every: int
+        """
+        self.path = path
+        self.window = window
+        self.prune_every = prune_every
+        self._adds = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen (fingerprint BLOB PRIMARY KEY, expires REAL)')
+
+    def add(self, fingerprint):
+        # wall clock, the rows are compared across processes
+        now = time.time()
+        with self._lock:
+            changed = self._db.execute(
+                'INSERT INTO seen VALUES (?, ?) ON CONFLICT (fingerprint) '
+                'DO UPDATE SET expires = excluded.expires WHERE seen.expires <= ?',
+                (fingerprint, now + self.window, now)).rowcount
+            self._adds += 1
+            if self._adds % self.prune_every == 0:
+                self._db.execute('DELETE FROM seen WHERE expires <= ?', (now,))
+        return changed == 1
+
+    def discard(self, fingerprint):
+        with self._lock:
+            self._db.execute('DELETE FROM seen WHERE fingerprint = ?', (fingerprint,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
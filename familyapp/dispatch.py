@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DispatchQueueFull(Exception):
+    """raised when an event can not be queued, answer the webhook with 503"""
+    status_code = 503
+
+
+class Dispatcher(object):
+    def __init__(self, workers=4, queue_size=1000, overflow='block', block_timeout=None):
+        """Run webhook handlers on a pool of worker threads
+
+        Events are sharded by their ordering key (the conversation), each
+        shard is served by a single worker, so events of one conversation
+        run in the order they were received.
+
+        :param workers: number of worker threads (optional)
+        :type workers: int
+        :param queue_size: maximum number of queued events, split across workers (optional)
+        :type queue_size: int
+        :param overflow: what to do when the queue is full, 'block', 'drop' or 'reject' (optional)
+        :type overflow: str
+        :param block_timeout: with 'block', seconds to wait before raising DispatchQueueFull (optional)
+        :type block_timeout: float
+        """
+        if overflow not in ('block', 'drop', 'reject'):
+            raise ValueError(f'Invalid overflow policy {overflow}')
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        shard_size = max(1, queue_size // workers)
+        self._queues = [queue.Queue(maxsize=shard_size) for _ in range(workers)]
+        self._closed = False
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, args=(q,), daemon=True,
+                                          name=f'familyapp-dispatch-{i}')
+                         for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def submit(self, key, fn, *args):
+        """queue ``fn(*args)`` behind earlier events with the same key
+
+        :return: False if the event was dropped
+        """
+        if self._closed:
+            raise DispatchQueueFull('Dispatcher is shut down')
+        q = self._queues[hash(key) % len(self._queues)]
+        try:
+            if self.overflow == 'block':
+                q.put((fn, args), timeout=self.block_timeout)
+            else:
+                q.put_nowait((fn, args))
+        except queue.Full:
+            if self.overflow == 'drop':
+                self._count('dropped')
+                return False
+            self._count('rejected')
+            raise DispatchQueueFull('Dispatch queue is full')
+        self._count('submitted')
+        return True
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception:
+                self._count('errors')
+                logger.exception('webhook handler failed')
+            finally:
+                self._count('processed')
+
+    def queued(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            'queued': self.queued(),
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'errors': self.errors,
+        }
+
+    def shutdown(self, drain=True, timeout=None):
+        """stop accepting events and stop the workers
+
+        :param drain: run the events that are already queued (optional)
+        :type drain: bool
+        :param timeout: seconds to wait for the workers (optional)
+        :type timeout: float
+        :return: True if all workers finished in time
+        """
+        self._closed = True
+        if not drain:
+            for q in self._queues:
+                try:
+                    while True:
+                        q.get_nowait()
+                except queue.Empty:
+                    pass
+        for q in self._queues:
+            q.put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
@@ -0,0 +1,107 @@
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# lock files open in this process, by real path. Record locks belong to
+# the process and closing any descriptor of a file drops all of them, so
+# every StripedFileLock on one file shares its descriptor and stripe locks.
+_files = {}
+_files_guard = threading.Lock()
+
+
+class _LockFile(object):
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.refs = 0
+        # created on first use, idle bots do not pay for all stripes
+        self.locks = {}
+
+    def stripe_lock(self, stripe):
+        stripe_lock = self.locks.get(stripe)
+        if stripe_lock is None:
+            with _files_guard:
+                stripe_lock = self.locks.setdefault(stripe, threading.Lock())
+        return stripe_lock
+
+
+def _open(path):
+    with _files_guard:
+        lock_file = _files.get(path)
+        if lock_file is None:
+            lock_file = _files[path] = _LockFile(path)
+        lock_file.refs += 1
+        return lock_file
+
+
+def _close(path):
+    with _files_guard:
+        lock_file = _files[path]
+        lock_file.refs -= 1
+        if lock_file.refs == 0:
+            del _files[path]
+            os.close(lock_file.fd)
+
+
+class StripedFileLock(object):
+    def __init__(self, path, stripes=64):
+        """Inter-process lock per key, backed by byte-range locks on one file
+
+        Keys are hashed onto ``stripes`` bytes of the file and locked with
+        ``fcntl.lockf``. Record locks belong to the process, so threads of
+        one process are serialized by an additional in-process lock per
+        stripe. The descriptor and the in-process locks are shared by all
+        instances on the same file, two bots with one token in a process
+        exclude each other too. Without fcntl (Windows) only the
+        in-process locks apply.
+
+        :param path: lock file, created if missing (required)
+        :type path: str
+        :param stripes: number of independent locks (optional)
+        :type stripes: int
+        """
+        self.path = path
+        self.stripes = stripes
+        self._real_path = os.path.realpath(path)
+        self._file = _open(self._real_path)
+
+    def _stripe(self, key):
+        return zlib.crc32(str(key).encode('utf-8')) % self.stripes
+
+    def acquire(self, key):
+        """lock ``key``, may be released from another thread"""
+        stripe = self._stripe(key)
+        stripe_lock = self._file.stripe_lock(stripe)
+        stripe_lock.acquire()
+        if fcntl is not None:
+            try:
+                fcntl.lockf(self._file.fd, fcntl.LOCK_EX, 1, stripe)
+            except BaseException:
+                stripe_lock.release()
+                raise
+
+    def release(self, key):
+        stripe = self._stripe(key)
+        if fcntl is not None:
+            fcntl.lockf(self._file.fd, fcntl.LOCK_UN, 1, stripe)
+        self._file.locks[stripe].release()
+
+    @contextmanager
+    def lock(self, key):
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def close(self):
+        """the file is closed with its last instance in the process"""
+        if self._file is not None:
+            self._file = None
+            _close(self._real_path)
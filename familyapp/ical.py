@@ -0,0 +1,204 @@
+"""Streaming iCalendar (RFC 5545) reader for Bot.import_events
+
+Only what event import needs is parsed: VEVENT UID, SUMMARY, DESCRIPTION,
+DTSTART, DTEND/DURATION, RRULE, RDATE and EXDATE. Recurring series are
+kept as one event with their RRULE, the API expands it. Extra dates of a
+series (RDATE) are yielded as single events. The API has no per-instance
+exceptions, so instances overriding a series (RECURRENCE-ID) are skipped
+and excluded dates (EXDATE) are logged and skipped.
+"""
+import datetime
+import io
+import logging
+import re
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+_DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+# properties that may occur more than once, each with a list of values
+_LISTS = ('RDATE', 'EXDATE')
+
+logger = logging.getLogger(__name__)
+
+
+def _lines(source):
+    # path, ICS text, or a text/binary file object or iterable of lines
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    if isinstance(source, str):
+        if source.lstrip().startswith('BEGIN:'):
+            source = io.StringIO(source)
+        else:
+            with open(source, encoding='utf-8') as handle:
+                yield from _lines(handle)
+            return
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line.rstrip('\r\n')
+
+
+def unfold(source):
+    """yield logical content lines, joining folded continuation lines"""
+    current = None
+    for line in _lines(source):
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_property(line):
+    """split ``NAME;PARAM=VALUE:value`` into (name, params, value)"""
+    head, _, value = line.partition(':')
+    # a quoted parameter value may contain ':'
+    while head.count('"') % 2:
+        extra, _, value = value.partition(':')
+        head = f'{head}:{extra}'
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda match: _ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def parse_datetime(value, params=None):
+    """date or datetime of a DTSTART/DTEND value, aware when it has a TZID or Z"""
+    params = params or {}
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.datetime.strptime(value, '%Y%m%d').date()
+    if value.endswith('Z'):
+        return datetime.datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(
+            tzinfo=datetime.timezone.utc)
+    parsed = datetime.datetime.strptime(value, '%Y%m%dT%H%M%S')
+    tzid = params.get('TZID', '').strip('"')
+    if tzid and ZoneInfo is not None:
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(tzid))
+        except (KeyError, ValueError):
+            # non-IANA names (e.g. Outlook's) stay floating
+            pass
+    return parsed
+
+
+def parse_duration(value):
+    match = _DURATION.match(value)
+    if match is None:
+        raise ValueError(f'Invalid duration {value}')
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = datetime.timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                                  minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def _event(properties):
+    start = parse_datetime(*properties['DTSTART'])
+    end = start
+    if 'DTEND' in properties:
+        end = parse_datetime(*properties['DTEND'])
+        if not isinstance(end, datetime.datetime) and end > start:
+            # DTEND of all-day events is exclusive
+            end -= datetime.timedelta(days=1)
+    elif 'DURATION' in properties:
+        end = start + parse_duration(properties['DURATION'][0])
+    uid = properties.get('UID', (None,))[0]
+    if 'RECURRENCE-ID' in properties:
+        # an instance of a series whose master is not in the feed
+        uid = f'{uid}/{properties["RECURRENCE-ID"][0]}'
+    return {
+        'uid': uid,
+        'title': unescape(properties.get('SUMMARY', ('',))[0]),
+        'description': unescape(properties.get('DESCRIPTION', ('',))[0]) or None,
+        'start_time': start,
+        'end_time': end,
+        'recurring': properties.get('RRULE', (None,))[0],
+    }
+
+
+def _instances(properties, event):
+    """single events of the RDATEs of ``event``, lasting as long as it"""
+    for values, params in properties.get('RDATE', ()):
+        for value in values.split(','):
+            start, _, end = value.partition('/')
+            start = parse_datetime(start, params)
+            if not end:
+                end = start + (event['end_time'] - event['start_time'])
+            elif end.lstrip('+-').startswith('P'):
+                end = start + parse_duration(end)
+            else:
+                end = parse_datetime(end, params)
+            yield dict(event, uid=f'{event["uid"]}/{value}', start_time=start,
+                       end_time=end, recurring=None)
+
+
+def _excluded(properties, uid):
+    dates = [value for values, _ in properties.get('EXDATE', ()) for value in values.split(',')]
+    if dates:
+        logger.warning('event %s: skipping EXDATE %s, the API has no per-instance exceptions',
+                       uid, ','.join(dates))
+
+
+def iter_ics(source):
+    """yield the events of an iCalendar feed as dicts, one VEVENT at a time
+
+    Events have ``uid``, ``title``, ``description``, ``start_time``,
+    ``end_time`` (date or datetime) and ``recurring`` (the RRULE value or
+    None). Every RDATE of an event follows it as a single event with the
+    uid ``<uid>/<RDATE value>``, EXDATEs are logged and skipped.
+    Overrides of a recurring event are dropped, overrides whose series is
+    not in the feed are yielded at the end.
+
+    :param source: path, ICS text, file object or iterable of lines (required)
+    :type source: str or bytes or file or iterable
+    """
+    series = set()
+    overrides = {}
+    properties = None
+    depth = 0
+    for line in unfold(source):
+        name, params, value = parse_property(line)
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT':
+                properties, depth = {}, 0
+            elif properties is not None:
+                # VALARM and other components nested in the event
+                depth += 1
+            continue
+        if name == 'END' and properties is not None:
+            if depth:
+                depth -= 1
+                continue
+            event, properties = properties, None
+            if 'DTSTART' not in event:
+                continue
+            uid = event.get('UID', (None,))[0]
+            if 'RECURRENCE-ID' in event:
+                if uid not in series:
+                    overrides.setdefault(uid, []).append(event)
+                continue
+            if 'RRULE' in event or 'RDATE' in event:
+                series.add(uid)
+                overrides.pop(uid, None)
+            master = _event(event)
+            _excluded(event, uid)
+            yield master
+            yield from _instances(event, master)
+            continue
+        if properties is None or depth:
+            continue
+        if name in _LISTS:
+            properties.setdefault(name, []).append((value, params))
+        elif name not in properties:
+            properties[name] = (value, params)
+    for uid, events in overrides.items():
+        for event in events:
+            yield _event(event)
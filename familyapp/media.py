@@ -0,0 +1,96 @@
+import base64
+import io
+import os
+import threading
+
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+class Media(object):
+    def __init__(self, source, cache=False, chunk_size=CHUNK_SIZE):
+        """Binary payload (e.g. a photo) sent base64 encoded inside a JSON body
+
+        The source is read and encoded chunk by chunk while the request
+        body is written, the whole base64 string never exists in memory.
+        With ``cache`` it is encoded once on first use and kept, so the
+        same photo can be sent many times without encoding it again.
+
+        :param source: file path, binary file object or bytes (required)
+        :type source: str or os.PathLike or file or bytes
+        :param cache: keep the encoded payload after the first send (optional)
+        :type cache: bool
+        :param chunk_size: bytes read at once, rounded down to a multiple of 3 (optional)
+        :type chunk_size: int
+        """
+        self.source = source
+        self.cache = cache
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        self._encoded = None
+        self._lock = threading.Lock()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.source = memoryview(source).cast('B')
+            self.size = self.source.nbytes
+        elif hasattr(source, 'read'):
+            # file objects are read from their current position, on every send
+            self._offset = source.tell()
+            self.size = source.seek(0, io.SEEK_END) - self._offset
+            source.seek(self._offset)
+        else:
+            self.source = os.fspath(source)
+            self.size = os.path.getsize(self.source)
+        self.encoded_size = 4 * ((self.size + 2) // 3)
+
+    def _read(self):
+        if isinstance(self.source, memoryview):
+            for start in range(0, self.size, self.chunk_size):
+                yield self.source[start:start + self.chunk_size]
+        elif isinstance(self.source, str):
+            with open(self.source, 'rb') as handle:
+                yield from iter(lambda: handle.read(self.chunk_size), b'')
+        else:
+            self.source.seek(self._offset)
+            remaining = self.size
+            while remaining > 0:
+                chunk = self.source.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _encode(self):
+        encoded = bytearray(self.encoded_size)
+        position = 0
+        for chunk in self._read():
+            chunk = base64.b64encode(chunk)
+            encoded[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        return encoded
+
+    def __iter__(self):
+        """base64 encoded chunks"""
+        if self.cache and self._encoded is None:
+            with self._lock:
+                if self._encoded is None:
+                    self._encoded = self._encode()
+        if self._encoded is not None:
+            encoded = memoryview(self._encoded)
+            step = 4 * self.chunk_size // 3
+            for start in range(0, self.encoded_size, step):
+                yield encoded[start:start + step]
+            return
+        for chunk in self._read():
+            yield base64.b64encode(chunk)
+
+    def __repr__(self):
+        return f'<Media {self.size} bytes>'
+
+
+def as_media(source, cache=False, base64_str=False):
+    """wrap a photo argument in Media
+
+    :param base64_str: strings are already base64 encoded images, not paths (optional)
+    :type base64_str: bool
+    """
+    if source is None or isinstance(source, Media) or (base64_str and isinstance(source, str)):
+        return source
+    return Media(source, cache=cache)
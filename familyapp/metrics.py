@@ -0,0 +1,134 @@
+import bisect
+import socket
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Counters, latency histograms and hooks for Bot instrumentation
+
+        Pass an instance as ``Bot(metrics=...)``; without it Bot skips all
+        timing. Stages timed by Bot: ``request`` (by endpoint family),
+        ``key_fetch``, ``key_store_write``, ``key_refresh``, ``decrypt``,
+        ``handler`` and ``parse_request`` (by event). Counters:
+        ``api_responses`` (by status), ``key_cache`` (hit/miss),
+        ``key_refresh`` (by result), ``events``, ``duplicates`` (by event)
+        and ``errors`` (by stage).
+
+        :param buckets: upper bounds of the histogram buckets in seconds (optional)
+        :type buckets: tuple
+        """
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, callback):
+        """call ``callback(kind, name, value, labels)`` for every sample
+
+        ``kind`` is 'counter' or 'timing', timings are in seconds.
+        """
+        self._hooks.append(callback)
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        for hook in self._hooks:
+            hook('counter', name, value, labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+        for hook in self._hooks:
+            hook('timing', name, seconds, labels)
+
+    def since(self, name, started, **labels):
+        """observe the time elapsed since ``started`` (a ``time.perf_counter()`` value)"""
+        self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """plain dict copy of all counters and histograms"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        return {
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in counters.items()],
+            'histograms': [{'name': name, 'labels': dict(labels),
+                            'buckets': dict(zip(self.buckets + (float('inf'),), value[:-1])),
+                            'count': sum(value[:-1]), 'sum': value[-1]}
+                           for (name, labels), value in histograms.items()],
+        }
+
+    def to_prometheus(self, prefix='familyapp'):
+        """render all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in sorted(snapshot['counters'], key=lambda c: c['name']):
+            name = f'{prefix}_{counter["name"]}_total'
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{_labels(counter["labels"])} {counter["value"]}')
+        for histogram in sorted(snapshot['histograms'], key=lambda h: h['name']):
+            name = f'{prefix}_{histogram["name"]}_seconds'
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} histogram')
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{_labels(histogram["labels"], le=le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(histogram["labels"])} {histogram["sum"]}')
+            lines.append(f'{name}_count{_labels(histogram["labels"])} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class StatsdExporter(object):
+    def __init__(self, host='127.0.0.1', port=8125, prefix='familyapp'):
+        """Metrics hook sending every sample to statsd over UDP
+
+        ``metrics.add_hook(StatsdExporter())``, labels are appended to the
+        metric name.
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, kind, name, value, labels):
+        parts = [self.prefix, name] + [str(labels[k]) for k in sorted(labels)]
+        if kind == 'timing':
+            line = f'{".".join(parts)}:{value * 1000:.3f}|ms'
+        else:
+            line = f'{".".join(parts)}:{value}|c'
+        try:
+            self._socket.sendto(line.encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        self._socket.close()
@@ -0,0 +1,29 @@
+import io
+import itertools
+import json
+
+
+def iter_payloads(source):
+    """Yield webhook payloads from a list, NDJSON text or a file object
+
+    :param source: iterable of dicts, NDJSON ``str``/``bytes``, a file
+        object or any iterable of NDJSON lines
+    """
+    if isinstance(source, (str, bytes)):
+        source = io.BytesIO(source.encode('utf-8') if isinstance(source, str) else source)
+    for item in source:
+        if isinstance(item, dict):
+            yield item
+            continue
+        item = item.strip()
+        if item:
+            yield json.loads(item)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
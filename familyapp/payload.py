@@ -0,0 +1,112 @@
+import functools
+import json
+
+from .media import Media
+
+
+class RawJSON(object):
+    __slots__ = ('json',)
+
+    def __init__(self, value):
+        """Immutable, already serialized JSON value
+
+        Spliced into request bodies as is, see :func:`familyapp.freeze`.
+
+        :param value: JSON text (required)
+        :type value: str or bytes
+        """
+        object.__setattr__(self, 'json', value.encode('utf-8') if isinstance(value, str) else bytes(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RawJSON is immutable')
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and other.json == self.json
+
+    def __hash__(self):
+        return hash(self.json)
+
+    def __repr__(self):
+        return f'RawJSON({self.json.decode("utf-8")!r})'
+
+
+@functools.lru_cache(maxsize=256)
+def _key(key):
+    return json.dumps(key).encode('utf-8')
+
+
+def plain(data):
+    """copy of a body dict with RawJSON and Media values as plain JSON values"""
+    copy = dict(data)
+    for key, value in data.items():
+        if isinstance(value, RawJSON):
+            copy[key] = json.loads(value.json)
+        elif isinstance(value, Media):
+            copy[key] = b''.join(value).decode('ascii')
+    return copy
+
+
+def _encode(dumps, value):
+    value = dumps(value)
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+class JSONBody(object):
+    def __init__(self, data, dumps=json.dumps):
+        """JSON object body with Media values streamed as base64 strings
+
+        RawJSON values are copied in as they are. Iterating yields the
+        encoded body in chunks and can be repeated for retries. ``len()``
+        is the exact body size, so it is sent with a Content-Length
+        instead of chunked.
+
+        :param data: request data, a flat dict (required)
+        :type data: dict
+        :param dumps: JSON encoder for the other values, returning str or bytes (optional)
+        :type dumps: callable
+        """
+        self._parts = []
+        plain = {key: value for key, value in data.items()
+                 if not isinstance(value, (Media, RawJSON))}
+        # plain values in one encoder call, the others appended after them
+        pending = [_encode(dumps, plain)[:-1]]
+        separator = b', ' if plain else b''
+        for key, value in data.items():
+            if isinstance(value, Media):
+                pending += [separator, _key(key), b': "']
+                self._parts.append(b''.join(pending))
+                self._parts.append(value)
+                pending = [b'"']
+            elif isinstance(value, RawJSON):
+                pending += [separator, _key(key), b': ', value.json]
+            else:
+                continue
+            separator = b', '
+        pending.append(b'}')
+        self._parts.append(b''.join(pending))
+        self.length = sum(len(part) if isinstance(part, bytes) else part.encoded_size
+                          for part in self._parts)
+
+    @staticmethod
+    def needed(data):
+        return isinstance(data, dict) and any(isinstance(v, (Media, RawJSON)) for v in data.values())
+
+    @property
+    def streamed(self):
+        """True when the body holds Media, otherwise it is sent as one bytes object"""
+        return len(self._parts) > 1
+
+    def __len__(self):
+        return self.length
+
+    def __bytes__(self):
+        if not self.streamed:
+            return self._parts[0]
+        return b''.join(self)
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from part
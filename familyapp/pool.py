@@ -0,0 +1,173 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+_END = object()
+
+
+def run_bounded(fn, items, max_workers=8, executor=None):
+    """Run ``fn(item)`` for every item on a thread pool
+
+    At most ``max_workers`` calls are in flight, so ``items`` may be a
+    long or lazy iterable. Yields ``(item, result, error)`` in completion
+    order, ``error`` is the raised exception or None.
+
+    :param fn: function called with each item (required)
+    :type fn: callable
+    :param items: iterable of items (required)
+    :type items: iterable
+    :param max_workers: maximum number of concurrent calls (optional)
+    :type max_workers: int
+    :param executor: executor to run on instead of a private pool (optional)
+    :type executor: Executor
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+    items = iter(items)
+    try:
+        while True:
+            for item in items:
+                pending[executor.submit(fn, item)] = item
+                if len(pending) >= max_workers:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def run_ordered(fn, items, key, max_workers=8, max_buffered=1000, executor=None):
+    """Run ``fn(item)`` for every item, in order for items with the same key
+
+    Like :func:`run_bounded`, but an item only starts after the previous
+    item with the same ``key(item)`` finished. Items waiting for their
+    predecessor are buffered, at most ``max_buffered`` of them before
+    reading from ``items`` pauses. Yields ``(item, result, error)`` in
+    completion order.
+
+    :param fn: function called with each item (required)
+    :type fn: callable
+    :param items: iterable of items (required)
+    :type items: iterable
+    :param key: function returning the ordering key of an item (required)
+    :type key: callable
+    :param max_workers: maximum number of concurrent calls (optional)
+    :type max_workers: int
+    :param max_buffered: maximum number of items waiting for their predecessor (optional)
+    :type max_buffered: int
+    :param executor: executor to run on instead of a private pool (optional)
+    :type executor: Executor
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+    # keys with a call in flight, mapped to the items queued behind it
+    waiting = {}
+    buffered = 0
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < max_workers and buffered < max_buffered:
+                item = next(items, _END)
+                if item is _END:
+                    break
+                item_key = key(item)
+                if item_key in waiting:
+                    waiting[item_key].append(item)
+                    buffered += 1
+                    continue
+                waiting[item_key] = deque()
+                pending[executor.submit(fn, item)] = (item, item_key)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, item_key = pending.pop(future)
+                queued = waiting[item_key]
+                if queued:
+                    successor = queued.popleft()
+                    buffered -= 1
+                    pending[executor.submit(fn, successor)] = (successor, item_key)
+                else:
+                    del waiting[item_key]
+                error = future.exception()
+                yield item, None if error else future.result(), error
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+async def arun_bounded(fn, items, max_workers=8):
+    """asyncio counterpart of :func:`run_bounded`, ``fn(item)`` returns an awaitable
+
+    An async generator of ``(item, result, error)`` in completion order.
+    """
+    pending = {}
+    items = iter(items)
+    try:
+        while True:
+            for item in items:
+                pending[asyncio.ensure_future(fn(item))] = item
+                if len(pending) >= max_workers:
+                    break
+            if not pending:
+                return
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = pending.pop(task)
+                error = task.exception()
+                yield item, None if error else task.result(), error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def arun_ordered(fn, items, key, max_workers=8, max_buffered=1000):
+    """asyncio counterpart of :func:`run_ordered`, ``fn(item)`` returns an awaitable"""
+    pending = {}
+    waiting = {}
+    buffered = 0
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < max_workers and buffered < max_buffered:
+                item = next(items, _END)
+                if item is _END:
+                    break
+                item_key = key(item)
+                if item_key in waiting:
+                    waiting[item_key].append(item)
+                    buffered += 1
+                    continue
+                waiting[item_key] = deque()
+                pending[asyncio.ensure_future(fn(item))] = (item, item_key)
+            if not pending:
+                return
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item, item_key = pending.pop(task)
+                queued = waiting[item_key]
+                if queued:
+                    successor = queued.popleft()
+                    buffered -= 1
+                    pending[asyncio.ensure_future(fn(successor))] = (successor, item_key)
+                else:
+                    del waiting[item_key]
+                error = task.exception()
+                yield item, None if error else task.result(), error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+from .media import Media, as_media
+from .payload import JSONBody
+
+USER_FIELDS = ('username', 'phone_number', 'email', 'birthday', 'photo', 'photo_remote_url')
+CHANNEL_FIELDS = ('name', 'photo')
+
+
+def field_hash(value):
+    """digest of a profile field value, Media by its content"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(value, Media):
+        digest.update(b'media\0')
+        for chunk in value._read():
+            digest.update(chunk)
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ProfileSnapshots(object):
+    def __init__(self, path, timeout=30):
+        """Field hashes of the profiles last sent by Bot.sync_profiles
+
+        One row per family user and one for the channel, holding a hash
+        of every field value sent, so photos are not kept, only their
+        content hash. ``':memory:'`` keeps the snapshots for the lifetime
+        of the object only.
+
+        :param path: path to the database file (required)
+        :type path: str
+        :param timeout: seconds to wait for a write lock held by another process (optional)
+        :type timeout: float
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS profiles (id TEXT PRIMARY KEY, hashes TEXT)')
+
+    def get(self, key):
+        """field hashes of a profile, empty if it was never synced"""
+        with self._lock:
+            row = self._db.execute('SELECT hashes FROM profiles WHERE id = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else {}
+
+    def update(self, key, hashes):
+        """merge the hashes of fields that were sent"""
+        with self._lock:
+            row = self._db.execute('SELECT hashes FROM profiles WHERE id = ?', (key,)).fetchone()
+            merged = dict(json.loads(row[0]) if row is not None else {}, **hashes)
+            self._db.execute('INSERT OR REPLACE INTO profiles VALUES (?, ?)',
+                             (key, json.dumps(merged, sort_keys=True)))
+
+    def forget(self, key=None):
+        """drop the snapshot of a profile, or all of them, the next sync sends everything"""
+        with self._lock:
+            if key is None:
+                self._db.execute('DELETE FROM profiles')
+            else:
+                self._db.execute('DELETE FROM profiles WHERE id = ?', (key,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ProfileUpdate(object):
+    __slots__ = ('key', 'suffix_url', 'data', 'hashes', 'full_size', 'size')
+
+    def __init__(self, key, suffix_url, data, hashes, full_size, size):
+        self.key = key
+        self.suffix_url = suffix_url
+        self.data = data
+        self.hashes = hashes
+        self.full_size = full_size
+        self.size = size
+
+
+def plan_update(snapshots, key, suffix_url, fields, allowed, dumps=json.dumps):
+    """the PATCH needed to bring a profile to ``fields``, its ``data`` is None when nothing changed
+
+    ``full_size`` is the body a PATCH of every field (the given ones and
+    nulls for the rest) would have had, ``size`` the body of the diff.
+    """
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ValueError(f'Unknown profile fields {", ".join(sorted(unknown))}')
+    fields = dict(fields)
+    if fields.get('photo') is not None:
+        # one Media for hashing and sending, a file object is read from the same position
+        fields['photo'] = as_media(fields['photo'], base64_str=True)
+    full_size = len(JSONBody({name: fields.get(name) for name in allowed}, dumps))
+    known = snapshots.get(key)
+    hashes = {name: field_hash(value) for name, value in fields.items()}
+    changed = {name: fields[name] for name in allowed
+               if name in fields and known.get(name) != hashes[name]}
+    if not changed:
+        return ProfileUpdate(key, suffix_url, None, None, full_size, 0)
+    return ProfileUpdate(key, suffix_url, changed, {name: hashes[name] for name in changed},
+                         full_size, len(JSONBody(changed, dumps)))
+
+
+class SyncReport(object):
+    def __init__(self):
+        """What Bot.sync_profiles did and what the diff saved compared to full updates"""
+        self.profiles = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.fields_sent = 0
+        self.photos_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_full = 0
+        self.errors = []
+
+    @property
+    def calls_saved(self):
+        return self.unchanged
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_full - self.bytes_sent
+
+    def planned(self, update, fields):
+        self.profiles += 1
+        self.bytes_full += update.full_size
+        if fields.get('photo') is not None and (update.data is None or 'photo' not in update.data):
+            self.photos_skipped += 1
+        if update.data is None:
+            self.unchanged += 1
+
+    def sent(self, update, error=None):
+        self.bytes_sent += update.size
+        if error is not None:
+            self.failed += 1
+            self.errors.append((update.key, error))
+            return
+        self.updated += 1
+        self.fields_sent += len(update.data)
+
+    def as_dict(self):
+        return {
+            'profiles': self.profiles,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'fields_sent': self.fields_sent,
+            'photos_skipped': self.photos_skipped,
+            'calls_saved': self.calls_saved,
+            'bytes_sent': self.bytes_sent,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    def __repr__(self):
+        return f'<SyncReport {self.as_dict()}>'
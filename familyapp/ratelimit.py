@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        """Thread-safe token bucket
+
+        :param rate: tokens added per second (required)
+        :type rate: float
+        :param burst: bucket capacity, defaults to one second worth of tokens (optional)
+        :type burst: float
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1):
+        """take tokens and return the number of seconds to wait before using them"""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """block until tokens are available"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            self._sleep(delay)
+
+
+def endpoint_family(suffix_url):
+    """group API endpoints that share a server side limit"""
+    if suffix_url.endswith('/messages'):
+        return 'messages'
+    if '/conversations' in suffix_url:
+        return 'conversations'
+    if '/family_users' in suffix_url or suffix_url.endswith('/channel'):
+        return 'users'
+    return 'default'
+
+
+def parse_retry_after(value):
+    """seconds from a Retry-After header, either delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateLimiter(object):
+    THROTTLED = (429, 503)
+
+    def __init__(self, rates=None, max_retries=3, backoff=0.5, max_backoff=30,
+                 min_rate=0.5, decrease=0.75, increase=5.0, decrease_interval=1.0,
+                 clock=time.monotonic):
+        """Adaptive client side rate limiting and retries for Bot requests
+
+        Every endpoint family ('messages', 'conversations', 'users',
+        'default') has its own token bucket. A 429/503 answer multiplies
+        the rate of its family by ``decrease`` (at most once per
+        ``decrease_interval``, so a burst of concurrent 429s counts once)
+        and pauses it for ``Retry-After``, at most ``max_backoff``. While calls succeed the rate grows back linearly
+        by ``increase`` requests/s every second, up to the configured rate.
+
+        Throttled and failed calls are retried with jittered exponential
+        backoff when that is safe: GET and PATCH always, POST only on 429
+        since the server did not process it.
+
+        :param rates: requests per second by endpoint family, missing families are not limited (optional)
+        :type rates: dict
+        :param max_retries: retries per call (optional)
+        :type max_retries: int
+        :param backoff: base delay of the exponential backoff in seconds (optional)
+        :type backoff: float
+        :param max_backoff: upper bound of a single retry delay or Retry-After pause in seconds (optional)
+        :type max_backoff: float
+        :param min_rate: lowest rate the adaptive decrease goes to (optional)
+        :type min_rate: float
+        :param decrease: factor applied to the rate on 429/503 (optional)
+        :type decrease: float
+        :param increase: requests/s regained per second without throttling (optional)
+        :type increase: float
+        :param decrease_interval: minimum seconds between two rate decreases (optional)
+        :type decrease_interval: float
+        """
+        self.rates = dict(rates or {})
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.decrease_interval = decrease_interval
+        self._clock = clock
+        self._buckets = {family: TokenBucket(rate, clock=clock)
+                         for family, rate in self.rates.items()}
+        self._paused_until = {}
+        self._decreased_at = {}
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.retries = 0
+
+    def delay(self, family):
+        """reserve a request slot, return the number of seconds to wait for it"""
+        wait = self._paused_until.get(family, 0) - self._clock()
+        bucket = self._buckets.get(family)
+        if bucket is not None:
+            wait = max(wait, bucket.reserve())
+        return max(0.0, wait)
+
+    def acquire(self, family):
+        wait = self.delay(family)
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_response(self, family, status_code, retry_after=None):
+        """adapt the rate of a family to the status of a response"""
+        bucket = self._buckets.get(family)
+        if status_code in self.THROTTLED:
+            with self._lock:
+                self.throttled += 1
+                if retry_after is not None:
+                    self._paused_until[family] = max(self._paused_until.get(family, 0),
+                                                     self._clock() + min(retry_after, self.max_backoff))
+                now = self._clock()
+                if bucket is not None and \
+                        now - self._decreased_at.get(family, (-self.decrease_interval,))[0] >= self.decrease_interval:
+                    bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                    self._decreased_at[family] = (now, bucket.rate)
+        elif bucket is not None and bucket.rate < self.rates[family]:
+            with self._lock:
+                decreased_at, rate = self._decreased_at[family]
+                bucket.rate = min(self.rates[family],
+                                  rate + self.increase * (self._clock() - decreased_at))
+
+    def retry_delay(self, method, status_code, attempt, retry_after=None):
+        """seconds to wait before retrying, None when the call must not be retried
+
+        :param status_code: status of the response, None for network errors
+        :type status_code: int
+        :param attempt: number of retries done so far
+        :type attempt: int
+        """
+        if attempt >= self.max_retries:
+            return None
+        method = method.upper()
+        if status_code == 429:
+            retryable = True
+        elif status_code is None or status_code == 503:
+            retryable = method in ('GET', 'PATCH')
+        else:
+            retryable = False
+        if not retryable:
+            return None
+        with self._lock:
+            self.retries += 1
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def stats(self):
+        return {
+            'throttled': self.throttled,
+            'retries': self.retries,
+            'rates': {family: bucket.rate for family, bucket in self._buckets.items()},
+        }
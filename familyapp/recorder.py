@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+
+from Crypto import Random
+from Crypto.Cipher import AES
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def test_key_version_id(test_key):
+    """``conversation_key_version_id`` of messages re-encrypted under ``test_key``"""
+    return 'test-' + hashlib.blake2b(test_key, digest_size=8).hexdigest()
+
+
+def _encrypt(key, text):
+    data = text.encode('utf-8')
+    padding = 16 - len(data) % 16
+    iv = Random.new().read(AES.block_size)
+    content = AES.new(key, AES.MODE_CBC, iv).encrypt(data + bytes([padding]) * padding)
+    return base64.b64encode(iv).decode('utf-8'), base64.b64encode(content).decode('utf-8')
+
+
+def _decrypt(key, iv, content):
+    data = AES.new(key, AES.MODE_CBC, base64.b64decode(iv)).decrypt(base64.b64decode(content))
+    return data[:-data[-1]].decode('utf-8')
+
+
+class Recorder(object):
+    def __init__(self, path, test_key=None, redact_headers=('Authorization', 'Cookie'),
+                 max_pending=10000, key_timeout=5):
+        """Record incoming webhooks to an NDJSON file for replay
+
+        Pass an instance as ``Bot(recorder=...)``. Every valid webhook is
+        written as one line ``{"t": unix time, "headers": {...},
+        "payload": {...}}``. The payload is encoded on the request path,
+        writing happens on a background thread; when ``max_pending``
+        records are waiting, new ones are dropped (counted in ``dropped``).
+
+        Recorded messages can only be decrypted with this bot's keys. With
+        ``test_key`` (32 random bytes) the writer decrypts them and
+        encrypts them again under the test key, as key version
+        :func:`test_key_version_id`, so the recording can be replayed
+        offline, see :mod:`familyapp.replay`. Anyone with the test key can
+        read those messages.
+
+        :param path: file the records are appended to (required)
+        :type path: str
+        :param test_key: AES key to re-encrypt messages with (optional)
+        :type test_key: bytes
+        :param redact_headers: headers not recorded (optional)
+        :type redact_headers: tuple
+        :param max_pending: maximum number of records waiting to be written (optional)
+        :type max_pending: int
+        :param key_timeout: seconds the writer waits for the bot to store a message's key (optional)
+        :type key_timeout: float
+        """
+        self.path = path
+        self.test_key = test_key
+        self.test_key_version_id = test_key_version_id(test_key) if test_key else None
+        self.redact_headers = {name.lower() for name in redact_headers}
+        self.key_timeout = key_timeout
+        self.keys = None
+        self._queue = queue.Queue(max_pending)
+        self._closed = threading.Event()
+        self._file = open(path, 'ab')
+        self._thread = None
+        self.recorded = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def start(self, keys):
+        """start the writer
+
+        :param keys: mapping of ``conversation_key_version_id`` to AES key, used with test_key (required)
+        :type keys: Mapping
+        """
+        self.keys = keys
+        self._thread = threading.Thread(target=self._write_loop, daemon=True,
+                                        name='familyapp-recorder')
+        self._thread.start()
+
+    def record(self, json_payload, headers=None):
+        """queue a webhook, call it before the payload is decrypted"""
+        if self._closed.is_set():
+            return
+        headers = {name: value for name, value in (headers or {}).items()
+                   if name.lower() not in self.redact_headers}
+        payload = json.dumps(json_payload, separators=(',', ':'))
+        try:
+            self._queue.put_nowait((time.time(), headers, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._file.flush()
+                return
+            timestamp, headers, payload = item
+            try:
+                if self.test_key is not None:
+                    payload = self._reencrypt(payload)
+                    if payload is None:
+                        self.skipped += 1
+                        continue
+                self._file.write(json.dumps({'t': round(timestamp, 6), 'headers': headers},
+                                            separators=(',', ':'))[:-1].encode('utf-8'))
+                self._file.write(b',"payload":' + payload.encode('utf-8') + b'}\n')
+                self.recorded += 1
+            except Exception as e:
+                self.skipped += 1
+                logger.warning('not recording webhook: %s', e)
+            if self._queue.empty():
+                self._file.flush()
+
+    def _reencrypt(self, payload):
+        json_payload = json.loads(payload)
+        event_data = json_payload.get('event_data') or {}
+        if json_payload.get('event_type') != 'message_created' or not event_data.get('iv'):
+            return payload
+        key = self._key(event_data.get('conversation_key_version_id'))
+        if key is None:
+            logger.warning('not recording message %s, its key is unknown', event_data.get('id'))
+            return None
+        event_data['iv'], event_data['content'] = _encrypt(
+            self.test_key, _decrypt(key, event_data['iv'], event_data['content']))
+        event_data['conversation_key_version_id'] = self.test_key_version_id
+        return json.dumps(json_payload, separators=(',', ':'))
+
+    def _key(self, conversation_key_version_id):
+        # the bot stores a missing key while it handles the webhook, shortly after record()
+        deadline = time.monotonic() + self.key_timeout
+        while True:
+            try:
+                return self.keys[conversation_key_version_id]
+            except KeyError:
+                if time.monotonic() >= deadline or self._closed.wait(0.01):
+                    return None
+
+    def close(self):
+        """write the queued records and close the file"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._closed.set()
+        self._file.close()
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+        }
@@ -0,0 +1,163 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .filelock import StripedFileLock
+from .ratelimit import TokenBucket
+
+
+class KeyRefresher(object):
+    def __init__(self, bot, max_workers=4, max_pending=10000, rate=None,
+                 warm_interval=300, warm_jitter=5.0):
+        """Fetch new conversation key versions off the request path
+
+        A refresh fetches the conversation, unwraps its latest key version
+        and makes it the current key of the conversation, so the next
+        inbound message finds its key in the cache and outbound messages
+        are encrypted with it. Refreshes run on ``max_workers`` threads,
+        a conversation is queued at most once and at most ``max_pending``
+        are queued at all, the rest are dropped (counted in ``dropped``).
+
+        Metrics: ``key_refresh`` counter (rotated/unchanged/error/dropped)
+        and timing.
+
+        :param bot: bot whose keys are refreshed (required)
+        :type bot: Bot
+        :param max_workers: concurrent refreshes (optional)
+        :type max_workers: int
+        :param max_pending: maximum number of queued refreshes (optional)
+        :type max_pending: int
+        :param rate: maximum refreshes per second, on top of the bot's rate limiter (optional)
+        :type rate: float
+        :param warm_interval: seconds after a warm during which other processes skip theirs (optional)
+        :type warm_interval: float
+        :param warm_jitter: maximum random delay in seconds before a warm (optional)
+        :type warm_jitter: float
+        """
+        self.bot = bot
+        self.max_pending = max_pending
+        self.warm_interval = warm_interval
+        self.warm_jitter = warm_jitter
+        self._bucket = TokenBucket(rate) if rate else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='familyapp-keys')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.rotated = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def prefetch(self, family_id, conversation_id):
+        """queue a refresh of one conversation
+
+        :return: False if it was already queued or the queue is full
+        """
+        key = (str(family_id), str(conversation_id))
+        with self._lock:
+            if self._closed or key in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                self._count('dropped')
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._refresh, family_id, conversation_id, key)
+        return True
+
+    def warm(self, limit=None):
+        """queue a refresh of every conversation with a stored key
+
+        Runs in the background after a random delay of up to
+        ``warm_jitter`` seconds, conversations beyond ``limit`` or
+        ``max_pending`` are skipped. Worker processes sharing the keys
+        directory warm once per ``warm_interval`` between them: the first
+        one records it in a stamp file next to the keys, the others skip.
+        """
+        thread = threading.Thread(target=self._warm, args=(limit,), daemon=True,
+                                  name='familyapp-keys-warm')
+        thread.start()
+        return thread
+
+    def _claim_warm(self):
+        """True if no process sharing the keys warmed within warm_interval"""
+        name = f'warm_{self.bot.token}'
+        stamp = os.path.join(self.bot.keys_path, f'.{name}')
+        file_lock = StripedFileLock(os.path.join(self.bot.keys_path, f'.lock_{name}'), stripes=1)
+        try:
+            with file_lock.lock(name):
+                try:
+                    if time.time() - os.path.getmtime(stamp) < self.warm_interval:
+                        return False
+                except FileNotFoundError:
+                    pass
+                with open(stamp, 'a'):
+                    pass
+                os.utime(stamp)
+                return True
+        finally:
+            file_lock.close()
+
+    def _warm(self, limit):
+        try:
+            # worker processes started together do not all hit the lock at once
+            time.sleep(random.uniform(0, self.warm_jitter))
+            if self._closed or not self._claim_warm():
+                return
+            conversations = self.bot.conversation_data['conversations']
+            for count, conversation_id in enumerate(conversations):
+                if (limit is not None and count >= limit) or self._closed:
+                    return
+                try:
+                    family_id = conversations[conversation_id]['family_id']
+                except KeyError:
+                    continue
+                self.prefetch(family_id, conversation_id)
+        except Exception as e:
+            self.bot._error('key_warm', e)
+
+    def _refresh(self, family_id, conversation_id, key):
+        try:
+            if self._bucket is not None:
+                self._bucket.acquire()
+            started = time.perf_counter()
+            try:
+                rotated = self.bot._run_blocking(
+                    self.bot._refresh_key_steps(family_id, conversation_id))
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                self._count('error')
+                self.bot._error('key_refresh', e)
+                return
+            result = 'rotated' if rotated else 'unchanged'
+            with self._lock:
+                setattr(self, result, getattr(self, result) + 1)
+            self._count(result)
+            if self.bot.metrics is not None:
+                self.bot.metrics.since('key_refresh', started)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _count(self, result):
+        if self.bot.metrics is not None:
+            self.bot.metrics.incr('key_refresh', result=result)
+
+    def close(self, wait=True):
+        """stop refreshing, queued refreshes are dropped"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'rotated': self.rotated,
+            'unchanged': self.unchanged,
+            'errors': self.errors,
+            'dropped': self.dropped,
+        }
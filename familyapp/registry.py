@@ -0,0 +1,137 @@
+import asyncio
+import inspect
+import threading
+from collections import namedtuple
+
+from .bot import Bot
+from .singleflight import SingleFlight
+
+_Tenant = namedtuple('_Tenant', ['token', 'setup', 'kwargs'])
+
+
+class BotRegistry(object):
+    def __init__(self, bot_class=Bot, setup=None, **kwargs):
+        """Host many bot tokens in one process
+
+        Tenants are registered by their verify token and cost a single
+        entry until their first webhook, only then their Bot is created
+        and its key state loaded. All bots share one transport (and so one
+        connection pool), and the dispatcher and metrics given here. The
+        transport is created by ``bot_class`` unless one is given.
+
+        With an AsyncBot ``bot_class``, await :meth:`unload` and :meth:`close`.
+
+        :param bot_class: class of the hosted bots (optional)
+        :type bot_class: type
+        :param setup: called with every new bot to register its handlers (optional)
+        :type setup: callable
+        :param kwargs: options passed to every Bot, e.g. url, keys_path, dispatcher (optional)
+        """
+        self.bot_class = bot_class
+        self.setup = setup
+        self.kwargs = kwargs
+        self.kwargs.setdefault('lazy_keys', True)
+        self.transport = kwargs.pop('transport', None) or bot_class._create_transport()
+        self._async = inspect.iscoroutinefunction(bot_class.close)
+        self.dispatcher = kwargs.get('dispatcher', None)
+        self._tenants = {}
+        self._bots = {}
+        self._lock = threading.Lock()
+        self._loading = SingleFlight()
+
+    def register(self, token, verify_token, setup=None, **kwargs):
+        """add a tenant, its bot is created on the first webhook
+
+        :param token: bot token (required)
+        :type token: str
+        :param verify_token: token the webhooks of this bot are signed with (required)
+        :type verify_token: str
+        :param setup: called with the new bot, overrides the registry setup (optional)
+        :type setup: callable
+        :param kwargs: Bot options of this tenant only (optional)
+        """
+        self._tenants[verify_token] = _Tenant(token, setup, kwargs or None)
+
+    def unregister(self, verify_token):
+        closed = self.unload(verify_token)
+        self._tenants.pop(verify_token, None)
+        return closed
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __contains__(self, verify_token):
+        return verify_token in self._tenants
+
+    def get(self, verify_token):
+        """bot of a verify token, loaded on first use, None for unknown tokens"""
+        bot = self._bots.get(verify_token)
+        if bot is not None:
+            return bot
+        if verify_token not in self._tenants:
+            return None
+        # one load per tenant, other tenants are not blocked meanwhile
+        return self._loading.do(verify_token, self._load, verify_token)
+
+    def _load(self, verify_token):
+        bot = self._bots.get(verify_token)
+        if bot is not None:
+            return bot
+        tenant = self._tenants[verify_token]
+        kwargs = dict(self.kwargs, transport=self.transport, shared=True)
+        if tenant.kwargs:
+            kwargs.update(tenant.kwargs)
+        bot = self.bot_class(tenant.token, verify_token, **kwargs)
+        setup = tenant.setup or self.setup
+        if setup is not None:
+            setup(bot)
+        with self._lock:
+            self._bots[verify_token] = bot
+        return bot
+
+    def unload(self, verify_token):
+        """close the bot of an idle tenant, it is loaded again on its next webhook
+
+        Only call it while no request of the tenant is in flight. The
+        shared transport and dispatcher keep running.
+        """
+        with self._lock:
+            bot = self._bots.pop(verify_token, None)
+        return self._close_bots([] if bot is None else [bot])
+
+    def loaded(self):
+        return len(self._bots)
+
+    def route(self, headers):
+        """bot a webhook is addressed to, by its Authorization header"""
+        bot = self.get((headers or {}).get('Authorization', None))
+        if bot is None:
+            raise Exception("Invalid verify_token")
+        return bot
+
+    def parse_request(self, json_payload, headers=None):
+        return self.route(headers).parse_request(json_payload, headers)
+
+    def parse_requests(self, payloads, headers=None, batch_size=1000):
+        return self.route(headers).parse_requests(payloads, headers, batch_size)
+
+    def close(self):
+        """drain the shared dispatcher, close every bot and the shared transport"""
+        if self.dispatcher is not None:
+            self.dispatcher.shutdown()
+        with self._lock:
+            bots, self._bots = self._bots, {}
+        return self._close_bots(list(bots.values()), self.transport)
+
+    def _close_bots(self, bots, transport=None):
+        if self._async:
+            return self._aclose_bots(bots, transport)
+        for bot in bots:
+            bot.close()
+        if transport is not None:
+            transport.close()
+
+    async def _aclose_bots(self, bots, transport):
+        await asyncio.gather(*[bot.close() for bot in bots])
+        if transport is not None:
+            await transport.close()
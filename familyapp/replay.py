@@ -0,0 +1,170 @@
+"""Replay recorded webhooks into a Bot or an HTTP endpoint
+
+Records come from a :class:`~familyapp.recorder.Recorder`. They are sent
+at their recorded pace times ``speed`` (0 sends as fast as possible) with
+at most ``concurrency`` in flight::
+
+    bot = Bot(token, verify_token, key_store=MemoryKeyStore())
+    seed_test_key(bot, test_key)
+    report = replay(read_recording('webhooks.ndjson'), bot, speed=10, concurrency=8)
+    print(format_report(report))
+
+Latencies are measured from the time a record was due, so they include
+the wait for a free slot when the target falls behind.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .recorder import test_key_version_id
+from .store import MemoryKeyStore
+from .transport import PooledTransport
+
+# set per request by the HTTP client
+_HOP_HEADERS = {'host', 'content-length', 'content-type', 'connection', 'transfer-encoding',
+                'accept-encoding', 'keep-alive'}
+
+
+def read_recording(source):
+    """yield ``(timestamp, headers, payload)`` records from a path or binary file object"""
+    handle = open(source, 'rb') if isinstance(source, str) else source
+    try:
+        for line in handle:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record['t'], record.get('headers') or {}, record['payload']
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def seed_test_key(bot, test_key):
+    """let ``bot`` decrypt messages recorded with ``Recorder(test_key=...)``
+
+    The bot must keep its keys in a MemoryKeyStore, so the test key is
+    never written to a persistent store.
+    """
+    if not isinstance(bot.key_store, MemoryKeyStore):
+        raise ValueError('seed_test_key needs a bot created with key_store=MemoryKeyStore()')
+    bot.conversation_data['keys'][test_key_version_id(test_key)] = test_key
+
+
+def _bot_sender(bot):
+    def send(payload, headers):
+        bot.parse_request(payload, headers)
+    return send
+
+
+def _http_sender(url, concurrency, timeout):
+    transport = PooledTransport(pool_size=1, max_connections_per_host=concurrency,
+                                read_timeout=timeout)
+
+    def send(payload, headers):
+        headers = {name: value for name, value in headers.items()
+                   if name.lower() not in _HOP_HEADERS}
+        headers['Content-Type'] = 'application/json'
+        response = transport.request('POST', url, headers=headers,
+                                     data=json.dumps(payload).encode('utf-8'))
+        if response.status_code >= 400:
+            raise Exception(f'HTTP {response.status_code}')
+    send.close = transport.close
+    return send
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def replay(records, target, speed=1.0, concurrency=1, verify_token=None, timeout=30):
+    """send recorded webhooks and measure how the target keeps up
+
+    :param records: ``(timestamp, headers, payload)`` tuples, e.g. from read_recording() (required)
+    :type records: iterable
+    :param target: Bot to call parse_request on, or the URL of a webhook endpoint (required)
+    :type target: Bot or str
+    :param speed: multiple of the recorded pace, 0 sends as fast as possible (optional)
+    :type speed: float
+    :param concurrency: maximum number of webhooks in flight (optional)
+    :type concurrency: int
+    :param verify_token: Authorization header, defaults to the bot's verify_token (optional)
+    :type verify_token: str
+    :param timeout: seconds to wait for an HTTP response (optional)
+    :type timeout: float
+    :return: dict of events, errors, elapsed seconds, throughput per second,
+        latency percentiles and the largest lag behind the recorded pace in ms
+    """
+    if isinstance(target, str):
+        send = _http_sender(target, concurrency, timeout)
+    else:
+        send = _bot_sender(target)
+        if verify_token is None:
+            verify_token = target.verify_token
+    slots = threading.BoundedSemaphore(concurrency)
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def run(due, headers, payload):
+        try:
+            send(payload, headers)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+        finally:
+            finished = time.perf_counter()
+            with lock:
+                latencies.append(finished - due)
+            slots.release()
+
+    lag = 0.0
+    first = None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='familyapp-replay') as executor:
+        for timestamp, headers, payload in records:
+            if first is None:
+                first = timestamp
+            if speed:
+                due = started + (timestamp - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            now = time.perf_counter()
+            if not speed:
+                due = now
+            lag = max(lag, now - due)
+            headers = dict(headers)
+            if verify_token is not None:
+                headers['Authorization'] = verify_token
+            executor.submit(run, due, headers, payload)
+    elapsed = time.perf_counter() - started
+    if hasattr(send, 'close'):
+        send.close()
+    latencies.sort()
+    return {
+        'events': len(latencies),
+        'errors': len(errors),
+        'first_error': str(errors[0]) if errors else None,
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p90_ms': _percentile(latencies, 0.9) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'max_lag_ms': lag * 1000,
+    }
+
+
+def format_report(report):
+    lines = [f'{report["events"]} events, {report["errors"]} errors in {report["elapsed"]:.2f}s '
+             f'({report["throughput"]:.0f}/s)',
+             f'latency ms: p50 {report["p50_ms"]:.2f}  p90 {report["p90_ms"]:.2f}  '
+             f'p99 {report["p99_ms"]:.2f}  max {report["max_ms"]:.2f}',
+             f'max lag behind the recorded pace: {report["max_lag_ms"]:.1f} ms']
+    if report['first_error']:
+        lines.append(f'first error: {report["first_error"]}')
+    return '\n'.join(lines)
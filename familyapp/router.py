@@ -0,0 +1,246 @@
+import re
+import threading
+from collections import namedtuple
+
+# ties between routes of the same priority go to the earlier kind
+KINDS = ('payload', 'command', 'prefix', 'regex', 'fallback')
+
+# alternatives per combined pattern, sre slows down superlinearly on huge alternations
+REGEX_CHUNK = 50
+
+# numbered backreferences and group conditions, they change meaning once the
+# pattern is one alternative of many
+_NUMBERED_GROUP_REF = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?\(\d)')
+
+RouteMatch = namedtuple('RouteMatch', ['kind', 'key', 'rest', 'groups'])
+
+
+class _Route(object):
+    __slots__ = ('kind', 'key', 'callback', 'priority', 'rank')
+
+    def __init__(self, kind, key, callback, priority):
+        self.kind = kind
+        self.key = key
+        self.callback = callback
+        self.priority = priority
+        self.rank = (priority, -KINDS.index(kind))
+
+
+class _Node(object):
+    __slots__ = ('children', 'command', 'prefix')
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+        self.prefix = None
+
+
+class Router(object):
+    def __init__(self):
+        """Dispatch message events to callbacks by payload and content
+
+        * ``payload`` routes match the payload of a quick reply or button
+          exactly, from a hash index.
+        * ``command`` routes match content equal to the command or starting
+          with it followed by a space, ``prefix`` routes any content
+          starting with the prefix. Both live in a trie, the longest match
+          wins.
+        * ``regex`` routes are compiled into combined alternations (of
+          REGEX_CHUNK routes each) and matched at the start of the
+          content, in priority order. Patterns with global flags, either
+          compiled with them or inline like ``(?i)``, and patterns with
+          numbered backreferences are matched on their own.
+
+        Every index yields at most one candidate, the one with the highest
+        priority is called, ties go to payload, command, prefix and regex
+        in that order. Without a match the fallback is called. Lookups do
+        not depend on the number of payload and trie routes, regex routes
+        cost one combined match per REGEX_CHUNK routes.
+
+        Callbacks are called as ``callback(event_data, match)``, ``match``
+        being a RouteMatch of the kind, the registered key, the content
+        after the command or prefix and the ``re.Match`` of regex routes.
+        The router itself is a message handler, ``bot.handle_message(router)``
+        (or use ``bot.router``).
+        """
+        self._payloads = {}
+        self._trie = _Node()
+        self._regexes = []
+        self._patterns = []
+        # combined patterns by source, recompiling only the chunks that changed
+        self._combined = {}
+        # best rank each index can produce, lets a found route skip the rest
+        self._trie_rank = None
+        self._regex_rank = None
+        self._fallback = None
+        self._lock = threading.Lock()
+
+    def _register(self, add, kind, key, callback, priority):
+        if callback is None:
+            def decorator(fn):
+                add(_Route(kind, key, fn, priority))
+                return fn
+            return decorator
+        add(_Route(kind, key, callback, priority))
+        return callback
+
+    def payload(self, payload, callback=None, priority=0):
+        """route a postback/quick reply payload, usable as a decorator"""
+        return self._register(self._add_payload, 'payload', payload, callback, priority)
+
+    def command(self, command, callback=None, priority=0):
+        """route content that is ``command`` or starts with ``command`` and a space"""
+        return self._register(self._add_command, 'command', command, callback, priority)
+
+    def prefix(self, prefix, callback=None, priority=0):
+        """route content starting with ``prefix``"""
+        return self._register(self._add_prefix, 'prefix', prefix, callback, priority)
+
+    def regex(self, pattern, callback=None, priority=0):
+        """route content matching ``pattern`` at its start
+
+        ``pattern`` is a string or a compiled pattern. Named groups must
+        be unique across all regex routes.
+        """
+        return self._register(self._add_regex, 'regex', pattern, callback, priority)
+
+    def fallback(self, callback):
+        """called for messages no route matches"""
+        self._fallback = _Route('fallback', None, callback, float('-inf'))
+        return callback
+
+    def _add_payload(self, route):
+        self._payloads[route.key] = route
+
+    def _node(self, key):
+        node = self._trie
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        return node
+
+    def _add_command(self, route):
+        self._node(route.key).command = route
+        self._trie_rank = max(self._trie_rank or route.rank, route.rank)
+
+    def _add_prefix(self, route):
+        self._node(route.key).prefix = route
+        self._trie_rank = max(self._trie_rank or route.rank, route.rank)
+
+    def _add_regex(self, route):
+        pattern = re.compile(route.key)
+        if not isinstance(pattern.pattern, str):
+            raise TypeError('regex routes match str content, not bytes')
+        combinable = (not pattern.flags & ~re.UNICODE
+                      and not _NUMBERED_GROUP_REF.search(pattern.pattern))
+        with self._lock:
+            regexes = self._regexes + [(route, pattern, combinable)]
+            # compiled here, so a bad combination fails at registration
+            self._patterns = self._compile(regexes)
+            self._regexes = regexes
+            self._regex_rank = max(self._regex_rank or route.rank, route.rank)
+
+    def _compile(self, regexes):
+        """(pattern, groups) to try in order, groups maps the lastindex of a
+        match to its route and pattern, None for a pattern matched on its own"""
+        patterns = []
+        combined = {}
+        chunk = []
+        for route, pattern, combinable in sorted(regexes, key=lambda item: -item[0].priority):
+            if combinable:
+                chunk.append((route, pattern))
+                if len(chunk) < REGEX_CHUNK:
+                    continue
+            if chunk:
+                patterns.append(self._combine(chunk, combined))
+                chunk = []
+            if not combinable:
+                patterns.append((pattern, {None: (route, pattern)}))
+        if chunk:
+            patterns.append(self._combine(chunk, combined))
+        self._combined = combined
+        return patterns
+
+    def _combine(self, chunk, combined):
+        parts = []
+        groups = {}
+        index = 1
+        for route, pattern in chunk:
+            # the outer group closes last, so it is the match's lastindex
+            groups[index] = (route, pattern)
+            parts.append(f'({pattern.pattern})')
+            index += 1 + pattern.groups
+        source = '|'.join(parts)
+        compiled = self._combined.get(source)
+        if compiled is None:
+            compiled = re.compile(source)
+        combined[source] = compiled
+        return compiled, groups
+
+    def _match_trie(self, content):
+        best = None
+        node = self._trie
+        length = 0
+        for char in content:
+            node = node.children.get(char)
+            if node is None:
+                break
+            length += 1
+            for route in (node.prefix, node.command):
+                if route is None or (best is not None and route.priority < best[0].priority):
+                    continue
+                if route is node.command and length < len(content) and content[length] != ' ':
+                    continue
+                best = (route, length)
+        if best is None:
+            return None
+        route, length = best
+        rest = content[length:]
+        return route, RouteMatch(route.kind, route.key,
+                                 rest.lstrip(' ') if route.kind == 'command' else rest, None)
+
+    def _match_regex(self, content):
+        for combined, groups in self._patterns:
+            match = combined.match(content)
+            if match is None:
+                continue
+            if None in groups:
+                route, pattern = groups[None]
+                return route, RouteMatch('regex', route.key, content[match.end():], match)
+            route, pattern = groups[match.lastindex]
+            return route, RouteMatch('regex', route.key, content[match.end():],
+                                     pattern.match(content))
+        return None
+
+    def resolve(self, event_data):
+        """find the route of a message, None without match and fallback
+
+        :return: tuple of (callback, RouteMatch)
+        """
+        best = None
+        payload = event_data.get('payload')
+        if payload is not None:
+            route = self._payloads.get(payload)
+            if route is not None:
+                best = (route, RouteMatch('payload', payload, '', None))
+        content = event_data.get('content')
+        if isinstance(content, str):
+            for rank, match in ((self._trie_rank, self._match_trie),
+                                (self._regex_rank, self._match_regex)):
+                if rank is None or (best is not None and best[0].rank > rank):
+                    continue
+                found = match(content)
+                if found is not None and (best is None or found[0].rank > best[0].rank):
+                    best = found
+        if best is not None:
+            route, match = best
+            return route.callback, match
+        if self._fallback is not None:
+            return self._fallback.callback, RouteMatch('fallback', None, content, None)
+        return None
+
+    def __call__(self, event_data):
+        found = self.resolve(event_data)
+        if found is None:
+            return None
+        callback, match = found
+        return callback(event_data, match)
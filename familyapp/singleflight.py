@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Collapse concurrent calls sharing a key into one execution
+
+    The first caller for a key runs the function, callers arriving while
+    it is running block and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class AsyncSingleFlight(object):
+    """asyncio counterpart of :class:`SingleFlight` for coroutine functions"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
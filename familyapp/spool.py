@@ -0,0 +1,344 @@
+import json
+import logging
+import os
+import queue
+import random
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('<II')
+_ACK = struct.Struct('<Q')
+_STOP = object()
+
+
+def is_transient(error):
+    """errors worth retrying: network errors, throttling and server errors"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, OSError)
+
+
+class _Segment(object):
+    def __init__(self, directory, sequence):
+        self.sequence = sequence
+        self.path = os.path.join(directory, f'segment-{sequence:012d}.log')
+        self.ack_path = os.path.join(directory, f'segment-{sequence:012d}.ack')
+        self.records = 0
+        self.acked = 0
+        self.sealed = False
+        self.file = None
+        self.ack_file = None
+
+    def open(self):
+        self.file = open(self.path, 'ab')
+        self.ack_file = open(self.ack_path, 'ab')
+
+    def close(self):
+        for handle in (self.file, self.ack_file):
+            if handle is not None and not handle.closed:
+                handle.close()
+
+    def delete(self):
+        self.close()
+        for path in (self.path, self.ack_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Spool(object):
+    def __init__(self, directory, workers=4, segment_size=64 * 1024 * 1024,
+                 fsync_interval=0.05, backoff=0.5, max_backoff=60, on_failure=None):
+        """Disk-backed outbound message queue
+
+        Messages are appended to segment files (length, CRC32, JSON per
+        record) and fsynced in batches every ``fsync_interval``, so an
+        append is a buffered local write. Sender threads drain the spool,
+        each conversation is served by one sender so its messages go out
+        in order. Transient failures (network errors, 429, 5xx) are
+        retried with jittered exponential backoff and hold back the later
+        messages of that conversation, other errors drop the message and
+        call ``on_failure(family_id, conversation_id, data, error)``.
+
+        Sent records are acknowledged in a file next to their segment, a
+        segment is deleted once all its records are sent. Records not
+        acknowledged when the process stops are sent again after a
+        restart, so delivery is at least once. Messages are spooled
+        before encryption, keep the directory private.
+
+        :param directory: spool directory, created if missing (required)
+        :type directory: str
+        :param workers: number of sender threads (optional)
+        :type workers: int
+        :param segment_size: bytes after which a new segment file is started (optional)
+        :type segment_size: int
+        :param fsync_interval: seconds between batched fsyncs, 0 syncs every append (optional)
+        :type fsync_interval: float
+        :param backoff: first retry delay in seconds (optional)
+        :type backoff: float
+        :param max_backoff: upper bound of a retry delay in seconds (optional)
+        :type max_backoff: float
+        :param on_failure: called for messages dropped after a permanent error (optional)
+        :type on_failure: callable
+        """
+        self.directory = directory
+        self.workers = workers
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_failure = on_failure
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue() for _ in range(workers)]
+        self._segments = {}
+        self._dirty = set()
+        self._send = None
+        self._threads = []
+        self._closing = threading.Event()
+        self._closed = threading.Event()
+        self._idle = threading.Condition(self._lock)
+        self.pending = 0
+        self.appended = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self._recover()
+        self._segment = self._new_segment()
+        self._flusher = None
+        if fsync_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True,
+                                             name='familyapp-spool-fsync')
+            self._flusher.start()
+
+    def _recover(self):
+        # unacknowledged records of earlier runs go first, in file order
+        sequences = sorted(int(name[8:20]) for name in os.listdir(self.directory)
+                           if name.startswith('segment-') and name.endswith('.log'))
+        self._next_sequence = (sequences[-1] + 1) if sequences else 1
+        for sequence in sequences:
+            segment = _Segment(self.directory, sequence)
+            segment.sealed = True
+            acked = set()
+            if os.path.exists(segment.ack_path):
+                with open(segment.ack_path, 'rb') as handle:
+                    data = handle.read()
+                acked = {offset for (offset,) in _ACK.iter_unpack(data[:len(data) - len(data) % _ACK.size])}
+            records = list(self._read_segment(segment.path))
+            segment.records = len(records)
+            segment.acked = sum(1 for offset, _ in records if offset in acked)
+            if segment.acked == segment.records:
+                segment.delete()
+                continue
+            segment.ack_file = open(segment.ack_path, 'ab')
+            self._segments[sequence] = segment
+            for offset, record in records:
+                if offset not in acked:
+                    self._enqueue(segment, offset, *record)
+
+    @staticmethod
+    def _read_segment(path):
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, offset)
+            payload = data[offset + _HEADER.size:offset + _HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                # torn write at the end of a crashed run
+                break
+            yield offset, json.loads(payload)
+            offset += _HEADER.size + length
+
+    def _new_segment(self):
+        segment = _Segment(self.directory, self._next_sequence)
+        self._next_sequence += 1
+        segment.open()
+        self._segments[segment.sequence] = segment
+        return segment
+
+    def _enqueue(self, segment, offset, family_id, conversation_id, data):
+        self.pending += 1
+        key = (str(family_id), str(conversation_id))
+        self._queues[hash(key) % self.workers].put(
+            (segment, offset, family_id, conversation_id, data))
+
+    def append(self, family_id, conversation_id, data):
+        """spool a message, it is sent in the background
+
+        :param data: message body, JSON serializable
+        :type data: dict
+        """
+        payload = json.dumps([family_id, conversation_id, data]).encode('utf-8')
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError('Spool is closed')
+            segment = self._segment
+            offset = segment.file.tell()
+            segment.file.write(record)
+            segment.records += 1
+            self.appended += 1
+            if not self.fsync_interval:
+                self._sync(segment.file)
+            else:
+                self._dirty.add(segment.file)
+            if offset + len(record) >= self.segment_size:
+                segment.sealed = True
+                self._segment = self._new_segment()
+            self._enqueue(segment, offset, family_id, conversation_id, data)
+
+    @staticmethod
+    def _sync(handle):
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    def flush(self):
+        """write and fsync everything appended or acknowledged so far"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            for handle in dirty:
+                if not handle.closed:
+                    self._sync(handle)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.flush()
+
+    def start(self, send):
+        """start the sender threads
+
+        :param send: ``send(family_id, conversation_id, data)``, raising on failure (required)
+        :type send: callable
+        """
+        self._send = send
+        self._threads = [threading.Thread(target=self._work, args=(q,), daemon=True,
+                                          name=f'familyapp-spool-{i}')
+                         for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self, q):
+        # conversations with a message left for the next run, their later
+        # messages stay too so they are sent in order
+        held = set()
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            segment, offset, family_id, conversation_id, data = item
+            key = (str(family_id), str(conversation_id))
+            if key not in held and self._deliver(family_id, conversation_id, data):
+                self._ack(segment, offset)
+            else:
+                held.add(key)
+            with self._lock:
+                self.pending -= 1
+                if not self.pending:
+                    self._idle.notify_all()
+
+    def _deliver(self, family_id, conversation_id, data):
+        """send or drop a record, False if it stays in the spool for the next run"""
+        attempt = 0
+        while True:
+            try:
+                self._send(family_id, conversation_id, dict(data))
+            except Exception as e:
+                if not is_transient(e):
+                    with self._lock:
+                        self.failed += 1
+                    logger.warning('dropping spooled message to %s/%s: %s',
+                                   family_id, conversation_id, e)
+                    if self.on_failure is not None:
+                        self.on_failure(family_id, conversation_id, data, e)
+                    return True
+                if self._closing.is_set():
+                    # shutting down, no more retries
+                    return False
+                with self._lock:
+                    self.retries += 1
+                attempt += 1
+                self._closing.wait(random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                continue
+            with self._lock:
+                self.sent += 1
+            return True
+
+    def _ack(self, segment, offset):
+        with self._lock:
+            segment.ack_file.write(_ACK.pack(offset))
+            segment.acked += 1
+            if segment.sealed and segment.acked == segment.records:
+                del self._segments[segment.sequence]
+                self._dirty.discard(segment.file)
+                self._dirty.discard(segment.ack_file)
+                segment.delete()
+            elif self.fsync_interval:
+                self._dirty.add(segment.ack_file)
+            else:
+                self._sync(segment.ack_file)
+
+    def join(self, timeout=None):
+        """wait until every spooled message was sent or dropped
+
+        :return: True if the spool is empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self.pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, drain=True, timeout=None):
+        """stop the senders, by default after the spool was drained
+
+        While closing, a message that fails with a transient error is not
+        retried, so an unreachable API does not keep close() waiting. That
+        message and the later ones of its conversation, and everything
+        still pending, are sent after the next start.
+
+        :return: True if every spooled message was sent or dropped
+        """
+        self._closing.set()
+        if drain and self._threads:
+            self.join(timeout)
+        self._closed.set()
+        for q in self._queues:
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self.flush()
+        with self._lock:
+            unacked = 0
+            for segment in self._segments.values():
+                unacked += segment.records - segment.acked
+                if segment.acked == segment.records:
+                    segment.delete()
+                else:
+                    segment.close()
+            return not unacked
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'appended': self.appended,
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'segments': len(self._segments),
+        }
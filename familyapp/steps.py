@@ -0,0 +1,110 @@
+"""I/O steps of the logic shared by Bot and AsyncBot
+
+Everything both bots do the same way (requests and their retries, key
+resolution, parsing webhooks, sending messages) is written once, as a
+generator that yields a step wherever it has to wait and gets the
+step's result sent back::
+
+    def _conversation_steps(self, family_id, conversation_id):
+        conversation = yield from self._request_steps('GET', ...)
+        ...
+        return conversation
+
+Bot performs the steps blocking with :func:`drive`, AsyncBot awaits them
+with :func:`adrive`. An exception raised by a step is thrown into the
+generator at the yield.
+"""
+
+
+class Send(object):
+    """HTTP request, the result is the transport's response"""
+    __slots__ = ('method', 'url', 'json', 'headers', 'data')
+
+    def __init__(self, method, url, json=None, headers=None, data=None):
+        self.method = method
+        self.url = url
+        self.json = json
+        self.headers = headers
+        self.data = data
+
+
+class Sleep(object):
+    __slots__ = ('seconds',)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class Call(object):
+    """blocking call (key generation, key store and file I/O), AsyncBot runs it in the loop's executor"""
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+
+class Acquire(object):
+    """``lock.acquire(*args)``, released with ``lock.release(*args)`` by the generator"""
+    __slots__ = ('lock', 'args')
+
+    def __init__(self, lock, *args):
+        self.lock = lock
+        self.args = args
+
+
+class Handle(object):
+    """call of a user callback, AsyncBot awaits what it returns"""
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+
+class Flight(object):
+    """run ``steps(*args)`` once for all concurrent callers with the same key"""
+    __slots__ = ('key', 'steps', 'args')
+
+    def __init__(self, key, steps, *args):
+        self.key = key
+        self.steps = steps
+        self.args = args
+
+
+def drive(steps, run_step):
+    """run a step generator to completion, ``run_step(step)`` performs one step"""
+    result = error = None
+    try:
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = run_step(step), None
+            except Exception as e:
+                result, error = None, e
+    except BaseException:
+        # cancelled or interrupted, release what the generator holds now
+        steps.close()
+        raise
+
+
+async def adrive(steps, run_step):
+    """:func:`drive` with a coroutine function ``run_step``"""
+    result = error = None
+    try:
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = await run_step(step), None
+            except Exception as e:
+                result, error = None, e
+    except BaseException:
+        # cancelled or interrupted, release what the generator holds now
+        steps.close()
+        raise
@@ -0,0 +1,196 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+
+class KeyStore(object):
+    """Storage for conversation keys
+
+    A store is a drop-in replacement for the old ``conversation_data`` dict:
+    ``store['keys']`` maps ``conversation_key_version_id`` to the AES key
+    and ``store['conversations']`` maps ``conversation_id`` to
+    ``{'family_id': ..., 'conversation_key_version_id': ...}``.
+    Subclasses set :attr:`keys` and :attr:`conversations`.
+    """
+    keys = None
+    conversations = None
+
+    def __getitem__(self, name):
+        if name == 'keys':
+            return self.keys
+        if name == 'conversations':
+            return self.conversations
+        raise KeyError(name)
+
+    def put(self, conversation_id, family_id, conversation_key_version_id, key):
+        """store a key and make it the current one of the conversation"""
+        self.keys[conversation_key_version_id] = key
+        self.conversations[conversation_id] = {
+            'family_id': family_id, 'conversation_key_version_id': conversation_key_version_id}
+
+    def update(self, data):
+        """bulk insert from a ``{'keys': ..., 'conversations': ...}`` dict"""
+        self.keys.update(data.get('keys', {}))
+        self.conversations.update(data.get('conversations', {}))
+
+    def changed(self):
+        """True if another process wrote to the store since the last call"""
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryKeyStore(KeyStore):
+    """Non persistent store, keeps everything in dicts"""
+
+    def __init__(self):
+        self.keys = {}
+        self.conversations = {}
+
+
+class _SQLiteTable(MutableMapping):
+    def __init__(self, store, table, columns):
+        self._store = store
+        self._columns = columns
+        self._select = f'SELECT {", ".join(columns)} FROM {table} WHERE id = ?'
+        self._insert = (f'INSERT OR REPLACE INTO {table} (id, {", ".join(columns)}) '
+                        f'VALUES (?{", ?" * len(columns)})')
+        self._delete = f'DELETE FROM {table} WHERE id = ?'
+        self._ids = f'SELECT id FROM {table}'
+        self._count = f'SELECT COUNT(*) FROM {table}'
+
+    def _decode(self, row):
+        if len(self._columns) == 1:
+            return row[0]
+        return dict(zip(self._columns, row))
+
+    def _encode(self, value):
+        if len(self._columns) == 1:
+            return (value,)
+        return tuple(value[c] for c in self._columns)
+
+    def __getitem__(self, key):
+        row = self._store._fetchone(self._select, (key,))
+        if row is None:
+            raise KeyError(key)
+        return self._decode(row)
+
+    def __setitem__(self, key, value):
+        self._store._write([(self._insert, (key,) + self._encode(value))])
+
+    def __delitem__(self, key):
+        if self._store._write([(self._delete, (key,))]) == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter([row[0] for row in self._store._fetchall(self._ids)])
+
+    def __len__(self):
+        return self._store._fetchone(self._count)[0]
+
+    def update(self, other=(), **kwargs):
+        items = list(dict(other, **kwargs).items())
+        self._store._write([(self._insert, (k,) + self._encode(v)) for k, v in items])
+
+
+class SQLiteKeyStore(KeyStore):
+    def __init__(self, path, synchronous='NORMAL', timeout=30):
+        """Key store backed by a SQLite database in WAL mode
+
+        Lookups hit the database, so nothing is loaded at startup, and every
+        write is a single committed transaction. Several processes (e.g.
+        gunicorn workers) can share one database file, rows written by one
+        of them are visible to the others on their next lookup.
+
+        :param path: path to the database file (required)
+        :type path: str
+        :param synchronous: SQLite ``synchronous`` pragma, ``FULL`` also survives power loss (optional)
+        :type synchronous: str
+        :param timeout: seconds to wait for a write lock held by another process (optional)
+        :type timeout: float
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={synchronous}')
+        self._db.execute('CREATE TABLE IF NOT EXISTS keys (id PRIMARY KEY, key BLOB)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS conversations '
+                         '(id PRIMARY KEY, family_id, conversation_key_version_id)')
+        self.keys = _SQLiteTable(self, 'keys', ('key',))
+        self.conversations = _SQLiteTable(
+            self, 'conversations', ('family_id', 'conversation_key_version_id'))
+        self._data_version = self._fetchone('PRAGMA data_version')[0]
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _write(self, statements):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                changed = 0
+                for sql, params in statements:
+                    changed += self._db.execute(sql, params).rowcount
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            return changed
+
+    def put(self, conversation_id, family_id, conversation_key_version_id, key):
+        self._write([
+            (self.keys._insert, (conversation_key_version_id, key)),
+            (self.conversations._insert,
+             (conversation_id, family_id, conversation_key_version_id)),
+        ])
+
+    def update(self, data):
+        keys = data.get('keys', {})
+        conversations = data.get('conversations', {})
+        self._write(
+            [(self.keys._insert, (k,) + self.keys._encode(v)) for k, v in keys.items()] +
+            [(self.conversations._insert, (k,) + self.conversations._encode(v))
+             for k, v in conversations.items()])
+
+    def changed(self):
+        # data_version only moves on commits of other connections
+        version = self._fetchone('PRAGMA data_version')[0]
+        changed, self._data_version = version != self._data_version, version
+        return changed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def migrate_pickle(pickle_path, store):
+    """Import a legacy ``conversations_{token}.pickle`` file into a store
+
+    The pickle is renamed to ``*.migrated`` afterwards, so the import
+    runs only once.
+
+    :param pickle_path: path of the pickle file (required)
+    :type pickle_path: str
+    :param store: destination store (required)
+    :type store: KeyStore
+    :return: True if the file was migrated
+    """
+    if not os.path.exists(pickle_path):
+        return False
+    with open(pickle_path, 'rb') as handle:
+        store.update(pickle.load(handle))
+    os.replace(pickle_path, pickle_path + '.migrated')
+    return True
@@ -0,0 +1,78 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Transport(object):
+    """Base class for the HTTP layer used by Bot
+
+    Subclasses implement :meth:`request` and return an object exposing
+    ``status_code``, ``headers``, ``text`` and ``json()`` (i.e. a
+    ``requests.Response``). ``data`` is a pre-encoded body sent instead
+    of ``json``, an iterable of byte chunks with a ``len()``.
+    """
+
+    def request(self, method, url, json=None, headers=None, data=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimpleTransport(Transport):
+    def __init__(self, connect_timeout=None, read_timeout=None, verify=False):
+        """Transport opening a new connection for every call
+
+        :param connect_timeout: seconds to wait for the TCP/TLS connection (optional)
+        :type connect_timeout: float
+        :param read_timeout: seconds to wait for the response (optional)
+        :type read_timeout: float
+        :param verify: verify TLS certificates (optional)
+        :type verify: bool
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+
+    def request(self, method, url, json=None, headers=None, data=None):
+        return requests.request(method, url, json=json, headers=headers, data=data,
+                                verify=self.verify, timeout=self.timeout)
+
+
+class PooledTransport(Transport):
+    def __init__(self, pool_size=10, max_connections_per_host=10, pool_block=False,
+                 connect_timeout=5, read_timeout=30, verify=False):
+        """Keep-alive transport backed by a shared urllib3 connection pool
+
+        All threads share one ``requests.Session`` whose mounted adapter is
+        the connection pool, so connections are reused across threads and
+        a thread-per-request server does not leave a session per thread
+        behind. The API sets no cookies, the session keeps no other state.
+
+        :param pool_size: number of per-host pools to keep (optional)
+        :type pool_size: int
+        :param max_connections_per_host: connections kept alive per host (optional)
+        :type max_connections_per_host: int
+        :param pool_block: wait for a free connection instead of opening an extra one (optional)
+        :type pool_block: bool
+        :param connect_timeout: seconds to wait for the TCP/TLS connection (optional)
+        :type connect_timeout: float
+        :param read_timeout: seconds to wait for the response (optional)
+        :type read_timeout: float
+        :param verify: verify TLS certificates (optional)
+        :type verify: bool
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+        self._adapter = HTTPAdapter(pool_connections=pool_size,
+                                    pool_maxsize=max_connections_per_host,
+                                    pool_block=pool_block)
+        self._session = requests.Session()
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+
+    def request(self, method, url, json=None, headers=None, data=None):
+        return self._session.request(method, url, json=json, headers=headers, data=data,
+                                     verify=self.verify, timeout=self.timeout)
+
+    def close(self):
+        # closes the mounted adapter, i.e. the pool
+        self._session.close()
@@ -16,4 +16,7 @@ setup(name='familyapp.py',
       url='https://github.com/piotrgiedziun/familyapp.py',
       description='A python wrapper for the FamilyApp API',
       install_requires=requirements,
+      entry_points={
+          'console_scripts': ['familyapp=familyapp.__main__:main'],
+      },
 )
\ No newline at end of file
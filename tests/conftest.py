@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.stub_server import StubAPI, start_stub_server
+
+
+@pytest.fixture
+def stub():
+    """(StubAPI, base url) of a stub API server running for one test"""
+    api = StubAPI()
+    server, url = start_stub_server(api)
+    yield api, url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from familyapp import AsyncBot, Dispatcher, Spool
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def test_bots_sharing_keys_fetch_a_cold_key_once(tmp_path, stub):
+    api, url = stub
+
+    async def main():
+        # separate bots share only the key store and, through the
+        # process-wide lock files, the key and RSA locks
+        bots = [AsyncBot('token', 'verify', url=url, keys_path=str(tmp_path)) for _ in range(4)]
+        received = []
+
+        async def on_message(event_data):
+            await asyncio.sleep(0)
+            received.append(event_data['content'])
+
+        for bot in bots:
+            bot.handle_message(on_message)
+        await asyncio.gather(*[bot.parse_request(api.message_event(1, 1, f'message {i}'), HEADERS)
+                               for i, bot in enumerate(bots)])
+        for bot in bots:
+            await bot.close()
+        return received
+
+    received = asyncio.run(main())
+    assert sorted(received) == [f'message {i}' for i in range(4)]
+    assert len(api.rsa_keys) == 1
+    assert api.conversation_fetches == 1
+
+
+def test_dispatcher_and_spool_drain_on_close(tmp_path, stub):
+    api, url = stub
+    seen = []
+
+    async def main():
+        bot = AsyncBot('token', 'verify', url=url, keys_path=str(tmp_path / 'keys'),
+                       dispatcher=Dispatcher(workers=2), spool=Spool(str(tmp_path / 'spool')))
+
+        async def slow(event_data):
+            await asyncio.sleep(0.05)
+            seen.append(event_data['content'])
+
+        bot.handle_message(slow)
+        await bot.parse_request(api.message_event(1, 1, 'dispatched'), HEADERS)
+        # queued, the handler runs on the dispatcher
+        assert seen == []
+        # a cold conversation, the spool thread fetches its key through the loop's locks
+        await bot.send_message(1, 2, 'spooled')
+        await bot.close()
+
+    asyncio.run(main())
+    assert seen == ['dispatched']
+    assert list(api.messages) == [('1', '2', 'spooled')]
+
+
+def test_many_cold_conversations_with_a_small_executor(tmp_path, stub):
+    # lock waiters used to fill the default executor the lock holder needs
+    api, url = stub
+
+    async def main(family_id):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(2))
+        bot = AsyncBot('token', 'verify', url=url, keys_path=str(tmp_path))
+        received = []
+        bot.handle_message(lambda event_data: received.append(event_data['content']))
+        messages = [api.message_event(family_id, i, f'message {i}') for i in range(16)]
+        await asyncio.wait_for(
+            asyncio.gather(*[bot.parse_request(message, HEADERS) for message in messages]), 30)
+        await bot.close()
+        return sorted(received)
+
+    expected = sorted(f'message {i}' for i in range(16))
+    # registering the keypair, then with the keypair stored
+    assert asyncio.run(main(1)) == expected
+    assert asyncio.run(main(2)) == expected
+    assert len(api.rsa_keys) == 1
@@ -0,0 +1,45 @@
+import copy
+import uuid
+
+from familyapp import Bot
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def test_parse_requests_decrypts_per_key_version(tmp_path, stub):
+    api, url = stub
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path))
+    received = []
+    bot.handle_message(lambda event_data: received.append(
+        (event_data['conversation_id'], event_data['content'])))
+    bot.handle_member_joined(lambda event_data: received.append(('joined', None)))
+
+    payloads = [api.message_event(1, i % 3, f'message {i}') for i in range(9)]
+    payloads.insert(4, {'event_type': 'joined_to_family', 'event_data': {'family_id': '1'}})
+
+    assert bot.parse_requests(payloads, HEADERS, batch_size=4) == 10
+    bot.close()
+    assert received[4] == ('joined', None)
+    del received[4]
+    assert received == [(str(i % 3), f'message {i}') for i in range(9)]
+    # one key fetch per conversation
+    assert api.conversation_fetches == 3
+    assert [payload['event_data'].get('is_decrypted') for payload in payloads] == [True] * 4 + [None] + [True] * 5
+
+
+def test_bad_messages_do_not_abort_the_batch(tmp_path, stub):
+    api, url = stub
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path))
+    received = []
+    bot.handle_message(lambda event_data: received.append(event_data['content']))
+
+    payloads = [api.message_event(1, 1, f'message {i}') for i in range(4)]
+    payloads[1]['event_data']['content'] = 'not base64!'
+    payloads[2]['event_data']['conversation_key_version_id'] = str(uuid.uuid4())
+    original = copy.deepcopy(payloads)
+
+    assert bot.parse_requests(payloads, HEADERS) == 2
+    bot.close()
+    assert received == ['message 0', 'message 3']
+    # the messages that failed are left as they were
+    assert payloads[1:3] == original[1:3]
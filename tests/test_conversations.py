@@ -0,0 +1,18 @@
+from familyapp import ConversationCache
+
+
+def _conversation(conversation_id, members):
+    return {'id': conversation_id, 'family_users': [{'id': f'u{i}'} for i in range(members)]}
+
+
+def test_evicted_members_are_found_in_their_conversation():
+    cache = ConversationCache(maxsize=2)
+    cache.set(1, 'c1', _conversation('c1', 12))
+    # more members than the member cache holds, the first ones were evicted
+    assert cache.members.evictions == 4
+    assert cache.get_member(1, 'u0') == {'id': 'u0'}
+    assert cache.get_member('1', 'u11') == {'id': 'u11'}
+    assert cache.get_member(1, 'u12') is None
+
+    cache.invalidate_family(1)
+    assert cache.get_member(1, 'u0') is None
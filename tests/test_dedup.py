@@ -0,0 +1,81 @@
+import copy
+
+import pytest
+
+from familyapp import Bot, MemorySeenSet, SQLiteSeenSet
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def _bot(tmp_path, url, dedup, received, fail=()):
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path / 'keys'), dedup=dedup)
+
+    def on_message(event_data):
+        if event_data['content'] in fail:
+            raise RuntimeError('handler failed')
+        received.append(event_data['content'])
+    bot.handle_message(on_message)
+    return bot
+
+
+def test_redeliveries_are_handled_once(tmp_path, stub):
+    api, url = stub
+    received = []
+    bot = _bot(tmp_path, url, True, received)
+    first, second = api.message_event(1, 1, 'first'), api.message_event(1, 1, 'second')
+    for payload in (first, first, second, first):
+        bot.parse_request(copy.deepcopy(payload), HEADERS)
+    # duplicates within a batch and of earlier deliveries
+    assert bot.parse_requests([copy.deepcopy(p) for p in (first, second, second)], HEADERS) == 0
+    third = api.message_event(1, 2, 'third')
+    assert bot.parse_requests([copy.deepcopy(p) for p in (third, third)], HEADERS) == 1
+    bot.close()
+    assert received == ['first', 'second', 'third']
+
+
+def test_failed_events_are_handled_on_redelivery(tmp_path, stub):
+    api, url = stub
+    received = []
+    fail = {'flaky'}
+    bot = _bot(tmp_path, url, True, received, fail)
+    flaky = api.message_event(1, 1, 'flaky')
+    with pytest.raises(RuntimeError):
+        bot.parse_request(copy.deepcopy(flaky), HEADERS)
+    # undecryptable in this batch, decryptable on redelivery
+    broken = api.message_event(1, 1, 'broken')
+    damaged = copy.deepcopy(broken)
+    damaged['event_data']['content'] = 'not base64!'
+    assert bot.parse_requests([damaged], HEADERS) == 0
+
+    fail.clear()
+    bot.parse_request(copy.deepcopy(flaky), HEADERS)
+    assert bot.parse_requests([copy.deepcopy(broken)], HEADERS) == 1
+    bot.close()
+    assert received == ['flaky', 'broken']
+
+
+def test_workers_share_a_sqlite_seen_set(tmp_path, stub):
+    api, url = stub
+    received = []
+    path = str(tmp_path / 'seen.sqlite3')
+    workers = [_bot(tmp_path, url, SQLiteSeenSet(path), received) for _ in range(2)]
+    payload = api.message_event(1, 1, 'once')
+    for bot in workers:
+        bot.parse_request(copy.deepcopy(payload), HEADERS)
+    for bot in workers:
+        bot.dedup.close()
+        bot.close()
+    assert received == ['once']
+
+
+def test_fingerprints_expire_after_the_window():
+    now = [0.0]
+    seen = MemorySeenSet(maxsize=2, window=10, clock=lambda: now[0])
+    assert seen.add(b'a')
+    assert not seen.add(b'a')
+    now[0] = 10
+    assert seen.add(b'a')
+    assert seen.add(b'b') and seen.add(b'c')
+    # the oldest is evicted once the set is full
+    assert seen.evictions == 1
+    assert seen.add(b'a')
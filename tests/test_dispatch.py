@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+
+import pytest
+
+from familyapp import Bot, Dispatcher, DispatchQueueFull
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def test_events_of_one_key_run_in_order():
+    dispatcher = Dispatcher(workers=4)
+    seen = {}
+    lock = threading.Lock()
+
+    def handle(key, i):
+        time.sleep(random.uniform(0, 0.002))
+        with lock:
+            seen.setdefault(key, []).append(i)
+
+    for i in range(50):
+        for key in range(8):
+            dispatcher.submit(('f', key), handle, key, i)
+    assert dispatcher.shutdown()
+    assert seen == {key: list(range(50)) for key in range(8)}
+    assert dispatcher.stats()['processed'] == 400
+
+
+def test_bot_handlers_keep_the_order_per_conversation(tmp_path, stub):
+    api, url = stub
+    received = {}
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path), dispatcher=Dispatcher(workers=3))
+
+    def on_message(event_data):
+        time.sleep(random.uniform(0, 0.002))
+        received.setdefault(event_data['conversation_id'], []).append(event_data['content'])
+    bot.handle_message(on_message)
+    payloads = [api.message_event(1, i % 4, f'message {i}') for i in range(40)]
+    bot.parse_requests(payloads[:20], HEADERS)
+    for payload in payloads[20:]:
+        bot.parse_request(payload, HEADERS)
+    bot.close()
+    assert received == {str(c): [f'message {i}' for i in range(c, 40, 4)] for c in range(4)}
+
+
+@pytest.mark.parametrize('overflow', ['drop', 'reject'])
+def test_full_queues(overflow):
+    gate = threading.Event()
+    dispatcher = Dispatcher(workers=1, queue_size=2, overflow=overflow)
+    dispatcher.submit('key', gate.wait)
+    # the worker holds the first event, two more fill its queue
+    while dispatcher.queued():
+        time.sleep(0.001)
+    for _ in range(2):
+        assert dispatcher.submit('key', lambda: None)
+    if overflow == 'drop':
+        assert dispatcher.submit('key', lambda: None) is False
+    else:
+        with pytest.raises(DispatchQueueFull):
+            dispatcher.submit('key', lambda: None)
+    gate.set()
+    assert dispatcher.shutdown()
+    stats = dispatcher.stats()
+    assert (stats['dropped'], stats['rejected']) == ((1, 0) if overflow == 'drop' else (0, 1))
+    assert stats['processed'] == 3
+    with pytest.raises(DispatchQueueFull):
+        dispatcher.submit('key', lambda: None)
+
+
+def test_failing_handlers_do_not_stop_the_worker():
+    dispatcher = Dispatcher(workers=1)
+    done = []
+
+    def fail():
+        raise RuntimeError('handler failed')
+    dispatcher.submit('key', fail)
+    dispatcher.submit('key', done.append, 'next')
+    assert dispatcher.shutdown()
+    assert done == ['next']
+    assert dispatcher.stats()['errors'] == 1
@@ -0,0 +1,89 @@
+import datetime
+import logging
+
+from familyapp import Bot, ImportCheckpoint
+from familyapp.ical import iter_ics
+
+FEED = '''BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:weekly
+SUMMARY:Swimming
+DTSTART:20240105T170000Z
+DTEND:20240105T180000Z
+RRULE:FREQ=WEEKLY;BYDAY=FR
+EXDATE:20240112T170000Z,20240119T170000Z
+EXDATE:20240126T170000Z
+RDATE:20240110T170000Z
+RDATE;VALUE=PERIOD:20240111T090000Z/PT30M
+END:VEVENT
+BEGIN:VEVENT
+UID:weekly
+RECURRENCE-ID:20240202T170000Z
+SUMMARY:Swimming, later
+DTSTART:20240202T190000Z
+DTEND:20240202T200000Z
+END:VEVENT
+BEGIN:VEVENT
+UID:birthday
+SUMMARY:Birthday
+DTSTART;VALUE=DATE:20240301
+DTEND;VALUE=DATE:20240302
+END:VEVENT
+BEGIN:VEVENT
+UID:trip
+SUMMARY:Trip
+DTSTART;VALUE=DATE:20240401
+DTEND;VALUE=DATE:20240404
+END:VEVENT
+END:VCALENDAR
+'''
+
+
+def _utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+
+def test_recurring_events(caplog):
+    with caplog.at_level(logging.WARNING, logger='familyapp.ical'):
+        events = list(iter_ics(FEED))
+
+    assert [(event['uid'], event['start_time'], event['end_time'], event['recurring'])
+            for event in events] == [
+        ('weekly', _utc(2024, 1, 5, 17), _utc(2024, 1, 5, 18), 'FREQ=WEEKLY;BYDAY=FR'),
+        ('weekly/20240110T170000Z', _utc(2024, 1, 10, 17), _utc(2024, 1, 10, 18), None),
+        ('weekly/20240111T090000Z/PT30M', _utc(2024, 1, 11, 9), _utc(2024, 1, 11, 9, 30), None),
+        ('birthday', datetime.date(2024, 3, 1), datetime.date(2024, 3, 1), None),
+        ('trip', datetime.date(2024, 4, 1), datetime.date(2024, 4, 3), None),
+    ]
+    # the override of the series is dropped, the excluded dates are logged
+    assert 'later' not in str(events)
+    assert '20240112T170000Z,20240119T170000Z,20240126T170000Z' in caplog.text
+
+
+def test_import_resumes_from_the_checkpoint(tmp_path, stub):
+    api, url = stub
+    path = str(tmp_path / 'checkpoint')
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path / 'keys'), lazy_keys=True)
+
+    checkpoint = ImportCheckpoint(path)
+    results = bot.import_events(FEED, family_id=1, checkpoint=checkpoint, max_workers=1)
+    for _ in range(2):
+        assert next(results).error is None
+    # interrupted
+    results.close()
+    checkpoint.close()
+    created = len(api.events)
+    assert created >= 2
+
+    checkpoint = ImportCheckpoint(path)
+    assert len(checkpoint) == created
+    results = list(bot.import_events(FEED, family_id=1, checkpoint=checkpoint, max_workers=1))
+    checkpoint.close()
+    bot.close()
+
+    assert all(result.error is None for result in results)
+    assert len(results) == 5 - created
+    assert [body['title'] for _, body in api.events] == ['Swimming'] * 3 + ['Birthday', 'Trip']
+    assert [(body['start_time'], body['end_time']) for _, body in api.events][-2:] == [
+        ('03.01.2024', '03.01.2024'), ('04.01.2024', '04.03.2024')]
+    assert api.events[0][1]['recurring'] == 'FREQ=WEEKLY;BYDAY=FR'
@@ -0,0 +1,82 @@
+import base64
+import os
+import threading
+import time
+import uuid
+
+from Crypto.Cipher import PKCS1_v1_5
+from Crypto.PublicKey import RSA
+
+from familyapp import Bot, Transport
+
+THREADS = 16
+
+
+class _Response(object):
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.headers = {}
+        self._payload = payload
+
+    @property
+    def text(self):
+        return str(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+class _KeyAPI(Transport):
+    """registers RSA keys and serves one conversation with one wrapped AES key"""
+
+    def __init__(self, aes_key, version_id):
+        self.aes_key = aes_key
+        self.version_id = version_id
+        self.public_key = None
+        self.conversation_fetches = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, json=None, headers=None, **kwargs):
+        if method == 'POST' and url.endswith('/rsa_keys'):
+            self.public_key = RSA.importKey(json['key'])
+            return _Response(201, {'id': 1})
+        with self._lock:
+            self.conversation_fetches += 1
+        # long enough for every thread to miss the cache meanwhile
+        time.sleep(0.05)
+        wrapped = PKCS1_v1_5.new(self.public_key).encrypt(base64.b64encode(self.aes_key))
+        return _Response(200, {
+            'id': '1',
+            'family_users': [],
+            'conversation_keys': [{'conversation_key_version_id': self.version_id,
+                                   'rsa_key_id': 1,
+                                   'key': base64.b64encode(wrapped).decode('utf-8')}],
+        })
+
+
+def test_cold_key_is_fetched_once(tmp_path):
+    api = _KeyAPI(os.urandom(32), str(uuid.uuid4()))
+    bot = Bot('token', 'verify', keys_path=str(tmp_path), transport=api)
+    message = {'family_id': '1', 'conversation_id': '1',
+               'conversation_key_version_id': api.version_id}
+    start = threading.Barrier(THREADS)
+    keys = []
+    errors = []
+
+    def resolve():
+        start.wait()
+        try:
+            keys.append(bot.get_aes_key(dict(message)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=resolve) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    assert keys == [api.aes_key] * THREADS
+    assert api.conversation_fetches == 1
+    bot.close()
@@ -0,0 +1,12 @@
+from familyapp import Bot
+
+
+def test_only_given_fields_are_sent(tmp_path, stub):
+    api, url = stub
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path), lazy_keys=True)
+    assert bot.update_family_user(1, 2, username='anna') == {'username': 'anna'}
+    # an explicit None clears the field
+    assert bot.update_family_user(1, 2, email=None, photo=None) == {'email': None, 'photo': None}
+    assert bot.update_channel(name=None) == {'name': None}
+    assert bot.update_channel(photo='aGVsbG8=') == {'photo': 'aGVsbG8='}
+    bot.close()
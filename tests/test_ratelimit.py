@@ -0,0 +1,65 @@
+import pytest
+
+from benchmarks.stub_server import StubAPI, start_stub_server
+from familyapp import Bot, RateLimiter
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize('method, status_code, retried', [
+    ('GET', 429, True), ('GET', 503, True), ('GET', None, True),
+    ('PATCH', 503, True), ('PATCH', None, True),
+    # the server may have processed a POST unless it answered 429
+    ('POST', 429, True), ('POST', 503, False), ('POST', None, False),
+    ('GET', 500, False), ('GET', 404, False),
+])
+def test_retry_by_method(method, status_code, retried):
+    limiter = RateLimiter(backoff=0.1)
+    delay = limiter.retry_delay(method, status_code, 0)
+    assert (delay is not None) == retried
+    assert limiter.retries == int(retried)
+
+
+def test_retries_are_bounded():
+    limiter = RateLimiter(max_retries=2, backoff=100, max_backoff=1)
+    delays = [limiter.retry_delay('get', 429, attempt) for attempt in range(3)]
+    assert delays[2] is None
+    assert all(0 <= delay <= 1 for delay in delays[:2])
+
+
+def test_retry_after_is_capped():
+    clock = _Clock()
+    limiter = RateLimiter(rates={'messages': 10}, max_backoff=5, clock=clock)
+    assert limiter.retry_delay('POST', 429, 0, retry_after=3600) == 5
+    assert limiter.retry_delay('POST', 429, 0, retry_after=2) >= 2
+
+    limiter.on_response('messages', 429, retry_after=3600)
+    assert limiter.delay('messages') == 5
+    # other families are not paused, the throttled one is slowed down
+    assert limiter.delay('users') == 0
+    assert limiter.stats()['rates']['messages'] == 7.5
+    clock.now += 5
+    assert limiter.delay('messages') == 0
+
+
+def test_throttled_requests_are_retried(tmp_path):
+    api = StubAPI(rate_limit=20, burst=1)
+    server, url = start_stub_server(api)
+    try:
+        limiter = RateLimiter(backoff=0.01, max_backoff=0.2, max_retries=10)
+        bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path), lazy_keys=True,
+                  rate_limiter=limiter)
+        for i in range(5):
+            assert bot.update_channel(name=f'channel {i}') == {'name': f'channel {i}'}
+        bot.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert api.throttled > 0
+    assert limiter.retries == api.throttled
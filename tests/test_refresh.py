@@ -0,0 +1,36 @@
+import time
+
+from familyapp import Bot, KeyRefresher
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def _warm(bot, **kwargs):
+    refresher = KeyRefresher(bot, warm_jitter=0, **kwargs)
+    refresher.warm().join()
+    # close() drops the refreshes still queued
+    while refresher.stats()['pending']:
+        time.sleep(0.01)
+    refresher.close()
+    return refresher
+
+
+def test_one_process_warms_the_shared_keys(tmp_path, stub):
+    api, url = stub
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path))
+    bot.handle_message(lambda event_data: None)
+    for i in range(3):
+        bot.parse_request(api.message_event(1, i, 'hello'), HEADERS)
+    fetches = api.conversation_fetches
+
+    # a worker process sharing the keys directory, then a second one
+    warmed = _warm(bot)
+    skipped = _warm(bot)
+    assert warmed.unchanged == 3
+    assert skipped.unchanged == 0
+    assert api.conversation_fetches == fetches + 3
+
+    # once the interval passed, the next one warms again
+    again = _warm(bot, warm_interval=0)
+    assert again.unchanged == 3
+    bot.close()
@@ -0,0 +1,40 @@
+import asyncio
+
+from familyapp import AsyncBot, BotRegistry, Dispatcher
+from familyapp.aio import AsyncTransport
+
+
+def test_unloaded_bots_leave_the_shared_transport_open(tmp_path, stub):
+    api, url = stub
+    received = []
+    registry = BotRegistry(url=url, keys_path=str(tmp_path), dispatcher=Dispatcher(workers=2),
+                           setup=lambda bot: bot.handle_message(
+                               lambda event_data: received.append(event_data['content'])))
+    registry.register('token a', 'a')
+    registry.register('token b', 'b')
+    registry.parse_request(api.message_event(1, 1, 'to a'), {'Authorization': 'a'})
+    registry.unload('a')
+    assert registry.loaded() == 0
+    registry.parse_request(api.message_event(1, 2, 'to b'), {'Authorization': 'b'})
+    registry.parse_request(api.message_event(1, 3, 'to a again'), {'Authorization': 'a'})
+    registry.close()
+    assert sorted(received) == ['to a', 'to a again', 'to b']
+
+
+def test_async_bots_get_an_async_transport(tmp_path, stub):
+    api, url = stub
+
+    async def main():
+        received = []
+        registry = BotRegistry(bot_class=AsyncBot, url=url, keys_path=str(tmp_path),
+                               setup=lambda bot: bot.handle_message(
+                                   lambda event_data: received.append(event_data['content'])))
+        assert isinstance(registry.transport, AsyncTransport)
+        registry.register('token a', 'a')
+        await registry.parse_request(api.message_event(1, 1, 'to a'), {'Authorization': 'a'})
+        await registry.unload('a')
+        await registry.parse_request(api.message_event(1, 1, 'again'), {'Authorization': 'a'})
+        await registry.close()
+        return received
+
+    assert asyncio.run(main()) == ['to a', 'again']
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from familyapp import Bot, MemoryKeyStore, Recorder
+from familyapp.replay import read_recording, replay, seed_test_key
+
+HEADERS = {'Authorization': 'verify'}
+
+
+def test_replay_with_the_test_key(tmp_path, stub):
+    api, url = stub
+    path = str(tmp_path / 'webhooks.ndjson')
+    test_key = os.urandom(32)
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path / 'keys'),
+              recorder=Recorder(path, test_key=test_key))
+    bot.handle_message(lambda event_data: None)
+    for i in range(5):
+        bot.parse_request(api.message_event(1, i % 2, f'message {i}'), HEADERS)
+    bot.close()
+
+    target = Bot('token', 'verify', url=url, keys_path=str(tmp_path / 'replay'), lazy_keys=True,
+                 key_store=MemoryKeyStore())
+    received = []
+    target.handle_message(lambda event_data: received.append(event_data['content']))
+    seed_test_key(target, test_key)
+    report = replay(read_recording(path), target, speed=0)
+    target.close()
+    assert report['errors'] == 0
+    assert received == [f'message {i}' for i in range(5)]
+    # only the bot's own files, no key store
+    assert not [name for name in os.listdir(tmp_path / 'replay') if name.endswith('.sqlite3')]
+
+
+def test_test_keys_are_not_persisted(tmp_path):
+    bot = Bot('token', 'verify', keys_path=str(tmp_path), lazy_keys=True)
+    with pytest.raises(ValueError):
+        seed_test_key(bot, os.urandom(32))
+    bot.close()
@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+from familyapp import Router
+from familyapp.router import REGEX_CHUNK
+
+
+def _route(router, content=None, payload=None):
+    found = router.resolve({'content': content, 'payload': payload})
+    if found is None:
+        return None
+    callback, match = found
+    return callback(match)
+
+
+def _name(name):
+    return lambda match: (name, match.rest)
+
+
+def test_precedence():
+    router = Router()
+    router.payload('yes', _name('payload'))
+    router.command('/start', _name('command'))
+    router.prefix('/st', _name('prefix'))
+    router.prefix('/start now', _name('longer prefix'))
+    router.regex(r'/s\w+', _name('regex'))
+    router.fallback(_name('fallback'))
+
+    # the payload wins over content, then the longest trie match
+    assert _route(router, '/start', 'yes') == ('payload', '')
+    assert _route(router, '/start  me') == ('command', 'me')
+    assert _route(router, '/start now!') == ('longer prefix', '!')
+    assert _route(router, '/starting') == ('prefix', 'arting')
+    assert _route(router, '/sx') == ('regex', '')
+    assert _route(router, 'hello') == ('fallback', 'hello')
+
+    # a higher priority beats the kind order
+    router.regex(r'/start', _name('urgent'), priority=1)
+    assert _route(router, '/start me', 'yes') == ('urgent', ' me')
+    assert _route(router, '/sx', 'yes') == ('payload', '')
+
+
+def test_regex_routes():
+    router = Router()
+    router.regex(r'(?P<amount>\d+) (?P<unit>kg|g)', lambda match: match.groups.groupdict())
+    router.regex(r'(?i)hello', _name('hello'))
+    router.regex(r'(\w)\1', _name('double'))
+    router.regex(re.compile(r'bye', re.IGNORECASE), _name('bye'))
+    router.regex(r'(?i:ok)(?:ay)?', _name('ok'))
+
+    assert _route(router, '12 kg of flour') == {'amount': '12', 'unit': 'kg'}
+    assert _route(router, 'HeLLo there') == ('hello', ' there')
+    assert _route(router, 'aab') == ('double', 'b')
+    assert _route(router, 'ab') is None
+    assert _route(router, 'BYE') == ('bye', '')
+    assert _route(router, 'OKay') == ('ok', '')
+    assert _route(router, 'OKAY') == ('ok', 'AY')
+
+
+def test_many_regex_routes_keep_priority_order():
+    router = Router()
+    for i in range(REGEX_CHUNK * 3):
+        router.regex(rf'item{i}\b', _name(i), priority=i % 7)
+    router.regex(r'(?i)ITEM1\b', _name('flagged'))
+    router.regex(r'item\d+', _name('any'))
+
+    assert _route(router, 'item12') == (12, '')
+    assert _route(router, 'item1') == (1, '')
+    assert _route(router, 'Item1') == ('flagged', '')
+    assert _route(router, 'item999') == ('any', '')
+
+
+def test_duplicate_group_names_fail_at_registration():
+    router = Router()
+    router.regex(r'(?P<name>a)', _name('a'))
+    with pytest.raises(re.error):
+        router.regex(r'(?P<name>b)', _name('b'))
+    assert _route(router, 'a') == ('a', '')
+    assert _route(router, 'b') is None
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+from familyapp import Bot, Spool
+
+
+def test_crashed_run_is_sent_after_restart(tmp_path, stub):
+    api, url = stub
+    directory = str(tmp_path / 'spool')
+    crashed = Spool(directory, fsync_interval=0)
+    for i in range(3):
+        crashed.append(1, 1, {'content': f'message {i}'})
+    # a torn write at the end of the segment
+    with open(crashed._segment.path, 'ab') as handle:
+        handle.write(b'\x10\x00\x00')
+
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path / 'keys'), spool=Spool(directory))
+    assert bot.spool.join(30)
+    bot.close()
+    assert list(api.messages) == [('1', '1', f'message {i}') for i in range(3)]
+    assert not [name for name in os.listdir(directory) if name.endswith('.log')]
+
+
+def test_close_while_the_api_is_failing(tmp_path):
+    directory = str(tmp_path / 'spool')
+    attempts = []
+    failing = threading.Event()
+    failing.set()
+
+    def send(family_id, conversation_id, data):
+        attempts.append(data['message'])
+        if failing.is_set():
+            raise ConnectionRefusedError('unreachable')
+
+    spool = Spool(directory, workers=1, backoff=0.01, max_backoff=0.05)
+    spool.start(send)
+    for i in range(3):
+        spool.append(1, 1, {'message': f'message {i}'})
+    spool.append(1, 2, {'message': 'other'})
+    while len(attempts) < 5:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    assert spool.close() is False
+    assert time.monotonic() - started < 5
+    # only the first message of a failing conversation is tried while closing
+    assert 'message 1' not in attempts
+
+    failing.clear()
+    sent = []
+    spool = Spool(directory, workers=1)
+    spool.start(lambda family_id, conversation_id, data: sent.append(data['message']))
+    assert spool.close() is True
+    assert sent == ['message 0', 'message 1', 'message 2', 'other']
+
+
+def test_dropped_messages_count_as_done(tmp_path):
+    class Rejected(Exception):
+        status_code = 400
+
+    def send(family_id, conversation_id, data):
+        raise Rejected()
+
+    failures = []
+    spool = Spool(str(tmp_path), on_failure=lambda *args: failures.append(args[2]))
+    spool.start(send)
+    spool.append(1, 1, {'message': 'rejected'})
+    assert spool.close() is True
+    assert failures == [{'message': 'rejected'}]
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+import uuid
+import zlib
+
+import pytest
+
+from familyapp import Bot
+from familyapp.cache import CachedKeyStore
+from familyapp.filelock import StripedFileLock
+from familyapp.store import SQLiteKeyStore
+
+PROCESSES = 4
+KEYS_PER_PROCESS = 200
+
+
+def _write_keys(path, worker, cached):
+    store = SQLiteKeyStore(path)
+    if cached:
+        store = CachedKeyStore(store, maxsize=50)
+    for i in range(KEYS_PER_PROCESS):
+        if i % 2:
+            store.put(f'c{worker}-{i}', f'f{worker}', f'v{worker}-{i}', os.urandom(32))
+        else:
+            store.update({'keys': {f'v{worker}-{i}': os.urandom(32)},
+                          'conversations': {f'c{worker}-{i}': {
+                              'family_id': f'f{worker}',
+                              'conversation_key_version_id': f'v{worker}-{i}'}}})
+        # every worker also moves the same conversation, the last write wins
+        store.put('shared', 'f', f'v{worker}-{i}', os.urandom(32))
+    store.close()
+
+
+def _resolve_key(url, keys_path, message, results):
+    bot = Bot('token', 'verify', url=url, keys_path=keys_path, lazy_keys=True)
+    bot.handle_message(lambda event_data: results.put(event_data['content']))
+    bot.parse_request(message, {'Authorization': 'verify'})
+    bot.close()
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_processes_lose_no_keys(tmp_path, cached):
+    path = str(tmp_path / 'keys.sqlite3')
+    SQLiteKeyStore(path).close()
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_write_keys, args=(path, worker, cached))
+               for worker in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    store = SQLiteKeyStore(path)
+    assert len(store['keys']) == PROCESSES * KEYS_PER_PROCESS
+    assert len(store['conversations']) == PROCESSES * KEYS_PER_PROCESS + 1
+    for worker in range(PROCESSES):
+        for i in range(KEYS_PER_PROCESS):
+            assert len(store['keys'][f'v{worker}-{i}']) == 32
+            assert store['conversations'][f'c{worker}-{i}'] == {
+                'family_id': f'f{worker}', 'conversation_key_version_id': f'v{worker}-{i}'}
+    assert store['conversations']['shared']['conversation_key_version_id'] in store['keys']
+    store.close()
+
+
+def test_processes_fetch_a_cold_key_once(tmp_path, stub):
+    api, url = stub
+    message = api.message_event(1, 1, 'hello')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_resolve_key, args=(url, str(tmp_path), message, results))
+               for _ in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    assert [results.get(timeout=5) for _ in workers] == ['hello'] * PROCESSES
+    assert len(api.rsa_keys) == 1
+    assert api.conversation_fetches == 1
+
+
+def test_bots_in_one_process_share_the_key_locks(tmp_path, stub):
+    api, url = stub
+    bots = [Bot('token', 'verify', url=url, keys_path=str(tmp_path), lazy_keys=True)
+            for _ in range(PROCESSES)]
+    received = []
+    start = threading.Barrier(PROCESSES)
+
+    def parse(bot, message):
+        bot.handle_message(lambda event_data: received.append(event_data['content']))
+        start.wait()
+        bot.parse_request(message, {'Authorization': 'verify'})
+
+    threads = [threading.Thread(target=parse, args=(bot, api.message_event(1, 1, f'message {i}')))
+               for i, bot in enumerate(bots)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert sorted(received) == [f'message {i}' for i in range(PROCESSES)]
+    assert len(api.rsa_keys) == 1
+    assert api.conversation_fetches == 1
+    for bot in bots:
+        bot.close()
+
+
+def test_file_lock_instances_on_one_file(tmp_path):
+    path = str(tmp_path / 'lock')
+    first, second = StripedFileLock(path), StripedFileLock(str(tmp_path / '.' / 'lock'))
+    first.acquire('key')
+    thread = threading.Thread(target=second.acquire, args=('key',), daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    # closing another instance keeps the descriptor, and the record lock, open
+    StripedFileLock(path).close()
+    os.fstat(first._file.fd)
+    first.release('key')
+    thread.join(5)
+    assert not thread.is_alive()
+    second.release('key')
+    first.close()
+    second.close()
+    second.close()
+
+
+def test_key_on_the_rsa_lock_stripe(tmp_path, stub):
+    # a lazy bot registers its keypair during the first key fetch, which
+    # used to hold the key's stripe and wait for the stripe of 'rsa'
+    api, url = stub
+    bot = Bot('token', 'verify', url=url, keys_path=str(tmp_path), lazy_keys=True)
+    rsa_stripe = bot._file_lock._stripe('rsa')
+    version_id = next(candidate for candidate in iter(lambda: str(uuid.uuid4()), None)
+                      if zlib.crc32(candidate.encode('utf-8')) % 64 == rsa_stripe)
+    assert bot._file_lock._stripe(version_id) == rsa_stripe
+    api.rotate_key(1, 1, version_id)
+    received = []
+    bot.handle_message(lambda event_data: received.append(event_data['content']))
+
+    thread = threading.Thread(target=bot.parse_request, daemon=True,
+                              args=(api.message_event(1, 1, 'hello'), {'Authorization': 'verify'}))
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), 'key fetch deadlocked'
+    assert received == ['hello']
+    bot.close()